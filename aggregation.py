@@ -0,0 +1,318 @@
+"""
+Columnar aggregation engine for the dashboard payload.
+
+A date window is loaded once into NumPy arrays (datetime64[D] dates, integer
+source codes, float64 values). Every series the dashboard shows comes from
+`np.unique`/`np.bincount` over those arrays. Python only loops over buckets
+(days, weeks, months), never over readings.
+
+Input rows can be raw readings or pre-aggregated (date, source) buckets from
+`daily_emissions_rollup`. Duplicate keys are summed either way, and so are
+head counts of the same day, so the rows of several campuses can be
+combined.
+
+The two per-day series (head count, per-person emissions) can be returned
+at week or month resolution, picked automatically to stay within a point
+budget, or thinned with LTTB, so long windows give a bounded payload.
+"""
+from datetime import date
+
+import numpy as np
+
+ELECTRICITY = 'electricity'
+
+RESOLUTIONS = ('auto', 'day', 'week', 'month', 'lttb')
+
+# Payload sections in response order
+SECTIONS = (
+    'kpis', 'monthly_trend', 'source_breakdown', 'weekly_comparison', 'yearly_comparison',
+    'daily_human_count', 'daily_per_person_emission', 'emissions_comparison',
+)
+# Sections that can be built from the emission buckets alone
+EMISSION_ONLY_SECTIONS = frozenset(('monthly_trend', 'source_breakdown', 'weekly_comparison', 'yearly_comparison'))
+
+_EMPTY_DAYS = np.array([], dtype='datetime64[D]')
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _to_days(values):
+    """datetime64[D] array from date/datetime objects or 'YYYY-MM-DD...' strings."""
+    if not values:
+        return _EMPTY_DAYS
+    if isinstance(values[0], date):
+        ordinals = np.fromiter((v.toordinal() for v in values), dtype='int64', count=len(values))
+        return (ordinals - _EPOCH_ORDINAL).astype('datetime64[D]')
+    return np.array([str(v)[:10] for v in values], dtype='datetime64[D]')
+
+
+def _iso_week_keys(days):
+    """Vectorized date.isocalendar(): returns iso_year * 100 + iso_week."""
+    n = days.astype('int64')
+    weekday = (n + 3) % 7  # Monday == 0; 1970-01-01 was a Thursday
+    thursday = n - weekday + 3
+    iso_year = thursday.astype('datetime64[D]').astype('datetime64[Y]')
+    jan1 = iso_year.astype('datetime64[D]').astype('int64')
+    week = (thursday - jan1) // 7 + 1
+    return (iso_year.astype('int64') + 1970) * 100 + week
+
+
+def _group_sum(keys, weights):
+    """Sums `weights` per distinct key. Returns (sorted unique keys, sums)."""
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    return uniq, np.bincount(inverse, weights=weights, minlength=len(uniq))
+
+
+def _bucket_starts(days, resolution):
+    """First day of the day/ISO week/month bucket of each day."""
+    if resolution == 'week':
+        n = days.astype('int64')
+        return (n - (n + 3) % 7).astype('datetime64[D]')
+    if resolution == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    return days
+
+
+def choose_resolution(days, max_points):
+    """Finest of day/week/month whose bucket count over `days` fits `max_points`."""
+    for resolution in ('day', 'week'):
+        if len(np.unique(_bucket_starts(days, resolution))) <= max_points:
+            return resolution
+    return 'month'
+
+
+def lttb_indices(x, y, n):
+    """
+    Largest-Triangle-Three-Buckets: indices of `n` points of the line (x, y)
+    that keep its visual shape. First and last points are always kept.
+    """
+    size = len(x)
+    if n >= size:
+        return np.arange(size)
+    if n < 3:
+        return np.array([0, size - 1][:max(n, 0)], dtype='int64')
+    edges = np.linspace(1, size - 1, n - 1).astype('int64')
+    selected = [0]
+    a = 0
+    for i in range(n - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket is the third triangle corner
+        next_end = edges[i + 2] if i + 2 < len(edges) else size
+        cx, cy = x[end:next_end].mean(), y[end:next_end].mean()
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = start + int(np.argmax(area))
+        selected.append(a)
+    selected.append(size - 1)
+    return np.array(selected, dtype='int64')
+
+
+class DashboardWindow:
+    """
+    One dashboard date window in columnar form.
+
+    `rows` is a sequence of (date, source_type, raw_value, emissions_tonnes),
+    `human_rows` a sequence of (date, humans), and `prev_total` the emissions
+    of the preceding window of the same length.
+    """
+
+    def __init__(self, rows, human_rows=(), prev_total=0.0):
+        rows = list(rows)
+        n = len(rows)
+        self.days = _to_days([r[0] for r in rows])
+        # Sources are coded in first-seen order, which is also the order the
+        # donut chart lists them in
+        codes = {}
+        self.source_codes = np.fromiter(
+            (codes.setdefault(r[1], len(codes)) for r in rows), dtype='int64', count=n
+        )
+        self.source_names = np.array(list(codes), dtype=str)
+        self.raw = np.fromiter((r[2] or 0 for r in rows), dtype='float64', count=n)
+        self.tonnes = np.fromiter((r[3] or 0 for r in rows), dtype='float64', count=n)
+
+        human_rows = list(human_rows)
+        self.human_days = _to_days([r[0] for r in human_rows])
+        self.humans = np.fromiter((r[1] for r in human_rows), dtype='int64', count=len(human_rows))
+        self.prev_total = float(prev_total or 0)
+
+        self._aggregate()
+
+    def _aggregate(self):
+        tonnes = self.tonnes
+        self.total = float(tonnes.sum())
+        self.by_source = np.bincount(self.source_codes, weights=tonnes, minlength=len(self.source_names))
+
+        electricity = np.flatnonzero(self.source_names == ELECTRICITY)
+        if len(electricity):
+            self.energy = float(self.raw[self.source_codes == electricity[0]].sum())
+        else:
+            self.energy = 0.0
+
+        self.day_keys, self.day_totals = _group_sum(self.days, tonnes)
+        # Coarser buckets are rolled up from the per-day totals
+        self.month_keys, self.month_totals = _group_sum(self.day_keys.astype('datetime64[M]'), self.day_totals)
+        self.year_keys, self.year_totals = _group_sum(self.day_keys.astype('datetime64[Y]'), self.day_totals)
+        self.week_keys, self.week_totals = _group_sum(_iso_week_keys(self.day_keys), self.day_totals)
+
+        # Align emissions and head counts on the union of their dates
+        all_days = np.union1d(self.day_keys, self.human_days)
+        daily = np.zeros(len(all_days))
+        daily[np.searchsorted(all_days, self.day_keys)] = self.day_totals
+        humans = np.zeros(len(all_days), dtype='int64')
+        np.add.at(humans, np.searchsorted(all_days, self.human_days), self.humans)
+        self.all_days = all_days
+        self.daily = daily
+        self.daily_humans = humans
+
+        has_emissions = daily > 0
+        has_humans = humans > 0
+        self.both = has_emissions & has_humans
+        self.per_person = np.divide(daily, humans, out=np.zeros(len(all_days)), where=self.both)
+        self.total_humans = int(humans[self.both | (has_humans & ~has_emissions)].sum())
+        self.total_human_responsible = float(daily[self.both].sum())
+
+    # ---- Payload sections ----
+    def kpis(self):
+        total = self.total
+        percent_change = 0.0
+        if self.prev_total > 0:
+            percent_change = (total - self.prev_total) / self.prev_total * 100.0
+
+        biggest_source, biggest_value = 'N/A', 0.0
+        if len(self.source_names):
+            i = int(np.argmax(self.by_source))
+            biggest_source, biggest_value = str(self.source_names[i]), float(self.by_source[i])
+
+        avg_per_person = 0.0
+        highest_day, highest_value = None, 0.0
+        if self.both.any():
+            values = self.per_person[self.both]
+            avg_per_person = float(values.mean())
+            i = int(np.argmax(values))
+            highest_day = str(self.all_days[self.both][i])
+            highest_value = float(values[i])
+
+        return {
+            'total_emissions': round(total, 2),
+            'percent_change': round(percent_change, 2),
+            'biggest_source': biggest_source,
+            'biggest_source_percent': round((biggest_value / total * 100) if total > 0 else 0, 1),
+            'energy_saved': round(self.energy, 0),
+            'total_humans': self.total_humans,
+            'avg_per_person_emission': round(avg_per_person, 4) if avg_per_person > 0 else None,
+            'highest_per_person_emission_day': highest_day,
+            'highest_per_person_emission_value': round(highest_value, 4) if highest_day else None,
+        }
+
+    def monthly_trend(self):
+        labels = np.datetime_as_string(self.month_keys, unit='M')
+        return [
+            {'month': str(label), 'emissions': round(float(value), 2)}
+            for label, value in zip(labels, self.month_totals)
+        ]
+
+    def source_breakdown(self):
+        total = self.total
+        return [
+            {
+                'source': str(name),
+                'emissions': round(float(value), 2),
+                'percentage': round((float(value) / total * 100) if total > 0 else 0, 1),
+            }
+            for name, value in zip(self.source_names, self.by_source)
+        ]
+
+    def weekly_comparison(self):
+        return [
+            {'label': f"{key // 100}-W{key % 100:02d}", 'emissions': round(float(value), 2)}
+            for key, value in zip(self.week_keys.tolist(), self.week_totals)
+        ]
+
+    def yearly_comparison(self):
+        return [
+            {'year': int(year) + 1970, 'emissions': round(float(value), 2)}
+            for year, value in zip(self.year_keys.astype('int64'), self.year_totals)
+        ]
+
+    def daily_human_count(self, resolution='day'):
+        """Head count per day, or the average over counted days per week/month bucket."""
+        if resolution == 'day':
+            keys, humans = self.all_days, self.daily_humans
+        else:
+            counted = self.daily_humans > 0
+            starts = _bucket_starts(self.all_days, resolution)
+            keys, inverse = np.unique(starts, return_inverse=True)
+            total = np.bincount(inverse, weights=self.daily_humans, minlength=len(keys))
+            days = np.bincount(inverse, weights=counted, minlength=len(keys))
+            humans = np.rint(np.divide(total, days, out=np.zeros(len(keys)), where=days > 0)).astype('int64')
+        labels = np.datetime_as_string(keys, unit='D')
+        return [
+            {'date': str(label), 'humans': int(value)}
+            for label, value in zip(labels, humans.tolist())
+        ]
+
+    def daily_per_person_emission(self, resolution='day', max_points=None):
+        """
+        Per-person emissions per day; per week/month bucket the mean over
+        days with both emissions and a head count; or, for 'lttb', the
+        `max_points` days that best preserve the shape of the daily line.
+        """
+        listed = (self.daily > 0) | (self.daily_humans > 0)
+        days, values, both = self.all_days[listed], self.per_person[listed], self.both[listed]
+        if resolution == 'lttb':
+            # Only defined points are drawn, so thin those
+            days, values = days[both], values[both]
+            keep = lttb_indices(days.astype('int64').astype('float64'), values, max_points or len(days))
+            days, values, both = days[keep], values[keep], np.ones(len(keep), dtype=bool)
+        elif resolution != 'day':
+            starts = _bucket_starts(days, resolution)
+            days, inverse = np.unique(starts, return_inverse=True)
+            counts = np.bincount(inverse, weights=both, minlength=len(days))
+            sums = np.bincount(inverse, weights=np.where(both, values, 0.0), minlength=len(days))
+            values = np.divide(sums, counts, out=np.zeros(len(days)), where=counts > 0)
+            both = counts > 0
+        labels = np.datetime_as_string(days, unit='D')
+        return [
+            {'date': str(label), 'per_person_emission': round(value, 4) if ok else None}
+            for label, value, ok in zip(labels, values.tolist(), both.tolist())
+        ]
+
+    def emissions_comparison(self):
+        return {
+            'total_operational_emissions': round(self.total, 2),
+            'total_human_responsible_emissions': round(self.total_human_responsible, 2),
+        }
+
+    def series_resolution(self, resolution='day', max_points=None):
+        """Resolves 'auto' (and the bar-chart half of 'lttb') against the point budget."""
+        if resolution in ('auto', 'lttb'):
+            return choose_resolution(self.all_days, max_points) if max_points else 'day'
+        return resolution
+
+    def payload(self, resolution='day', max_points=None, fields=SECTIONS):
+        """
+        The dashboard JSON, limited to the sections in `fields`. `resolution`
+        applies to the two daily series: day/week/month, 'auto' (finest that
+        fits `max_points`), or 'lttb' (per-person line thinned to
+        `max_points` days, head count as 'auto').
+        """
+        buckets = self.series_resolution(resolution, max_points)
+        line = 'lttb' if resolution == 'lttb' and max_points else buckets
+        builders = {
+            'kpis': self.kpis,
+            'monthly_trend': self.monthly_trend,
+            'source_breakdown': self.source_breakdown,
+            'weekly_comparison': self.weekly_comparison,
+            'yearly_comparison': self.yearly_comparison,
+            'daily_human_count': lambda: self.daily_human_count(buckets),
+            'daily_per_person_emission': lambda: self.daily_per_person_emission(line, max_points),
+            'emissions_comparison': self.emissions_comparison,
+        }
+        payload = {name: builders[name]() for name in SECTIONS if name in fields}
+        series = {}
+        if 'daily_human_count' in fields:
+            series['daily_human_count'] = buckets
+        if 'daily_per_person_emission' in fields:
+            series['daily_per_person_emission'] = line
+        if series:
+            payload['series_resolution'] = series
+        return payload
@@ -1,25 +1,51 @@
 import os
 import sys
+import atexit
 import logging
-from datetime import datetime, timedelta, date
+import threading
+import time
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime, timedelta
 from functools import wraps
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, g, render_template, request, jsonify, session, redirect, url_for
 from flask_cors import CORS
-import mysql.connector
-from mysql.connector import pooling
 import jwt
 from dotenv import load_dotenv
 
+from aggregation import EMISSION_ONLY_SECTIONS, RESOLUTIONS, SECTIONS, DashboardWindow
+from cache import LocalBackend, ResponseCache, backend_from_env
+import codec
+import db
+import export
+import jobs
+import logconfig
+import metrics
+from auth import CredentialStore, CredentialsUnavailable, TokenVerifier
+from database import archive, backends, campuses, credentials, import_jobs, summary
+from database.pool import ConnectionPool, PoolError
+from ingest import (ingest_csv_stream, ingest_records, iter_ndjson_records, sum_batches, text_stream,
+                    upsert_activity_records, validate_record)
+from recommendations import build_recommendations
+from writebuffer import BufferFull, WriteBuffer
+
 # ---- Setup ----
 load_dotenv()
 
-# Logging
-logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+# Logging: JSON lines written by a background thread (see logconfig.py)
+logconfig.configure(
+    level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+    fmt=os.environ.get('LOG_FORMAT', 'json').lower(),
+    debug_sample=float(os.environ.get('LOG_DEBUG_SAMPLE', 1.0)),
+)
 logger = logging.getLogger(__name__)
 
+# Storage backend: 'mysql' (default) or 'sqlite' (embedded file, see database/backends.py)
+DB_BACKEND = backends.backend_name()
+
 # Fail fast if DB password missing (avoid accidental leaking / fallback)
-if not os.environ.get('DB_PASSWORD'):
+if DB_BACKEND == 'mysql' and not os.environ.get('DB_PASSWORD'):
     raise ValueError("DB_PASSWORD not found in environment variables (.env). Please set DB_PASSWORD before running the app.")
 
 app = Flask(__name__)
@@ -37,29 +63,161 @@ DB_CONFIG = {
     'port': int(os.environ.get('DB_PORT', 3306)),
 }
 
-# Create a simple connection pool (fall back to None if pool creation fails)
-pool = None
+# Point budget for the dashboard's daily series when no max_points is given
+DASHBOARD_MAX_POINTS = int(os.environ.get('DASHBOARD_MAX_POINTS', 400))
+MAX_POINTS_LIMIT = 5000
+
+# Rows per INSERT/commit for streamed CSV uploads (bounds memory per request)
+CSV_CHUNK_SIZE = int(os.environ.get('CSV_CHUNK_SIZE', 1000))
+
+# NDJSON ingest (/api/ingest): commit a partial chunk once its first record is this old,
+# read the body in blocks of this many bytes, and reject lines longer than this
+INGEST_FLUSH_SECONDS = float(os.environ.get('INGEST_FLUSH_SECONDS', 1.0))
+INGEST_READ_BYTES = int(os.environ.get('INGEST_READ_BYTES', 1024))
+INGEST_MAX_LINE_BYTES = int(os.environ.get('INGEST_MAX_LINE_BYTES', 64 * 1024))
+
+# Connection pool (see database/pool.py); connections are opened lazily
+pool = ConnectionPool(
+    lambda: backends.connect(DB_CONFIG),
+    size=int(os.environ.get('DB_POOL_SIZE', 5)),
+    timeout=float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+    max_waiters=int(os.environ['DB_POOL_MAX_WAITERS']) if os.environ.get('DB_POOL_MAX_WAITERS') else None,
+    recycle=float(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    ping_after=float(os.environ.get('DB_POOL_PING_AFTER', 10)),
+    failure_threshold=int(os.environ.get('DB_BREAKER_THRESHOLD', 5)),
+    reset_after=float(os.environ.get('DB_BREAKER_RESET', 30)),
+    name=DB_BACKEND,
+)
+if DB_BACKEND == 'sqlite':
+    logger.info(f"Using SQLite database {backends.sqlite_path()} (pool size {pool.size}).")
+else:
+    logger.info(f"MySQL connection pool configured (size {pool.size}).")
+
+# Dashboard response cache: invalidated by the write endpoints via bump()
 try:
-    pool = pooling.MySQLConnectionPool(pool_name="mypool", pool_size=5, **DB_CONFIG)
-    logger.info("MySQL connection pool created.")
+    cache_backend = backend_from_env()
 except Exception as e:
-    pool = None
-    logger.warning(f"Could not create connection pool; will use single connections. Reason: {e}")
+    cache_backend = LocalBackend()
+    logger.warning(f"Could not connect shared cache backend; using in-process cache. Reason: {e}")
+dashboard_cache = ResponseCache(
+    maxsize=int(os.environ.get('DASHBOARD_CACHE_SIZE', 128)),
+    ttl=int(os.environ.get('DASHBOARD_CACHE_TTL', 300)),
+    backend=cache_backend,
+)
+
+# API auth: verified JWT claims are cached until `exp`; API keys and revoked
+# token ids are held in memory and reloaded every AUTH_REFRESH_SECONDS, and
+# an unknown key id is looked up at most every AUTH_LOOKUP_SECONDS
+token_verifier = TokenVerifier(app.secret_key, maxsize=int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000)))
+credential_store = CredentialStore(
+    refresh=float(os.environ.get('AUTH_REFRESH_SECONDS', 30)),
+    lookup_interval=float(os.environ.get('AUTH_LOOKUP_SECONDS', 0.1)),
+)
+
+# Routes use db.get_connection()/db.cursor()/db.query(): one pooled
+# connection per request, returned by the teardown handler. Group-wide
+# dashboards fan out per-campus queries on DB_FANOUT_WORKERS threads, each
+# with its own pooled connection (capped below DB_POOL_SIZE)
+db.init_app(app, pool, fan_out_workers=int(os.environ.get('DB_FANOUT_WORKERS', 4)))
+
+# Background CSV imports (see jobs.py); JOBS_WORKERS=0 only queues them
+job_runner = jobs.JobRunner(
+    pool,
+    spool_dir=os.environ.get('JOBS_SPOOL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')),
+    workers=int(os.environ.get('JOBS_WORKERS', 1)),
+    chunk_size=CSV_CHUNK_SIZE,
+    poll_interval=float(os.environ.get('JOBS_POLL_SECONDS', 5)),
+    stale_after=float(os.environ.get('JOBS_STALE_SECONDS', 300)),
+    retention_days=int(os.environ.get('JOBS_RETENTION_DAYS', 7)),
+    on_change=dashboard_cache.bump,
+)
+job_runner.start()
+
+# Write-behind buffer for POST /api/data (see writebuffer.py): opt-in, off by default
+write_buffer = None
+if os.environ.get('WRITE_BUFFER', 'false').lower() in ('1', 'true', 'yes'):
+    write_buffer = WriteBuffer(
+        pool,
+        batch_size=int(os.environ.get('WRITE_BUFFER_BATCH', 500)),
+        max_delay=float(os.environ.get('WRITE_BUFFER_DELAY', 0.5)),
+        max_queue=int(os.environ.get('WRITE_BUFFER_QUEUE', 10000)),
+        block_seconds=float(os.environ.get('WRITE_BUFFER_BLOCK_SECONDS', 0)),
+        durability=os.environ.get('WRITE_BUFFER_DURABILITY', 'commit').lower(),
+        on_change=dashboard_cache.bump,
+    )
+    atexit.register(write_buffer.close, float(os.environ.get('WRITE_BUFFER_SHUTDOWN_SECONDS', 10)))
+    logger.info(f"Write buffer enabled ({write_buffer.durability} durability, batches of {write_buffer.batch_size}).")
+# Longest a 'commit'-durability request waits for its batch before answering 202
+WRITE_BUFFER_WAIT_SECONDS = float(os.environ.get('WRITE_BUFFER_WAIT_SECONDS', 5))
+
+# Streaming exports (see export.py) hold a pooled connection until the download ends;
+# cap them per process so they cannot starve the other routes
+export_slots = threading.BoundedSemaphore(int(os.environ.get('EXPORT_MAX_CONCURRENT', 2)))
+
+
+# ---- Metrics ----
+metrics.registry.gauge(
+    'campus_db_pool_connections', 'Pooled connections by state.',
+    lambda: {k: v for k, v in pool.stats().items() if k in ('in_use', 'idle', 'waiters')}, label='state',
+)
+metrics.registry.gauge(
+    'campus_auth_token_cache_entries', 'Verified JWTs held in the claims cache.',
+    lambda: token_verifier.stats()['entries'],
+)
+if write_buffer is not None:
+    metrics.registry.gauge(
+        'campus_write_buffer_depth', 'Readings queued in the write buffer.', write_buffer.depth,
+    )
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Correlation id for every log record of this request
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    logconfig.request_id.set(g.request_id)
+
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Route pattern, not the raw path, so 404 probes cannot add label values
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            endpoint=endpoint, method=request.method, status=response.status_code,
+        )
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
 
-def get_db_connection():
-    """
-    Returns a MySQL connection from pool if available, otherwise a fresh connection.
-    Caller is responsible for closing the connection.
-    """
-    try:
-        if pool:
-            conn = pool.get_connection()
-        else:
-            conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except Exception as e:
-        logger.error(f"Error connecting to database: {e}")
-        return None
+
+@app.teardown_request
+def clear_request_id(exc=None):
+    logconfig.request_id.set(None)
+
+
+@app.errorhandler(PoolError)
+def handle_pool_error(e):
+    logger.warning(str(e))
+    headers = {'Retry-After': str(e.retry_after)}
+    if request.path.startswith('/api/'):
+        return jsonify({'error': 'Database busy or unavailable, please retry'}), 503, headers
+    return 'Database busy or unavailable, please retry.', 503, headers
+
+
+@app.errorhandler(BufferFull)
+def handle_buffer_full(e):
+    logger.warning(str(e))
+    return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
+
+
+@app.errorhandler(CredentialsUnavailable)
+def handle_credentials_unavailable(e):
+    # Keys cannot be checked yet: a retry may succeed, a 401 would be wrong
+    logger.warning(str(e))
+    return jsonify({'error': 'Authentication temporarily unavailable, please retry'}), 503, {'Retry-After': str(e.retry_after)}
 
 # ---- Authentication helpers ----
 def login_required(f):
@@ -75,7 +233,8 @@ def api_token_required(f):
     """
     Decorator to protect API endpoints:
     - Accepts a valid session (web login), OR
-    - Accepts a valid JWT in Authorization: Bearer <token>
+    - Accepts a valid JWT in Authorization: Bearer <token>, OR
+    - Accepts an API key in X-API-Key (machine clients)
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -83,19 +242,31 @@ def api_token_required(f):
         if 'user_id' in session:
             return f(*args, **kwargs)
 
-        # 2) JWT-based (API clients)
+        # 2) API key (meter gateways and other machine clients)
+        api_key = request.headers.get('X-API-Key')
+        if api_key:
+            principal = credential_store.api_key(api_key, db.cursor)
+            if principal is None:
+                return jsonify({'error': 'Invalid API key'}), 401
+            request.api_key_id, request.user_id = principal
+            return f(*args, **kwargs)
+
+        # 3) JWT-based (API clients)
         auth_header = request.headers.get('Authorization', '')
         if auth_header.startswith('Bearer '):
             token = auth_header.split(' ', 1)[1].strip()
             try:
-                payload = jwt.decode(token, app.secret_key, algorithms=['HS256'])
-                # optional: set some request-level attributes if needed
-                request.user_id = payload.get('user_id')
-                return f(*args, **kwargs)
+                payload = token_verifier.verify(token)
             except jwt.ExpiredSignatureError:
                 return jsonify({'error': 'Token expired'}), 401
             except jwt.InvalidTokenError:
                 return jsonify({'error': 'Invalid token'}), 401
+            if 'jti' in payload and credential_store.is_revoked(payload['jti'], db.cursor):
+                return jsonify({'error': 'Token revoked'}), 401
+            # optional: set some request-level attributes if needed
+            request.user_id = payload.get('user_id')
+            request.token_claims = payload
+            return f(*args, **kwargs)
 
         # No valid auth provided
         return jsonify({'error': 'Authentication required'}), 401
@@ -116,35 +287,26 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
 
-        connection = get_db_connection()
-        if not connection:
-            return render_template('login.html', error='Database connection error')
-
-        cursor = None
         try:
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
-            user = cursor.fetchone()
-            logger.info(f"Login attempt for username='{username}' - user_found={bool(user)}")
+            rows = db.query('user_by_username', (username,))
+        except PoolError as e:
+            logger.warning(str(e))
+            return render_template('login.html', error='Database connection error'), 503
         except Exception as e:
             logger.error(f"Error during login DB query: {e}")
             return render_template('login.html', error='Internal error')
-        finally:
-            if cursor:
-                cursor.close()
-            try:
-                connection.close()
-            except Exception:
-                pass
+        user = rows[0] if rows else None
+        logger.info("Login attempt for username='%s' - user_found=%s", username, bool(user))
 
         if not user:
             # helpful dev message (do not expose in production)
-            logger.info(f"User not found for username='{username}'")
+            logger.debug("User not found for username='%s'", username)
             return render_template('login.html', error='Invalid credentials')
 
-        if user and user['password'] == password:
-            session['user_id'] = user['id']
-            session['username'] = user['username']
+        user_id, user_name, user_password = user
+        if user_password == password:
+            session['user_id'] = user_id
+            session['username'] = user_name
             return redirect(url_for('data_input'))
         else:
             return render_template('login.html', error='Invalid credentials')
@@ -174,41 +336,53 @@ def api_login():
     if not username or not password:
         return jsonify({'error': 'Missing username or password'}), 400
 
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({'error': 'Database connection error'}), 500
-
-    cursor = None
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        logger.info(f"API login attempt for username='{username}' - user_found={bool(user)}")
+        rows = db.query('user_by_username', (username,))
+    except PoolError:
+        raise
     except Exception as e:
         logger.error(f"Error during api_login DB query: {e}")
         return jsonify({'error': 'Internal error'}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        try:
-            connection.close()
-        except Exception:
-            pass
+    user = rows[0] if rows else None
+    logger.info("API login attempt for username='%s' - user_found=%s", username, bool(user))
 
-    if user and user['password'] == password:
+    if user and user[2] == password:
+        user_id, user_name, _ = user
         payload = {
-            'user_id': user['id'],
+            'user_id': user_id,
+            'jti': uuid.uuid4().hex,  # lets /api/logout revoke this token
             'exp': datetime.utcnow() + timedelta(hours=24)
         }
         token = jwt.encode(payload, app.secret_key, algorithm='HS256')
         # pyjwt 2.x returns a string; ensure it's serializable
         if isinstance(token, bytes):
             token = token.decode('utf-8')
-        return jsonify({'token': token, 'username': user['username']})
+        return jsonify({'token': token, 'username': user_name})
 
     return jsonify({'error': 'Invalid credentials'}), 401
 
 
+@app.route('/api/logout', methods=['POST'])
+@api_token_required
+def api_logout():
+    """Revokes the presented JWT until it expires."""
+    claims = getattr(request, 'token_claims', None)
+    if not claims or 'jti' not in claims:
+        return jsonify({'error': 'Only tokens from /api/login can be revoked'}), 400
+    try:
+        credentials.revoke_token(db.cursor(), claims['jti'], datetime.utcfromtimestamp(claims['exp']))
+        db.commit()
+    except PoolError:
+        raise
+    except Exception as e:
+        logger.exception('Error revoking token')
+        db.rollback()
+        return jsonify({'error': 'Failed to revoke token'}), 500
+    credential_store.add_revoked(claims['jti'])
+    token_verifier.forget(request.headers['Authorization'].split(' ', 1)[1].strip())
+    return jsonify({'message': 'Token revoked'})
+
+
 @app.route('/debug/reset_admin', methods=['POST'])
 def debug_reset_admin():
     """Development-only helper: reset or create the `admin` user with password `admin123`.
@@ -217,34 +391,21 @@ def debug_reset_admin():
     if not DEBUG_MODE:
         return jsonify({'error': 'Not found'}), 404
 
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({'error': 'Database connection error'}), 500
-
-    cursor = None
     try:
-        cursor = connection.cursor()
+        cursor = db.cursor()
         # Try update first
         cursor.execute("UPDATE users SET password = %s WHERE username = %s", ('admin123', 'admin'))
         if cursor.rowcount == 0:
             cursor.execute("INSERT INTO users (username, password) VALUES (%s, %s)", ('admin', 'admin123'))
-        connection.commit()
+        db.commit()
         logger.info('Admin account reset/created by debug_reset_admin')
         return jsonify({'message': 'Admin password reset to admin123'}), 200
+    except PoolError:
+        raise
     except Exception as e:
         logger.exception('Error resetting admin user')
-        try:
-            connection.rollback()
-        except Exception:
-            pass
+        db.rollback()
         return jsonify({'error': 'Failed to reset admin account'}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        try:
-            connection.close()
-        except Exception:
-            pass
 
 @app.route('/api/data', methods=['POST'])
 @api_token_required
@@ -254,37 +415,44 @@ def add_data():
     Accepts JWT (Authorization Bearer) or active session.
     """
     data = request.get_json() or {}
-    date = data.get('date')
-    source_type = data.get('source_type')
-    raw_value = data.get('raw_value')
-    unit = data.get('unit')
-
-    if not all([date, source_type, raw_value, unit]):
-        return jsonify({'error': 'Missing required fields'}), 400
+    record, error = validate_record(data, archive.get_boundary(db.cursor), campuses.get_ids(db.cursor))
+    if error:
+        return jsonify({'error': error}), 400
 
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({'error': 'Database connection error'}), 500
+    if write_buffer is not None:
+        return _buffer_reading(record)
 
-    cursor = None
     try:
-        cursor = connection.cursor()
-        cursor.execute(
-            "INSERT INTO activity_data (date, source_type, raw_value, unit) VALUES (%s, %s, %s, %s)",
-            (date, source_type, raw_value, unit)
-        )
-        connection.commit()
-        return jsonify({'message': 'Data added successfully'}), 201
+        # Upsert on (date, campus, source_type, meter_id, reading_time): a retried
+        # request overwrites the reading instead of duplicating it
+        counts = sum_batches(upsert_activity_records(db.cursor(), [record]))
+        db.commit()
+        if counts['unchanged']:
+            return jsonify({'message': 'Data already recorded', **counts}), 200
+        dashboard_cache.bump()
+        if counts['updated']:
+            return jsonify({'message': 'Data updated successfully', **counts}), 200
+        return jsonify({'message': 'Data added successfully', **counts}), 201
+    except PoolError:
+        raise
     except Exception as e:
         logger.exception("Error inserting activity_data")
+        db.rollback()
         return jsonify({'error': 'Failed to insert data'}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        try:
-            connection.close()
-        except Exception:
-            pass
+
+def _buffer_reading(record):
+    """Hands a reading to the write buffer; 201 once committed, 202 if only queued."""
+    future = write_buffer.put(record)
+    if future is None:
+        return jsonify({'message': 'Data queued'}), 202
+    try:
+        batch_size = future.result(timeout=WRITE_BUFFER_WAIT_SECONDS)
+    except FutureTimeout:
+        return jsonify({'message': 'Data queued, not yet committed'}), 202
+    except Exception:
+        logger.exception("Error writing buffered activity_data")
+        return jsonify({'error': 'Failed to insert data'}), 500
+    return jsonify({'message': 'Data recorded', 'batch_size': batch_size}), 201
 
 @app.route('/api/humans', methods=['POST'])
 @api_token_required
@@ -292,11 +460,13 @@ def add_human_count():
     """
     Protected endpoint for adding/updating human count records.
     Accepts JWT (Authorization Bearer) or active session.
-    One record per date - updates if date exists, inserts if new.
+    One record per campus and date - updates if it exists, inserts if new.
+    `campus` (a code) defaults to the main campus.
     """
     data = request.get_json() or {}
     date = data.get('date')
     humans = data.get('humans')
+    campus = str(data.get('campus') or '').strip().lower()
 
     if not date or humans is None:
         return jsonify({'error': 'Missing required fields: date and humans'}), 400
@@ -314,48 +484,100 @@ def add_human_count():
     except ValueError:
         return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
 
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({'error': 'Database connection error'}), 500
+    campus_id = campuses.DEFAULT_CAMPUS_ID
+    if campus:
+        campus_id = campuses.get_ids(db.cursor).get(campus)
+        if campus_id is None:
+            return jsonify({'error': f"Unknown campus '{campus[:32]}'"}), 400
 
-    cursor = None
     try:
-        cursor = connection.cursor()
         # Use INSERT ... ON DUPLICATE KEY UPDATE for upsert
-        cursor.execute(
-            "INSERT INTO human_count (date, humans) VALUES (%s, %s) ON DUPLICATE KEY UPDATE humans = VALUES(humans)",
-            (date, humans)
+        db.cursor().execute(
+            "INSERT INTO human_count (campus_id, date, humans) VALUES (%s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE humans = VALUES(humans)",
+            (campus_id, date, humans)
         )
-        connection.commit()
+        db.commit()
+        dashboard_cache.bump()
         return jsonify({'message': 'Human count added/updated successfully'}), 201
+    except PoolError:
+        raise
     except Exception as e:
         error_msg = str(e)
-        if "doesn't exist" in error_msg or "1146" in error_msg:
+        if "doesn't exist" in error_msg or "1146" in error_msg or "no such table" in error_msg:
             logger.error("human_count table doesn't exist. Please run database/init_db.py to create it.")
             return jsonify({'error': 'Database table not found. Please run database/init_db.py to initialize the database.'}), 500
         logger.exception("Error inserting/updating human_count")
-        try:
-            connection.rollback()
-        except Exception:
-            pass
+        db.rollback()
         return jsonify({'error': 'Failed to insert/update human count'}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        try:
-            connection.close()
-        except Exception:
-            pass
+
+def _not_modified(etag, last_modified, explicit_range=True):
+    """Conditional GET check. If-None-Match wins over If-Modified-Since."""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    # The default window moves with the clock, so only the ETag is reliable for it
+    if explicit_range and request.if_modified_since:
+        return request.if_modified_since >= last_modified
+    return False
+
+def _cacheable_response(body, etag, last_modified, status=200, encoding=None):
+    """JSON response carrying the validators browsers need to revalidate."""
+    response = Response(body, status=status, mimetype='application/json')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'public, no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding and body is not None:
+        response.headers['Content-Encoding'] = encoding
+    return response
 
 @app.route('/api/dashboard', methods=['GET'])
 def get_dashboard_data():
     """
     Public dashboard JSON (no auth).
+    `resolution` (auto|day|week|month|lttb, default auto) and `max_points`
+    bound the number of points in the two daily series. `fields` (comma-
+    separated section names, default all) returns only those sections and
+    skips the queries they do not need, so each chart can be fetched and
+    cached on its own. `format=compact` returns series as parallel arrays
+    (see codec.py). Bodies are gzip/br compressed per Accept-Encoding.
+    `campus` (comma-separated codes) limits the view to those campuses;
+    without it the whole group is shown. Each campus is queried on its own
+    pooled connection, concurrently (db.fan_out), and the rows merged.
     """
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
 
-    if not start_date or not end_date:
+    resolution = request.args.get('resolution', 'auto').lower()
+    if resolution not in RESOLUTIONS:
+        return jsonify({'error': f"resolution must be one of: {', '.join(RESOLUTIONS)}"}), 400
+    try:
+        max_points = int(request.args.get('max_points', DASHBOARD_MAX_POINTS))
+    except ValueError:
+        return jsonify({'error': 'max_points must be an integer'}), 400
+    max_points = min(max(max_points, 10), MAX_POINTS_LIMIT)
+
+    fields = SECTIONS
+    if request.args.get('fields'):
+        requested = {f.strip() for f in request.args['fields'].split(',') if f.strip()}
+        unknown = requested - set(SECTIONS)
+        if unknown or not requested:
+            return jsonify({'error': f"fields must be among: {', '.join(SECTIONS)}"}), 400
+        fields = tuple(name for name in SECTIONS if name in requested)
+
+    response_format = request.args.get('format', 'rows').lower()
+    if response_format not in ('rows', 'compact'):
+        return jsonify({'error': "format must be 'rows' or 'compact'"}), 400
+
+    campus_map = campuses.get_ids(db.cursor)
+    try:
+        campus_ids = sorted(campuses.parse_codes(request.args['campus'], campus_map)
+                            if request.args.get('campus') else campus_map.values())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    explicit_range = bool(start_date and end_date)
+    if not explicit_range:
         end_date = datetime.now().strftime('%Y-%m-%d')
         start_date = (datetime.now() - timedelta(days=180)).strftime('%Y-%m-%d')
 
@@ -368,335 +590,112 @@ def get_dashboard_data():
     start_date = start_dt.strftime('%Y-%m-%d')
     end_date = end_dt.strftime('%Y-%m-%d')
 
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({'error': 'Database connection error'}), 500
-
-    cursor = None
-    try:
-        cursor = connection.cursor(dictionary=True)
-        query = """
-            SELECT 
-                a.date,
-                a.source_type,
-                a.raw_value,
-                a.unit,
-                e.factor,
-                (a.raw_value * e.factor / 1000) as emissions_tonnes
-            FROM activity_data a
-            JOIN emission_factors e ON a.source_type = e.source_type
-            WHERE a.date BETWEEN %s AND %s
-            ORDER BY a.date
-        """
-        cursor.execute(query, (start_date, end_date))
-        results = cursor.fetchall()
-
-        total_emissions = sum(row['emissions_tonnes'] for row in results)
-
-        source_breakdown = {}
-        for row in results:
-            source = row['source_type']
-            source_breakdown[source] = source_breakdown.get(source, 0) + row['emissions_tonnes']
-
-        biggest_source = max(source_breakdown.items(), key=lambda x: x[1]) if source_breakdown else ('N/A', 0)
-
-        monthly_data = {}
-        for row in results:
-            month = str(row['date'])[:7]
-            monthly_data[month] = monthly_data.get(month, 0) + row['emissions_tonnes']
-
-        # Weekly and yearly aggregations for comparison charts
-        weekly_data = {}
-        yearly_data = {}
-        for row in results:
-            raw_date = row['date']
-            if isinstance(raw_date, datetime):
-                d = raw_date.date()
-            else:
-                try:
-                    d = datetime.strptime(str(raw_date), '%Y-%m-%d').date()
-                except Exception:
-                    continue
-
-            year = d.year
-            iso_year, iso_week, _ = d.isocalendar()
-            week_label = f"{iso_year}-W{iso_week:02d}"
-
-            weekly_data[week_label] = weekly_data.get(week_label, 0) + row['emissions_tonnes']
-            yearly_data[year] = yearly_data.get(year, 0) + row['emissions_tonnes']
-
-        # Previous period uses same window length as current selection
-        prev_start_dt = start_dt - timedelta(days=window_days)
-        prev_start = prev_start_dt.strftime('%Y-%m-%d')
-        prev_end = start_dt.strftime('%Y-%m-%d')
-        cursor.execute(query, (prev_start, prev_end))
-        prev_results = cursor.fetchall()
-        prev_emissions = sum(row['emissions_tonnes'] for row in prev_results)
-
-        percent_change = 0.0
-        if prev_emissions > 0:
-            percent_change = ((total_emissions - prev_emissions) / prev_emissions) * 100.0
-
-        weekly_comparison = [
-            {'label': label, 'emissions': round(val, 2)}
-            for label, val in sorted(weekly_data.items())
-        ]
-        yearly_comparison = [
-            {'year': year, 'emissions': round(val, 2)}
-            for year, val in sorted(yearly_data.items())
-        ]
-
-        energy_saved = 0
-        for row in results:
-            if row['source_type'] == 'electricity':
-                try:
-                    energy_saved += float(row['raw_value'])
-                except Exception:
-                    try:
-                        energy_saved += row['raw_value']
-                    except Exception:
-                        pass
+    # Serve repeat views from a live cache entry (or a bare 304) without touching MySQL
+    # Each encoding is its own cached representation with its own ETag
+    encoding = codec.negotiate(request.headers.get('Accept-Encoding'))
+    cache_key = (start_date, end_date, resolution, max_points, ','.join(fields), response_format,
+                 encoding or 'identity', ','.join(map(str, campus_ids)))
+    version = dashboard_cache.version()
+    cached = dashboard_cache.get(cache_key, version)
+    if cached is not None:
+        body, etag, last_modified = cached
+        if _not_modified(etag, last_modified, explicit_range=explicit_range):
+            return _cacheable_response(None, etag, last_modified, status=304)
+        return _cacheable_response(body, etag, last_modified, encoding=encoding)
+
+    # Previous period uses same window length as current selection (KPIs only)
+    prev_range = None
+    if 'kpis' in fields:
+        prev_range = ((start_dt - timedelta(days=window_days)).strftime('%Y-%m-%d'), start_dt.strftime('%Y-%m-%d'))
+    need_humans = not EMISSION_ONLY_SECTIONS.issuperset(fields)
+
+    def load_campus(connection, campus_id):
+        # One pre-aggregated row per (day, source) from the rollup table, so the
+        # cost depends on the number of buckets, not on how often the meters
+        # report or how large activity_data has grown.
+        campus_buckets = db.run_query(connection, 'dashboard_buckets', (campus_id, start_date, end_date))
+        campus_prev = 0.0
+        if prev_range:
+            prev_rows = db.run_query(connection, 'period_emissions', (campus_id,) + prev_range)
+            campus_prev = float(prev_rows[0][0] or 0) if prev_rows else 0.0
 
         # Fetch human count data for the date range (handle missing table gracefully)
-        human_count_results = []
+        campus_humans = []
         try:
-            cursor.execute(
-                "SELECT date, humans FROM human_count WHERE date BETWEEN %s AND %s ORDER BY date",
-                (start_date, end_date)
-            )
-            human_count_results = cursor.fetchall()
-            logger.info(f"Fetched {len(human_count_results)} human count records for range {start_date} to {end_date}")
-            if len(human_count_results) > 0:
-                logger.info(f"Sample human count record: {human_count_results[0]}")
+            if need_humans:
+                campus_humans = db.run_query(connection, 'human_counts', (campus_id, start_date, end_date))
         except Exception as e:
             # Table doesn't exist yet - this is okay, just log and continue
-            if "doesn't exist" in str(e) or "1146" in str(e):
+            if "doesn't exist" in str(e) or "1146" in str(e) or "no such table" in str(e):
                 logger.warning(f"human_count table doesn't exist yet. Run database/init_db.py to create it. Error: {e}")
             else:
                 logger.error(f"Error fetching human count data: {e}")
-            human_count_results = []
-        
-        # Create a dictionary mapping date to human count (normalize date format)
-        human_count_by_date = {}
-        for row in human_count_results:
-            date_val = row['date']
-            # Handle different date formats from MySQL
-            if isinstance(date_val, (datetime, date)):
-                date_str = date_val.strftime('%Y-%m-%d')
-            elif hasattr(date_val, 'strftime'):
-                # date object from datetime.date
-                date_str = date_val.strftime('%Y-%m-%d')
-            elif isinstance(date_val, str):
-                date_str = date_val[:10]  # Take first 10 chars (YYYY-MM-DD)
-            else:
-                # Try to convert to string and extract date part
-                try:
-                    date_str = str(date_val)[:10]
-                except:
-                    date_str = str(date_val)
-            human_count_by_date[date_str] = row['humans']
-            logger.info(f"Human count for {date_str}: {row['humans']}")
-        
-        # Calculate daily emissions (sum all sources for each date)
-        daily_emissions = {}
-        for row in results:
-            date_val = row['date']
-            # Handle different date formats from MySQL
-            if isinstance(date_val, (datetime, date)):
-                date_str = date_val.strftime('%Y-%m-%d')
-            elif hasattr(date_val, 'strftime'):
-                # date object from datetime.date
-                date_str = date_val.strftime('%Y-%m-%d')
-            elif isinstance(date_val, str):
-                date_str = date_val[:10]
-            else:
-                try:
-                    date_str = str(date_val)[:10]
-                except:
-                    date_str = str(date_val)
-            daily_emissions[date_str] = daily_emissions.get(date_str, 0) + row['emissions_tonnes']
-        
-        # Get all unique dates (from both emissions and human count)
-        all_dates = set(daily_emissions.keys()) | set(human_count_by_date.keys())
-        logger.info(f"Total unique dates: {len(all_dates)} (emissions: {len(daily_emissions)}, human_count: {len(human_count_by_date)})")
-        
-        # Calculate per-person emissions and prepare daily data
-        daily_human_data = []
-        daily_per_person_data = []
-        per_person_emissions_list = []
-        total_humans = 0
-        total_human_responsible_emissions = 0
-        
-        for date_str in sorted(all_dates):
-            daily_emission = daily_emissions.get(date_str, 0)
-            humans = human_count_by_date.get(date_str, 0)
-            
-            # Always include human count data, even if no emissions
-            daily_human_data.append({
-                'date': date_str,
-                'humans': humans
-            })
-            
-            if humans > 0 and daily_emission > 0:
-                per_person_emission = daily_emission / humans
-                daily_per_person_data.append({
-                    'date': date_str,
-                    'per_person_emission': round(per_person_emission, 4)
-                })
-                per_person_emissions_list.append({
-                    'date': date_str,
-                    'per_person_emission': per_person_emission
-                })
-                total_humans += humans
-                total_human_responsible_emissions += per_person_emission * humans
-            elif daily_emission > 0:
-                # Has emissions but no human count
-                daily_per_person_data.append({
-                    'date': date_str,
-                    'per_person_emission': None
-                })
-            elif humans > 0:
-                # Has human count but no emissions - still include with null per-person
-                daily_per_person_data.append({
-                    'date': date_str,
-                    'per_person_emission': None
-                })
-                total_humans += humans
-        
-        # Calculate metrics
-        avg_per_person_emission = 0.0
-        if len(per_person_emissions_list) > 0:
-            avg_per_person_emission = sum(p['per_person_emission'] for p in per_person_emissions_list) / len(per_person_emissions_list)
-        
-        highest_per_person_day = None
-        highest_per_person_value = 0.0
-        if per_person_emissions_list:
-            highest = max(per_person_emissions_list, key=lambda x: x['per_person_emission'])
-            highest_per_person_day = highest['date']
-            highest_per_person_value = highest['per_person_emission']
-
-        dashboard_data = {
-            'kpis': {
-                'total_emissions': round(total_emissions, 2),
-                'percent_change': round(percent_change, 2),
-                'biggest_source': biggest_source[0],
-                'biggest_source_percent': round((biggest_source[1] / total_emissions * 100) if total_emissions > 0 else 0, 1),
-                'energy_saved': round(energy_saved, 0),
-                'total_humans': total_humans,
-                'avg_per_person_emission': round(avg_per_person_emission, 4) if avg_per_person_emission > 0 else None,
-                'highest_per_person_emission_day': highest_per_person_day,
-                'highest_per_person_emission_value': round(highest_per_person_value, 4) if highest_per_person_day else None
-            },
-            'monthly_trend': [
-                {'month': month, 'emissions': round(emissions, 2)}
-                for month, emissions in sorted(monthly_data.items())
-            ],
-            'source_breakdown': [
-                {'source': source, 'emissions': round(emissions, 2), 'percentage': round((emissions / total_emissions * 100) if total_emissions > 0 else 0, 1)}
-                for source, emissions in source_breakdown.items()
-            ],
-            'weekly_comparison': weekly_comparison,
-            'yearly_comparison': yearly_comparison,
-            'daily_human_count': daily_human_data,
-            'daily_per_person_emission': daily_per_person_data,
-            'emissions_comparison': {
-                'total_operational_emissions': round(total_emissions, 2),
-                'total_human_responsible_emissions': round(total_human_responsible_emissions, 2)
-            }
-        }
-        logger.info(f"Returning dashboard data with {len(daily_human_data)} human count entries and {len(daily_per_person_data)} per-person entries")
-        return jsonify(dashboard_data)
+            campus_humans = []
+        return campus_buckets, campus_humans, campus_prev
+
+    try:
+        results = db.fan_out(load_campus, campus_ids)
+        if len(results) == 1:
+            buckets, human_count_results, prev_emissions = results[0]
+        else:
+            # DashboardWindow needs no particular row order and sums the campuses' rows per day/source
+            buckets = [row for r in results for row in r[0]]
+            human_count_results = [row for r in results for row in r[1]]
+            prev_emissions = sum(r[2] for r in results)
+
+        with metrics.DASHBOARD_STAGE_SECONDS.time(stage='aggregate'):
+            window = DashboardWindow(buckets, human_count_results, prev_emissions)
+            dashboard_data = window.payload(resolution, max_points, fields)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Dashboard %s..%s: %d campus(es), %d buckets, %d human count rows, sections %s",
+                start_date, end_date, len(campus_ids), len(buckets), len(human_count_results), ','.join(fields),
+            )
+        with metrics.DASHBOARD_STAGE_SECONDS.time(stage='serialize'):
+            if response_format == 'compact':
+                dashboard_data = codec.columnar(dashboard_data)
+            body = codec.dumps(dashboard_data)
+        # Hashed before compression, which need not be deterministic
+        etag = dashboard_cache.etag(cache_key, body)
+        if encoding:
+            with metrics.DASHBOARD_STAGE_SECONDS.time(stage='compress'):
+                body = codec.compress(body, encoding)
+        last_modified = dashboard_cache.put(cache_key, version, body, etag)
+        if _not_modified(etag, last_modified, explicit_range=explicit_range):
+            # Rebuilt after the entry expired, but unchanged for this client
+            return _cacheable_response(None, etag, last_modified, status=304)
+        return _cacheable_response(body, etag, last_modified, encoding=encoding)
+    except PoolError:
+        raise
     except Exception as e:
         logger.exception("Error building dashboard data")
         return jsonify({'error': 'Internal error'}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        try:
-            connection.close()
-        except Exception:
-            pass
 
 @app.route('/api/recommendations', methods=['GET'])
 def get_recommendations():
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({'error': 'Database connection error'}), 500
-
-    cursor = None
+    """
+    Public recommendations (no auth), built from the materialized
+    source_emissions_summary rows (one per source) instead of the raw data.
+    """
     try:
-        cursor = connection.cursor(dictionary=True)
-        query = """
-            SELECT 
-                a.source_type,
-                SUM(a.raw_value * e.factor / 1000) as total_emissions
-            FROM activity_data a
-            JOIN emission_factors e ON a.source_type = e.source_type
-            GROUP BY a.source_type
-            ORDER BY total_emissions DESC
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-
-        recommendations = []
-        if results:
-            top_source = results[0]['source_type']
-
-            if top_source == 'electricity':
-                recommendations.append({
-                    'title': 'Focus on Energy Efficiency',
-                    'description': 'Electricity is your biggest emission source. Consider switching to LED lighting and installing solar panels.',
-                    'priority': 'High'
-                })
-            elif top_source == 'bus_diesel':
-                recommendations.append({
-                    'title': 'Promote Green Transportation',
-                    'description': 'Transport emissions are high. Encourage carpooling, cycling, and consider electric buses.',
-                    'priority': 'High'
-                })
-            elif top_source == 'canteen_lpg':
-                recommendations.append({
-                    'title': 'Optimize Canteen Operations',
-                    'description': 'Canteen fuel usage is significant. Consider induction cooking or solar cookers.',
-                    'priority': 'Medium'
-                })
-            elif top_source == 'waste_landfill':
-                recommendations.append({
-                    'title': 'Improve Waste Management',
-                    'description': 'Waste emissions are high. Implement composting and recycling programs.',
-                    'priority': 'High'
-                })
-
-            recommendations.append({
-                'title': 'Regular Monitoring',
-                'description': 'Continue tracking emissions data monthly to identify trends and measure improvement.',
-                'priority': 'Medium'
-            })
-
-            recommendations.append({
-                'title': 'Campus Awareness Campaign',
-                'description': 'Educate students and staff about sustainable practices and carbon footprint reduction.',
-                'priority': 'Low'
-            })
-
+        with metrics.QUERY_SECONDS.time(query='recommendations_summary'):
+            rows = summary.fetch(db.cursor())
+        metrics.ROWS_FETCHED.inc(len(rows), query='recommendations_summary')
+        recommendations = build_recommendations(rows)
         return jsonify({'recommendations': recommendations})
+    except PoolError:
+        raise
     except Exception as e:
         logger.exception("Error fetching recommendations")
         return jsonify({'error': 'Internal error'}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        try:
-            connection.close()
-        except Exception:
-            pass
 
 
 @app.route('/api/upload_csv', methods=['POST'])
 @api_token_required
 def upload_csv():
-    """Accepts JSON payload with 'records': [{date, source_type, raw_value, unit}, ...]
-    Validates format and inserts rows into activity_data. Returns 400 with error on invalid format.
+    """Accepts JSON payload with 'records': [{date, source_type, raw_value, unit[, meter_id, reading_time, campus]}, ...]
+    Validates format and upserts rows into activity_data on their natural key, so re-uploading
+    the same file is harmless. Returns 400 with error on invalid format.
     """
     data = request.get_json() or {}
     records = data.get('records')
@@ -705,46 +704,243 @@ def upload_csv():
         return jsonify({'error': 'Invalid CSV format.'}), 400
 
     # Basic validation of each record
+    insert_values = []
+    boundary = archive.get_boundary(db.cursor)
+    campus_ids = campuses.get_ids(db.cursor)
     for rec in records:
         if not isinstance(rec, dict):
             return jsonify({'error': 'Invalid CSV format.'}), 400
-        if not all(k in rec for k in ('date', 'source_type', 'raw_value', 'unit')):
-            return jsonify({'error': 'Invalid CSV format.'}), 400
-        try:
-            # Attempt to coerce raw_value to float
-            rec['raw_value'] = float(rec['raw_value'])
-        except Exception:
+        values, error = validate_record(rec, boundary, campus_ids)
+        if error:
             return jsonify({'error': 'Invalid CSV format.'}), 400
+        insert_values.append(values)
 
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({'error': 'Database connection error'}), 500
-
-    cursor = None
     try:
-        cursor = connection.cursor()
-        insert_stmt = "INSERT INTO activity_data (date, source_type, raw_value, unit) VALUES (%s, %s, %s, %s)"
-        insert_values = []
-        for rec in records:
-            insert_values.append((rec['date'], rec['source_type'], rec['raw_value'], rec['unit']))
-
-        cursor.executemany(insert_stmt, insert_values)
-        connection.commit()
-        return jsonify({'success': True, 'message': f'{len(insert_values)} records inserted.'}), 201
+        batches = upsert_activity_records(db.cursor(), insert_values)
+        db.commit()
+        totals = sum_batches(batches)
+        if totals['inserted'] or totals['updated']:
+            dashboard_cache.bump()
+        message = (
+            f"{len(insert_values)} records processed: {totals['inserted']} inserted, "
+            f"{totals['updated']} updated, {totals['unchanged']} unchanged."
+        )
+        return jsonify({'success': True, 'message': message, 'batches': batches, **totals}), 201
+    except PoolError:
+        raise
     except Exception as e:
         logger.exception('Error inserting CSV records')
-        try:
-            connection.rollback()
-        except Exception:
-            pass
+        db.rollback()
         return jsonify({'error': 'Failed to insert CSV data.'}), 500
-    finally:
-        if cursor:
-            cursor.close()
+
+@app.route('/api/upload_csv/stream', methods=['POST'])
+@api_token_required
+def upload_csv_stream():
+    """Streams a raw CSV body (text/csv) or a multipart `file` field into activity_data.
+    Rows are parsed incrementally and inserted in CSV_CHUNK_SIZE chunks, each in its own
+    commit, so memory does not grow with the file. Invalid rows are skipped and reported.
+    """
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if not upload:
+            return jsonify({'error': "Missing 'file' field."}), 400
+        stream = upload.stream
+    else:
+        stream = request.stream
+
+    try:
+        result = ingest_csv_stream(db.get_connection(), text_stream(stream), chunk_size=CSV_CHUNK_SIZE)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid CSV format. {e}'}), 400
+    except PoolError:
+        raise
+    except Exception as e:
+        logger.exception('Error streaming CSV upload')
+        return jsonify({'error': 'Failed to insert CSV data.'}), 500
+
+    if any(b['inserted'] or b['updated'] for b in result['batches']):
+        dashboard_cache.bump()
+    result['success'] = 'error' not in result and result['accepted'] > 0
+    result['message'] = f"{result['accepted']} records accepted, {result['rejected']} rejected."
+    logger.info("Streamed CSV upload: %s", result['message'])
+    if 'error' in result:
+        return jsonify(result), 500
+    return jsonify(result), 201 if result['accepted'] else 400
+
+
+@app.route('/api/ingest', methods=['POST'])
+@api_token_required
+def ingest_ndjson():
+    """Streams newline-delimited JSON readings (application/x-ndjson), one object per line,
+    for gateways pushing many readings in one long-lived (chunked) request. Records are
+    validated as they arrive and inserted in CSV_CHUNK_SIZE chunks, or every
+    INGEST_FLUSH_SECONDS when they trickle in. Rejected lines are reported with their
+    line number and byte offset.
+    """
+    records = iter_ndjson_records(request.stream, INGEST_MAX_LINE_BYTES, INGEST_READ_BYTES)
+    try:
+        result = ingest_records(db.get_connection(), records, chunk_size=CSV_CHUNK_SIZE,
+                                flush_seconds=INGEST_FLUSH_SECONDS)
+    except PoolError:
+        raise
+    except Exception as e:
+        logger.exception('Error streaming NDJSON ingest')
+        return jsonify({'error': 'Failed to ingest data.'}), 500
+
+    # A long-lived request can commit thousands of chunks: report totals, not per-chunk counts
+    totals = sum_batches(result.pop('batches'))
+    result.update(inserted=totals['inserted'], updated=totals['updated'], unchanged=totals['unchanged'])
+    if totals['inserted'] or totals['updated']:
+        dashboard_cache.bump()
+    result['success'] = 'error' not in result and result['accepted'] > 0
+    result['message'] = f"{result['accepted']} records accepted, {result['rejected']} rejected."
+    logger.info("NDJSON ingest: %s", result['message'])
+    if 'error' in result:
+        return jsonify(result), 500
+    return jsonify(result), 201 if result['accepted'] else 400
+
+
+@app.route('/api/upload_csv/jobs', methods=['POST'])
+@api_token_required
+def upload_csv_job():
+    """Queues a raw CSV body (text/csv) or a multipart `file` field for background import.
+    Returns 202 with the job id at once; poll GET /api/jobs/<id> for progress.
+    """
+    filename = None
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if not upload:
+            return jsonify({'error': "Missing 'file' field."}), 400
+        stream, filename = upload.stream, upload.filename
+    else:
+        stream = request.stream
+
+    user_id = session.get('user_id') or getattr(request, 'user_id', None)
+    # Authentication may have checked out a connection: don't hold it while the body uploads
+    db.release()
+    try:
+        job_id = job_runner.submit(db.get_connection, stream, filename, user_id)
+    except PoolError:
+        raise
+    except Exception as e:
+        logger.exception('Error queuing CSV import')
+        return jsonify({'error': 'Failed to queue CSV import.'}), 500
+
+    logger.info("Queued CSV import job %s", job_id)
+    status_url = url_for('get_job', job_id=job_id)
+    response = jsonify({'success': True, 'job_id': job_id, 'status': 'queued', 'status_url': status_url})
+    response.headers['Location'] = status_url
+    return response, 202
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@api_token_required
+def get_job(job_id):
+    """Status, progress, throughput and rejected lines of a background import."""
+    try:
+        cursor = db.cursor()
+        job = import_jobs.load_job(cursor, job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        errors = import_jobs.load_errors(cursor, job_id) if job['rejected'] else []
+        return jsonify(jobs.describe(job, errors))
+    except PoolError:
+        raise
+    except Exception as e:
+        logger.exception('Error fetching job %s', job_id)
+        return jsonify({'error': 'Internal error'}), 500
+
+@app.route('/api/export', methods=['GET'])
+@api_token_required
+def export_activity():
+    """Streams readings with their emissions as CSV (default) or NDJSON (`format`).
+    `start_date`/`end_date` (YYYY-MM-DD), `source` and `campus` (comma-separated) filter them,
+    and `after` resumes a dropped download after its last complete row (see export.py).
+    Rows come off an unbuffered cursor, so memory does not grow with the export.
+    """
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in export.FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(export.FORMATS)}"}), 400
+    try:
+        start, end = (
+            datetime.strptime(request.args[name], '%Y-%m-%d').date() if request.args.get(name) else None
+            for name in ('start_date', 'end_date')
+        )
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    campus_map = campuses.get_ids(db.cursor)
+    try:
+        campus_ids = campuses.parse_codes(request.args.get('campus', ''), campus_map)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        after = export.parse_after(request.args['after'], campus_map) if request.args.get('after') else None
+    except ValueError:
+        return jsonify({'error': 'after must be date,campus,source_type,meter_id,reading_time of the last row'}), 400
+    source_types = [s.strip() for s in request.args.get('source', '').split(',') if s.strip()]
+    boundary = archive.get_boundary(db.cursor)
+
+    if not export_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many exports running, please retry'}), 503, {'Retry-After': '30'}
+    try:
+        # Not the request's connection: teardown runs before the body is streamed
+        connection = pool.acquire()
+    except Exception:
+        export_slots.release()
+        raise
+    finished = []
+
+    def body():
         try:
-            connection.close()
+            yield from export.stream(connection, fmt, start, end, source_types, after, campus_ids)
         except Exception:
-            pass
+            logger.exception('Export failed')
+            raise
+        finished.append(True)
+
+    def release():
+        # A download cut short leaves unread rows on the connection: discard it
+        if finished:
+            connection.close()
+        else:
+            connection.invalidate()
+        export_slots.release()
+
+    response = Response(body(), mimetype=export.FORMATS[fmt])
+    response.call_on_close(release)
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="activity_{start or "all"}_{end or "all"}.{fmt}"'
+    )
+    if boundary is not None and (start is None or start <= boundary):
+        # Those readings are in the yearly archive files, not in this export
+        response.headers['X-Archived-Through'] = boundary.isoformat()
+    return response
+
+
+@app.route('/api/campuses', methods=['GET'])
+def list_campuses():
+    """Public list of campuses (code and name) for the dashboard's `campus` filter."""
+    try:
+        return jsonify({'campuses': [
+            {'code': c['code'], 'name': c['name']} for c in campuses.fetch(db.cursor())
+        ]})
+    except PoolError:
+        raise
+    except Exception as e:
+        logger.exception("Error fetching campuses")
+        return jsonify({'error': 'Internal error'}), 500
+
+
+@app.route('/api/db/pool', methods=['GET'])
+def db_pool_stats():
+    """Connection pool usage (in use, waiters, wait times, checkouts/sec) for sizing DB_POOL_SIZE."""
+    return jsonify(pool.stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, query and pool metrics in the Prometheus text format."""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
 
 # ---- App run ----
 if __name__ == '__main__':
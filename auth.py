@@ -0,0 +1,165 @@
+"""
+Fast-path API authentication.
+
+- `TokenVerifier` checks a JWT's signature once and keeps its claims in a
+  bounded LRU until the token's `exp`. Later calls with the same token are
+  answered by a dict lookup. Tokens carry a `jti`; revoked ids are refused
+  even when the claims are cached.
+- `CredentialStore` holds the active API keys and revoked token ids in
+  memory. It reloads them from the database at most every `refresh`
+  seconds, so a request authenticates without a database round trip.
+  An unknown key id is looked up on its own (at most one lookup every
+  `lookup_interval` seconds), so a new key works at once. Revocations
+  made through this process apply at once. Other workers pick them up
+  on their next reload. Until the first load succeeds, no credential
+  can be checked and the store raises `CredentialsUnavailable`.
+"""
+import hmac
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+from database import credentials
+
+logger = logging.getLogger(__name__)
+
+
+class CredentialsUnavailable(Exception):
+    """API keys and revoked tokens have never been loaded (database unreachable since startup)."""
+
+    def __init__(self, retry_after):
+        super().__init__('API credentials are not loaded yet')
+        self.retry_after = retry_after
+
+
+class CredentialStore:
+    """In-memory copy of api_keys and revoked_tokens."""
+
+    def __init__(self, refresh=30.0, lookup_interval=0.1, retry=5.0):
+        self.refresh = refresh
+        self.lookup_interval = lookup_interval
+        self.retry = min(retry, refresh)  # reload interval until the first load succeeds
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._api_keys = {}
+        self._revoked = frozenset()
+        self._loaded = False
+        self._next_reload = 0.0
+        self._next_lookup = 0.0
+
+    def _maybe_reload(self, cursor_factory):
+        now = time.monotonic()
+        with self._lock:
+            due = now >= self._next_reload
+            if due:
+                self._next_reload = now + self.refresh  # one reloader at a time; others keep the current copy
+        if due:
+            self._reload(cursor_factory, now)
+        elif not self._loaded:
+            # Wait for a first load another thread is running
+            with self._load_lock:
+                pass
+        if not self._loaded:
+            raise CredentialsUnavailable(retry_after=max(int(self.retry), 1))
+
+    def _reload(self, cursor_factory, now):
+        with self._load_lock:
+            try:
+                cursor = cursor_factory()
+                api_keys = credentials.load_api_keys(cursor)
+                revoked = frozenset(credentials.load_revoked(cursor))
+            except Exception as e:
+                # Keep serving the last copy; try again after the next interval
+                logger.warning(f"Could not reload API keys / revoked tokens: {e}")
+                if not self._loaded:
+                    with self._lock:
+                        self._next_reload = now + self.retry
+                return
+            with self._lock:
+                self._api_keys = api_keys
+                self._revoked = revoked
+                self._loaded = True
+
+    def _lookup(self, key_id, cursor_factory):
+        """Entry of a key created since the last reload, or None (also when rate-limited)."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_lookup:
+                return None
+            self._next_lookup = now + self.lookup_interval
+        try:
+            entry = credentials.load_api_key(cursor_factory(), key_id)
+        except Exception as e:
+            logger.warning(f"Could not look up API key {key_id}: {e}")
+            return None
+        if entry is not None:
+            with self._lock:
+                self._api_keys = {**self._api_keys, key_id: entry}
+        return entry
+
+    def api_key(self, key, cursor_factory):
+        """(key_id, user_id) for a valid API key, else None. Raises CredentialsUnavailable."""
+        parsed = credentials.parse_api_key(key)
+        if parsed is None:
+            return None
+        self._maybe_reload(cursor_factory)
+        key_id, secret = parsed
+        entry = self._api_keys.get(key_id)
+        if entry is None:
+            entry = self._lookup(key_id, cursor_factory)
+        if entry is None or not hmac.compare_digest(entry[0], credentials.hash_secret(secret)):
+            return None
+        return key_id, entry[1]
+
+    def is_revoked(self, jti, cursor_factory):
+        self._maybe_reload(cursor_factory)
+        return jti in self._revoked
+
+    def add_revoked(self, jti):
+        with self._lock:
+            self._revoked = self._revoked | {jti}
+
+
+class TokenVerifier:
+    """Verifies HS256 JWTs, caching the claims of valid ones until they expire."""
+
+    def __init__(self, secret, maxsize=10000):
+        self.secret = secret
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._claims = OrderedDict()  # token -> claims
+        self.hits = 0
+        self.misses = 0
+
+    def verify(self, token):
+        """
+        Claims of a valid token. Raises jwt.ExpiredSignatureError or
+        jwt.InvalidTokenError like jwt.decode.
+        """
+        with self._lock:
+            claims = self._claims.get(token)
+            if claims is not None:
+                if claims['exp'] > time.time():
+                    self._claims.move_to_end(token)
+                    self.hits += 1
+                    return claims
+                del self._claims[token]
+        claims = jwt.decode(token, self.secret, algorithms=['HS256'], options={'require': ['exp']})
+        with self._lock:
+            self.misses += 1
+            self._claims[token] = claims
+            if len(self._claims) > self.maxsize:
+                self._claims.popitem(last=False)
+        return claims
+
+    def forget(self, token):
+        with self._lock:
+            self._claims.pop(token, None)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._claims), 'maxsize': self.maxsize,
+                    'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1 @@
+"""Performance benchmarks for the Campus Carbon Footprint Analyzer."""
@@ -0,0 +1,152 @@
+"""
+Benchmark: columnar dashboard aggregation vs. the original per-row loops.
+
+Builds a synthetic window of readings (1M rows by default) and times
+building the dashboard payload with `aggregation.DashboardWindow` against
+a copy of the loop code `get_dashboard_data` used before. Both must
+produce the same totals.
+
+    python -m benchmarks.bench_aggregation --rows 1000000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from aggregation import DashboardWindow
+
+FACTORS = {'electricity': 0.708, 'bus_diesel': 2.68, 'canteen_lpg': 2.93, 'waste_landfill': 1.25}
+SCALE = {'electricity': 4000, 'bus_diesel': 170, 'canteen_lpg': 27, 'waste_landfill': 70}
+
+
+def synthetic_window(rows, days, seed=42):
+    """Returns (dict rows as the old dictionary cursor produced them, human_count rows)."""
+    rng = random.Random(seed)
+    start = date(2025, 1, 1)
+    sources = list(FACTORS)
+    readings = []
+    for _ in range(rows):
+        source = rng.choice(sources)
+        raw_value = rng.random() * SCALE[source]
+        readings.append({
+            'date': start + timedelta(days=rng.randrange(days)),
+            'source_type': source,
+            'raw_value': raw_value,
+            'emissions_tonnes': raw_value * FACTORS[source] / 1000,
+        })
+    readings.sort(key=lambda r: r['date'])
+    humans = [{'date': start + timedelta(days=i), 'humans': rng.randint(1500, 3000)} for i in range(days)]
+    return readings, humans
+
+
+def legacy_payload(results, human_count_results, prev_emissions):
+    """The per-row aggregation loops from the original get_dashboard_data."""
+    total_emissions = sum(row['emissions_tonnes'] for row in results)
+
+    source_breakdown = {}
+    for row in results:
+        source = row['source_type']
+        source_breakdown[source] = source_breakdown.get(source, 0) + row['emissions_tonnes']
+
+    monthly_data = {}
+    for row in results:
+        month = str(row['date'])[:7]
+        monthly_data[month] = monthly_data.get(month, 0) + row['emissions_tonnes']
+
+    weekly_data = {}
+    yearly_data = {}
+    for row in results:
+        raw_date = row['date']
+        if isinstance(raw_date, datetime):
+            d = raw_date.date()
+        else:
+            try:
+                d = datetime.strptime(str(raw_date), '%Y-%m-%d').date()
+            except Exception:
+                continue
+        iso_year, iso_week, _ = d.isocalendar()
+        week_label = f"{iso_year}-W{iso_week:02d}"
+        weekly_data[week_label] = weekly_data.get(week_label, 0) + row['emissions_tonnes']
+        yearly_data[d.year] = yearly_data.get(d.year, 0) + row['emissions_tonnes']
+
+    energy_saved = 0
+    for row in results:
+        if row['source_type'] == 'electricity':
+            energy_saved += float(row['raw_value'])
+
+    human_count_by_date = {}
+    for row in human_count_results:
+        human_count_by_date[row['date'].strftime('%Y-%m-%d')] = row['humans']
+
+    daily_emissions = {}
+    for row in results:
+        date_str = row['date'].strftime('%Y-%m-%d')
+        daily_emissions[date_str] = daily_emissions.get(date_str, 0) + row['emissions_tonnes']
+
+    daily_human_data = []
+    daily_per_person_data = []
+    for date_str in sorted(set(daily_emissions) | set(human_count_by_date)):
+        daily_emission = daily_emissions.get(date_str, 0)
+        humans = human_count_by_date.get(date_str, 0)
+        daily_human_data.append({'date': date_str, 'humans': humans})
+        if humans > 0 and daily_emission > 0:
+            daily_per_person_data.append({'date': date_str, 'per_person_emission': round(daily_emission / humans, 4)})
+        elif daily_emission > 0 or humans > 0:
+            daily_per_person_data.append({'date': date_str, 'per_person_emission': None})
+
+    return {
+        'total_emissions': round(total_emissions, 2),
+        'energy_saved': round(energy_saved, 0),
+        'monthly_trend': [{'month': m, 'emissions': round(v, 2)} for m, v in sorted(monthly_data.items())],
+        'weekly_comparison': [{'label': w, 'emissions': round(v, 2)} for w, v in sorted(weekly_data.items())],
+        'yearly_comparison': [{'year': y, 'emissions': round(v, 2)} for y, v in sorted(yearly_data.items())],
+        'daily_per_person_emission': daily_per_person_data,
+    }
+
+
+def columnar_payload(rows, human_rows, prev_emissions):
+    return DashboardWindow(rows, human_rows, prev_emissions).payload()
+
+
+def best_of(fn, repeat, *args):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    results, humans = synthetic_window(args.rows, args.days)
+    # The engine is fed tuple rows, as a plain (non-dictionary) cursor returns them
+    rows = [(r['date'], r['source_type'], r['raw_value'], r['emissions_tonnes']) for r in results]
+    human_rows = [(r['date'], r['humans']) for r in humans]
+
+    legacy_s, legacy = best_of(legacy_payload, args.repeat, results, humans, 0.0)
+    columnar_s, columnar = best_of(columnar_payload, args.repeat, rows, human_rows, 0.0)
+
+    for key in ('monthly_trend', 'weekly_comparison', 'yearly_comparison', 'daily_per_person_emission'):
+        assert len(legacy[key]) == len(columnar[key]), key
+    assert abs(legacy['total_emissions'] - columnar['kpis']['total_emissions']) < 0.05
+    assert abs(legacy['energy_saved'] - columnar['kpis']['energy_saved']) <= 1
+
+    print(json.dumps({
+        'rows': args.rows,
+        'days': args.days,
+        'legacy_seconds': round(legacy_s, 4),
+        'columnar_seconds': round(columnar_s, 4),
+        'speedup': round(legacy_s / columnar_s, 1) if columnar_s else None,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
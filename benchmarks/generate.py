@@ -0,0 +1,192 @@
+"""
+Synthetic data generator for load benchmarks.
+
+Fills the configured database (DB_BACKEND / DB_* / SQLITE_PATH, as
+init_db.py) with readings for all four source types plus a daily
+human_count. Readings are per day or per 15 minutes over `--days`, from
+enough meters per source to reach `--rows`, with a seasonal curve,
+weekday/weekend swing and noise. The same seed gives the same data.
+`--campuses N` spreads the rows over N campuses (`main` plus `campus-2`..),
+each with its own meters, noise and head counts.
+Rows go in as plain multi-row inserts (duplicates of an earlier run are
+ignored) and the rollup and summary tables are rebuilt once at the end,
+so 50M rows do not go through the per-request write path.
+
+    python -m benchmarks.generate --rows 1000000
+    python -m benchmarks.generate --rows 20000000 --interval 15min --days 1095
+    python -m benchmarks.generate --rows 4000000 --campuses 4
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from database import backends, campuses, migrations, rollup, sources, summary
+from database.init_db import DB_CONFIG
+
+START = date(2023, 1, 1)
+DAYS = 3 * 365
+
+# Mean daily reading per meter and unit for each source
+SOURCES = {
+    'electricity': (4000.0, 'kWh'),
+    'bus_diesel': (170.0, 'Liters'),
+    'canteen_lpg': (27.0, 'kg'),
+    'waste_landfill': (70.0, 'kg'),
+}
+
+INTERVALS = {'day': 1, '15min': 96}  # readings per meter per day
+
+INSERT_ROWS = (
+    "INSERT IGNORE INTO activity_data "
+    "(date, campus_id, source_type, source_id, meter_id, reading_time, raw_value, unit) VALUES "
+)
+
+
+def meters_needed(rows, days, interval):
+    """Meters per source so that the whole span yields at least `rows` readings."""
+    per_meter = days * INTERVALS[interval]
+    return max(1, math.ceil(rows / (per_meter * len(SOURCES))))
+
+
+def iter_readings(rows, start=START, days=DAYS, interval='day', seed=42, meter_prefix='m'):
+    """
+    Yields (date, source_type, raw_value, unit, meter_id, reading_time)
+    tuples in date order, `rows` in total.
+    """
+    rng = random.Random(seed)
+    per_day = INTERVALS[interval]
+    meters = meters_needed(rows, days, interval)
+    slots = [f"{i * 15 // 60:02d}:{i * 15 % 60:02d}:00" for i in range(per_day)] if per_day > 1 else ['00:00:00']
+    emitted = 0
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        season = 1.0 + 0.25 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 15) / 365.0)
+        weekday = 1.0 if day.weekday() < 5 else 0.6
+        for source_type, (mean, unit) in SOURCES.items():
+            scale = mean * season * weekday / per_day
+            for m in range(meters):
+                meter_id = f"{meter_prefix}-{source_type[:4]}-{m:04d}"
+                for slot in slots:
+                    if emitted >= rows:
+                        return
+                    yield (day, source_type, round(scale * rng.uniform(0.7, 1.3), 3), unit, meter_id, slot)
+                    emitted += 1
+
+
+def iter_human_counts(start=START, days=DAYS, seed=42):
+    rng = random.Random(seed + 1)
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        base = 2600 if day.weekday() < 5 else 900
+        yield day, base + rng.randint(-200, 200)
+
+
+def ensure_campuses(cursor, count):
+    """Ids of `main` and campus-2..campus-`count`, registering the missing ones."""
+    ids = campuses.load(cursor)
+    for i in range(2, count + 1):
+        if f"campus-{i}" not in ids:
+            ids[f"campus-{i}"] = campuses.add(cursor, f"campus-{i}", f"Campus {i}")
+    return [campuses.DEFAULT_CAMPUS_ID] + [ids[f"campus-{i}"] for i in range(2, count + 1)]
+
+
+def _insert_chunk(cursor, chunk, source_ids, dialect, campus_id):
+    values = [
+        (d, campus_id, s, source_ids[s], meter_id, reading_time, raw_value, unit)
+        for d, s, raw_value, unit, meter_id, reading_time in chunk
+    ]
+    if dialect == 'sqlite':
+        # sqlite3 binds one statement per row at C speed; no SQL text to build
+        cursor.executemany(INSERT_ROWS + "(%s, %s, %s, %s, %s, %s, %s, %s)", values)
+    else:
+        cursor.execute(
+            INSERT_ROWS + ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(values)),
+            [v for row in values for v in row]
+        )
+
+
+def generate(connection, rows, start=START, days=DAYS, interval='day', seed=42, chunk_size=5000, campus_count=1):
+    """Writes the readings and human counts, then rebuilds rollup and summary. Returns stats."""
+    dialect = backends.dialect(connection)
+    cursor = connection.cursor()
+    started = time.perf_counter()
+    try:
+        source_ids = sources.resolve_source_ids(cursor, SOURCES)
+        campus_ids = ensure_campuses(cursor, campus_count)
+        connection.commit()
+
+        written = 0
+        for i, campus_id in enumerate(campus_ids):
+            campus_rows = rows // len(campus_ids) + (i < rows % len(campus_ids))
+            chunk = []
+            for reading in iter_readings(campus_rows, start, days, interval, seed + i):
+                chunk.append(reading)
+                if len(chunk) >= chunk_size:
+                    _insert_chunk(cursor, chunk, source_ids, dialect, campus_id)
+                    connection.commit()
+                    written += len(chunk)
+                    chunk = []
+                    if written % (chunk_size * 200) == 0:
+                        rate = written / (time.perf_counter() - started)
+                        print(f"   {written:,} rows ({rate:,.0f} rows/s)", file=sys.stderr)
+            if chunk:
+                _insert_chunk(cursor, chunk, source_ids, dialect, campus_id)
+                written += len(chunk)
+            connection.commit()
+        insert_seconds = time.perf_counter() - started
+
+        cursor.executemany(
+            "INSERT INTO human_count (campus_id, date, humans) VALUES (%s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE humans = VALUES(humans)",
+            [(campus_id, day, humans) for i, campus_id in enumerate(campus_ids)
+             for day, humans in iter_human_counts(start, days, seed + i)]
+        )
+        rollup_rows = rollup.rebuild(cursor)
+        summary.rebuild(cursor)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return {
+        'rows': written,
+        'campuses': len(campus_ids),
+        'meters_per_source': meters_needed(rows // len(campus_ids), days, interval),
+        'start': start.isoformat(),
+        'end': (start + timedelta(days=days - 1)).isoformat(),
+        'interval': interval,
+        'rollup_rows': rollup_rows,
+        'insert_seconds': round(insert_seconds, 2),
+        'total_seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000, help='readings to write (default 1M)')
+    parser.add_argument('--start', type=date.fromisoformat, default=START)
+    parser.add_argument('--days', type=int, default=DAYS, help='span in days (default 3 years)')
+    parser.add_argument('--interval', choices=sorted(INTERVALS), default='day')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-size', type=int, default=5000, help='rows per insert/commit')
+    parser.add_argument('--campuses', type=int, default=1, help='campuses to spread the rows over (default 1)')
+    args = parser.parse_args(argv)
+
+    connection = backends.connect(DB_CONFIG)
+    try:
+        migrations.migrate(connection)
+        stats = generate(connection, args.rows, args.start, args.days, args.interval, args.seed, args.chunk_size,
+                         max(args.campuses, 1))
+    finally:
+        connection.close()
+    print(f"✅ {stats['rows']:,} readings from {stats['meters_per_source']} meters per source "
+          f"on {stats['campuses']} campus(es), "
+          f"{stats['start']} .. {stats['end']} ({stats['total_seconds']} s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""
+Concurrent load harness for the HTTP API.
+
+Runs each scenario with `--concurrency` client threads for `--requests`
+requests and reports throughput and p50/p95/p99 latency as JSON:
+
+- dashboard_<N>d: /api/dashboard over N-day windows at random positions
+  inside the generated data (see benchmarks.generate), so most requests
+  miss the response cache;
+- recommendations: /api/recommendations;
+- upload_csv: /api/upload_csv with `--batch` new readings per request;
+- ingest: /api/ingest with `--batch` new readings per request as NDJSON;
+- data: /api/data with one new reading per request.
+
+Against a running server (`--url`), or in this process through Flask's
+test client (`--in-process`, uses the app's DB settings). Write scenarios
+authenticate with `--api-key`, or log in as `--username`/`--password`.
+With `--baseline` the run is compared to an earlier result file and the
+exit status is 1 if any scenario's p95 grew by more than `--tolerance`.
+
+    python -m benchmarks.load --url http://localhost:5000 --output bench.json
+    python -m benchmarks.load --in-process --scenarios dashboard_30d,data --baseline bench.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from benchmarks.generate import DAYS, SOURCES, START
+
+DASHBOARD_WINDOWS = (30, 180, 365, 1095)
+SCENARIOS = [f'dashboard_{d}d' for d in DASHBOARD_WINDOWS] + ['recommendations', 'upload_csv', 'ingest', 'data']
+
+
+# ---- Clients ----
+class HTTPClient:
+
+    def __init__(self, base_url, timeout=30.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, body=None, headers=None):
+        # bytes bodies are NDJSON, anything else is sent as JSON
+        if isinstance(body, bytes):
+            data, content_type = body, 'application/x-ndjson'
+        else:
+            data, content_type = json.dumps(body).encode('utf-8') if body is not None else None, 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=dict(headers or {}))
+        if data is not None:
+            req.add_header('Content-Type', content_type)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+class InProcessClient:
+
+    def __init__(self):
+        from app import app
+        self._app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self._app.test_client()
+        if isinstance(body, bytes):
+            response = client.open(path, method=method, data=body, content_type='application/x-ndjson',
+                                   headers=headers or {})
+        else:
+            response = client.open(path, method=method, json=body, headers=headers or {})
+        return response.status_code, response.get_data()
+
+
+# ---- Request factories ----
+def _dashboard(days, data_start, data_days):
+    def make(rng):
+        start = data_start + timedelta(days=rng.randrange(max(data_days - days, 1)))
+        end = start + timedelta(days=days - 1)
+        return 'GET', f"/api/dashboard?start_date={start}&end_date={end}", None
+    return make
+
+
+def _reading(rng, data_start, data_days):
+    source_type = rng.choice(list(SOURCES))
+    mean, unit = SOURCES[source_type]
+    return {
+        'date': (data_start + timedelta(days=rng.randrange(data_days))).isoformat(),
+        'source_type': source_type,
+        'raw_value': round(mean * rng.uniform(0.7, 1.3), 3),
+        'unit': unit,
+        # Unique meter ids make every write a new reading, not an update
+        'meter_id': f"bench-{rng.getrandbits(48):012x}",
+    }
+
+
+def request_factory(name, data_start, data_days, batch):
+    if name.startswith('dashboard_'):
+        return _dashboard(int(name[len('dashboard_'):-1]), data_start, data_days)
+    if name == 'recommendations':
+        return lambda rng: ('GET', '/api/recommendations', None)
+    if name == 'upload_csv':
+        return lambda rng: ('POST', '/api/upload_csv',
+                            {'records': [_reading(rng, data_start, data_days) for _ in range(batch)]})
+    if name == 'ingest':
+        return lambda rng: ('POST', '/api/ingest', b''.join(
+            json.dumps(_reading(rng, data_start, data_days)).encode('utf-8') + b'\n' for _ in range(batch)))
+    if name == 'data':
+        return lambda rng: ('POST', '/api/data', _reading(rng, data_start, data_days))
+    raise ValueError(f"unknown scenario {name}")
+
+
+# ---- Measurement ----
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def run_scenario(client, name, make_request, requests, concurrency, headers, seed):
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker(worker_id):
+        rng = random.Random(f"{seed}-{name}-{worker_id}")
+        local_latencies = []
+        local_statuses = {}
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            method, path, body = make_request(rng)
+            started = time.perf_counter()
+            try:
+                status, _ = client.request(method, path, body, headers)
+            except Exception as e:
+                status = type(e).__name__
+            local_latencies.append(time.perf_counter() - started)
+            local_statuses[str(status)] = local_statuses.get(str(status), 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if not status.startswith(('2', '3')))
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'errors': errors,
+        'statuses': statuses,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p95_ms': _ms(percentile(latencies, 95)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+        'max_ms': _ms(latencies[-1] if latencies else None),
+    }
+
+
+def auth_headers(client, api_key, username, password):
+    if api_key:
+        return {'X-API-Key': api_key}
+    status, body = client.request('POST', '/api/login', {'username': username, 'password': password})
+    if status != 200:
+        raise SystemExit(f"❌ Login as {username} failed ({status}); pass --api-key or valid credentials")
+    return {'Authorization': 'Bearer ' + json.loads(body)['token']}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Scenarios whose p95 grew by more than `tolerance` (a fraction) over the baseline."""
+    regressions = []
+    for name, current in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before or not before.get('p95_ms') or current['p95_ms'] is None:
+            continue
+        ratio = current['p95_ms'] / before['p95_ms']
+        flag = '❌' if ratio > 1 + tolerance else '✅'
+        print(f"{flag} {name:20} p95 {before['p95_ms']:>9.2f} -> {current['p95_ms']:>9.2f} ms (x{ratio:.2f})",
+              file=sys.stderr)
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', default='http://localhost:5000', help='server to load (default %(default)s)')
+    target.add_argument('--in-process', action='store_true', help="use the app's test client instead of HTTP")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated subset of: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--batch', type=int, default=100, help='readings per /api/upload_csv and /api/ingest request')
+    parser.add_argument('--data-start', type=date.fromisoformat, default=START,
+                        help='first day of generated data (as benchmarks.generate --start)')
+    parser.add_argument('--data-days', type=int, default=DAYS)
+    parser.add_argument('--api-key')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the JSON result here instead of stdout')
+    parser.add_argument('--baseline', help='earlier result file to compare p95 against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 growth (default 0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.scenarios.split(',') if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    client = InProcessClient() if args.in_process else HTTPClient(args.url)
+    writes = {'upload_csv', 'ingest', 'data'} & set(names)
+    headers = auth_headers(client, args.api_key, args.username, args.password) if writes else {}
+
+    results = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'target': 'in-process' if args.in_process else args.url,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'batch': args.batch,
+        'scenarios': {},
+    }
+    for name in names:
+        make_request = request_factory(name, args.data_start, args.data_days, args.batch)
+        result = run_scenario(client, name, make_request, args.requests, args.concurrency,
+                              headers if name in writes else {}, args.seed)
+        results['scenarios'][name] = result
+        print(f"⏱  {name:20} {result['throughput_rps']:>8} req/s  p50 {result['p50_ms']} ms  "
+              f"p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms  errors {result['errors']}",
+              file=sys.stderr)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            if compare(results, json.load(f), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Response cache for public, read-only JSON endpoints.
+
+Entries live in a bounded in-process LRU and are tagged with a data version.
+The write endpoints call `bump()` after committing, so stale entries are never
+served: a version mismatch is a miss. Changes made elsewhere (CLI scripts,
+another worker on the local backend) show up once entries expire after `ttl`.
+The version is kept in a backend. `LocalBackend` keeps them in this process. A shared
+backend (Redis via `CACHE_REDIS_URL`, or any object with the same get/set/incr
+methods) makes all workers see each other's bumps and share cached bodies.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+VERSION_KEY = 'cache:data_version'
+
+
+class LocalBackend:
+    """In-process stand-in for a shared key/value store."""
+
+    shared = False
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires = self._data.get(key, (None, None))
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._data.get(key, (0, None))[0] or 0) + 1
+            self._data[key] = (value, None)
+            return value
+
+
+class RedisBackend:
+    """Shared backend on top of redis-py (optional dependency)."""
+
+    shared = True
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(key, value, ex=int(ttl) if ttl else None)
+
+    def incr(self, key):
+        return self._client.incr(key)
+
+
+class ResponseCache:
+    """
+    LRU of serialized responses keyed on a tuple (e.g. (start_date, end_date)).
+    `maxsize` bounds the number of entries, `ttl` bounds how long an entry can
+    outlive out-of-band changes that did not go through `bump()`.
+
+    Each entry carries its own validators: an ETag hashed from the body it
+    was built from and the time it was built. A conditional request can only
+    be answered from a live entry, so validators age out with the entry and
+    a changed body never reuses an ETag.
+    """
+
+    def __init__(self, maxsize=128, ttl=300, backend=None, namespace='dashboard'):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend or LocalBackend()
+        self.namespace = namespace
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.backend.get(VERSION_KEY) is None:
+            # Seed with a timestamp so cached bodies from before a restart are never reused
+            self.backend.set(VERSION_KEY, int(time.time() * 1000))
+
+    # ---- Versioning ----
+    def version(self):
+        return int(self.backend.get(VERSION_KEY) or 0)
+
+    def bump(self):
+        """Invalidates every entry. Call after a write has been committed."""
+        version = self.backend.incr(VERSION_KEY)
+        with self._lock:
+            self._entries.clear()
+        return version
+
+    def etag(self, key, content):
+        """Strong ETag of `content` (bytes, before compression) as served under `key`."""
+        digest = hashlib.sha1('|'.join(str(k) for k in (self.namespace,) + tuple(key)).encode('utf-8'))
+        digest.update(content)
+        return digest.hexdigest()
+
+    # ---- Entries ----
+    def _backend_key(self, key, version):
+        raw = '|'.join(str(k) for k in (self.namespace, version) + tuple(key))
+        return f"cache:{self.namespace}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+    def get(self, key, version):
+        """Returns the live entry for `key` at `version` as (body, etag, last_modified), or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version and entry[2] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[3], _http_date(entry[4])
+        if self.backend.shared:
+            value = self.backend.get(self._backend_key(key, version))
+            if value is not None:
+                header, body = value.split(b'\n', 1)
+                etag, built_at = header.decode('ascii').split(' ')
+                self._store(key, version, body, etag, float(built_at))
+                self.hits += 1
+                return body, etag, _http_date(float(built_at))
+        self.misses += 1
+        return None
+
+    def put(self, key, version, body, etag):
+        """Stores `body` with its ETag; returns its Last-Modified time."""
+        built_at = time.time()
+        self._store(key, version, body, etag, built_at)
+        if self.backend.shared:
+            header = f"{etag} {built_at!r}".encode('ascii')
+            self.backend.set(self._backend_key(key, version), header + b'\n' + body, ttl=self.ttl)
+        return _http_date(built_at)
+
+    def _store(self, key, version, body, etag, built_at):
+        with self._lock:
+            self._entries[key] = (version, body, time.monotonic() + self.ttl, etag, built_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+def _http_date(ts):
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc)
+
+
+def backend_from_env():
+    """Redis backend when CACHE_REDIS_URL is set, otherwise the local stand-in."""
+    url = os.environ.get('CACHE_REDIS_URL')
+    if url:
+        return RedisBackend(url)
+    return LocalBackend()
@@ -0,0 +1,113 @@
+"""
+Wire encoding for the dashboard JSON.
+
+- `dumps` serializes with orjson when it is installed (optional
+  dependency), else with the standard library, always without whitespace;
+  `loads` parses the same way (NDJSON ingest).
+- `columnar` rewrites list-of-dict sections as parallel arrays (the
+  `format=compact` response). Keys are sent once per section instead of
+  once per point, `date` columns become day offsets from a `date_base`,
+  and `month` columns become month offsets from a `month_base`. The
+  `columnar` key lists the converted sections; `dashboard.js` expands
+  them back into rows.
+- `negotiate`/`compress` pick br (needs the optional `brotli` package) or
+  gzip from Accept-Encoding. Callers cache the compressed body, so each
+  window is compressed once per encoding.
+"""
+import gzip
+import json
+from datetime import date
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # well below the max: dashboard bodies are compressed per cache miss
+
+
+def dumps(obj):
+    """Compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """Parses JSON bytes or str; raises ValueError on invalid input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# ---- Columnar format ----
+def _month_index(label):
+    year, month = label.split('-')[:2]
+    return int(year) * 12 + int(month) - 1
+
+
+def _columns(rows):
+    """[{'date': d, 'v': x}, ...] -> {'date': [offsets], 'date_base': d0, 'v': [...]}."""
+    if not rows:
+        return {}
+    columns = {}
+    for key in rows[0]:
+        values = [row[key] for row in rows]
+        if key == 'date':
+            base = date.fromisoformat(values[0]).toordinal()
+            columns['date_base'] = values[0]
+            values = [date.fromisoformat(v).toordinal() - base for v in values]
+        elif key == 'month':
+            base = _month_index(values[0])
+            columns['month_base'] = values[0]
+            values = [_month_index(v) - base for v in values]
+        columns[key] = values
+    return columns
+
+
+def columnar(payload):
+    """Copy of a dashboard payload with every list-of-dict section in columns."""
+    compact = {'format': 'compact', 'columnar': []}
+    for name, section in payload.items():
+        if isinstance(section, list) and (not section or isinstance(section[0], dict)):
+            compact[name] = _columns(section)
+            compact['columnar'].append(name)
+        else:
+            compact[name] = section
+    return compact
+
+
+# ---- Content-Encoding ----
+def negotiate(accept_encoding):
+    """'br', 'gzip' or None for an Accept-Encoding header value."""
+    offered = {}
+    for part in (accept_encoding or '').split(','):
+        token, _, params = part.strip().partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[token] = q
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    best = max(candidates, key=lambda e: offered.get(e, offered.get('*', 0.0)))
+    return best if offered.get(best, offered.get('*', 0.0)) > 0 else None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
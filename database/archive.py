@@ -0,0 +1,412 @@
+"""
+Archival of closed years of `activity_data`.
+
+`archive --through YEAR` moves every reading up to the end of YEAR (which
+must be over) out of the live table into one gzip CSV per year in
+ARCHIVE_DIR. The files are written read-only, in the CSV upload format,
+next to a JSON manifest holding the row count, the SHA-256 and the
+per-source totals. Each file is read back and checked against the table
+before anything is deleted. Then the year is recorded in `archived_years`
+and its rows are removed (whole partitions on MySQL, see partitions.py).
+
+The pre-computed `daily_emissions_rollup` rows of archived years stay in
+place. The dashboard, including the yearly comparison chart, keeps
+showing those years, and the per-source summary keeps their lifetime
+totals. `rollup.rebuild` leaves dates up to the archive boundary alone,
+and writers refuse readings dated inside it, so the archive stays
+read-only. `restore` loads a year back into the live table.
+
+    python database/archive.py status
+    python database/archive.py archive --through 2023
+    python database/archive.py restore 2023
+"""
+import csv
+import gzip
+import hashlib
+import json
+import os
+import stat
+import sys
+import threading
+import time
+from datetime import date, datetime
+
+# Allow `python database/archive.py` to import the database package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ARCHIVE_DIR = os.environ.get(
+    'ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'archive')
+)
+ARCHIVE_CHECK_SECONDS = float(os.environ.get('ARCHIVE_CHECK_SECONDS', 60))
+
+COLUMNS = ('date', 'source_type', 'raw_value', 'unit', 'meter_id', 'reading_time', 'campus')
+FETCH_SIZE = 5000
+DELETE_CHUNK = 10000
+
+_lock = threading.Lock()
+_boundary = None
+_checked_at = float('-inf')
+
+
+# ---- Boundary ----
+def archived_through(cursor):
+    """Last archived day (Dec 31 of the newest archived year), or None."""
+    cursor.execute("SELECT MAX(year) FROM archived_years")
+    year = cursor.fetchone()[0]
+    return date(int(year), 12, 31) if year is not None else None
+
+
+def get_boundary(cursor_factory):
+    """Cached `archived_through`, re-read at most every ARCHIVE_CHECK_SECONDS."""
+    global _boundary, _checked_at
+    now = time.monotonic()
+    with _lock:
+        if now - _checked_at < ARCHIVE_CHECK_SECONDS:
+            return _boundary
+    boundary = archived_through(cursor_factory())
+    with _lock:
+        _boundary, _checked_at = boundary, now
+    return boundary
+
+
+def archived_years(cursor):
+    cursor.execute(
+        "SELECT year, row_count, raw_total, emissions_tonnes, file_name, sha256, archived_at "
+        "FROM archived_years ORDER BY year"
+    )
+    return cursor.fetchall()
+
+
+# ---- Files ----
+def file_paths(year, directory=ARCHIVE_DIR):
+    base = os.path.join(directory, f"activity_{year}")
+    return base + '.csv.gz', base + '.json'
+
+
+def _time_text(value):
+    if hasattr(value, 'total_seconds'):
+        seconds = int(value.total_seconds())
+        return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return str(value)[:8]
+
+
+def export_year(cursor, year, path):
+    """Writes the year's readings to `path` (gzip CSV). Returns (rows, raw_total)."""
+    from database import campuses
+
+    codes = {campus_id: code for code, campus_id in campuses.load(cursor).items()}
+    tmp = path + '.tmp'
+    rows = 0
+    raw_total = 0.0
+    cursor.execute(
+        "SELECT date, source_type, raw_value, unit, meter_id, reading_time, campus_id FROM activity_data "
+        "WHERE date BETWEEN %s AND %s ORDER BY date, campus_id, source_type, meter_id, reading_time",
+        (date(year, 1, 1), date(year, 12, 31))
+    )
+    with gzip.open(tmp, 'wt', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        while True:
+            batch = cursor.fetchmany(FETCH_SIZE)
+            if not batch:
+                break
+            for rec_date, source_type, raw_value, unit, meter_id, reading_time, campus_id in batch:
+                writer.writerow((str(rec_date)[:10], source_type, repr(float(raw_value)), unit,
+                                 meter_id, _time_text(reading_time), codes[int(campus_id)]))
+                raw_total += float(raw_value)
+            rows += len(batch)
+    with open(tmp, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    return rows, raw_total
+
+
+def read_archive(path):
+    """
+    Yields reading tuples (date, source_type, raw_value, unit, meter_id,
+    reading_time, campus code) from a file. Files written before campuses
+    existed have no campus column; their readings belong to the default one.
+    """
+    from database.campuses import DEFAULT_CAMPUS_CODE
+
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        if 'campus' in header:
+            for rec_date, source_type, raw_value, unit, meter_id, reading_time, campus in reader:
+                yield rec_date, source_type, float(raw_value), unit, meter_id, reading_time, campus
+        else:
+            for rec_date, source_type, raw_value, unit, meter_id, reading_time in reader:
+                yield rec_date, source_type, float(raw_value), unit, meter_id, reading_time, DEFAULT_CAMPUS_CODE
+
+
+def sha256_of(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_totals(cursor, year):
+    cursor.execute(
+        "SELECT source_type, SUM(raw_total), SUM(emissions_tonnes), SUM(row_count) FROM daily_emissions_rollup "
+        "WHERE date BETWEEN %s AND %s GROUP BY source_type ORDER BY source_type",
+        (date(year, 1, 1), date(year, 12, 31))
+    )
+    return {
+        source_type: {'raw_total': float(raw), 'emissions_tonnes': float(tonnes), 'row_count': int(count)}
+        for source_type, raw, tonnes, count in cursor.fetchall()
+    }
+
+
+# ---- Archive / restore ----
+def archive_year(connection, year, directory=ARCHIVE_DIR):
+    """Exports, verifies and records one year; its rows are removed by `remove_archived`."""
+    os.makedirs(directory, exist_ok=True)
+    data_path, manifest_path = file_paths(year, directory)
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "SELECT COUNT(*), SUM(raw_value) FROM activity_data WHERE date BETWEEN %s AND %s",
+            (date(year, 1, 1), date(year, 12, 31))
+        )
+        expected_rows, expected_raw = cursor.fetchone()
+        expected_raw = float(expected_raw or 0)
+        if os.path.exists(data_path):
+            os.chmod(data_path, stat.S_IRUSR | stat.S_IWUSR)  # a leftover of an interrupted run
+        rows, raw_total = export_year(cursor, year, data_path)
+
+        # Read the file back before trusting it with the only copy
+        check_rows = 0
+        check_raw = 0.0
+        for record in read_archive(data_path):
+            check_rows += 1
+            check_raw += record[2]
+        if not (rows == check_rows == expected_rows and abs(check_raw - expected_raw) <= 1e-6 * max(1.0, abs(expected_raw))):
+            raise RuntimeError(f"Archive of {year} does not match the table ({check_rows} rows read back, "
+                               f"{expected_rows} expected)")
+
+        sources = _source_totals(cursor, year)
+        digest = sha256_of(data_path)
+        manifest = {
+            'year': year,
+            'file': os.path.basename(data_path),
+            'sha256': digest,
+            'row_count': rows,
+            'raw_total': raw_total,
+            'emissions_tonnes': sum(s['emissions_tonnes'] for s in sources.values()),
+            'sources': sources,
+            'archived_at': datetime.utcnow().replace(microsecond=0).isoformat() + 'Z',
+        }
+        if os.path.exists(manifest_path):
+            os.chmod(manifest_path, stat.S_IRUSR | stat.S_IWUSR)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.chmod(manifest_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+        cursor.execute(
+            "INSERT INTO archived_years (year, row_count, raw_total, emissions_tonnes, file_name, sha256, archived_at) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (year, rows, raw_total, manifest['emissions_tonnes'], manifest['file'], digest,
+             datetime.utcnow().replace(microsecond=0))
+        )
+        connection.commit()
+        return manifest
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def check_unchanged(cursor, boundary):
+    """
+    Raises RuntimeError if an archived year still in the live table no
+    longer matches its archive, i.e. a reading was written to it after the
+    export (writers only see a new boundary after ARCHIVE_CHECK_SECONDS).
+    """
+    for year, row_count, raw_total, *_ in archived_years(cursor):
+        if year > boundary.year:
+            continue
+        cursor.execute(
+            "SELECT COUNT(*), SUM(raw_value) FROM activity_data WHERE date BETWEEN %s AND %s",
+            (date(year, 1, 1), date(year, 12, 31))
+        )
+        count, raw = cursor.fetchone()
+        if count and (count != row_count or abs(float(raw) - float(raw_total)) > 1e-6 * max(1.0, abs(float(raw_total)))):
+            raise RuntimeError(
+                f"{year} changed after it was archived ({count} live readings, {row_count} archived); "
+                f"run `restore {year}` and archive it again"
+            )
+
+
+def remove_archived(connection, boundary):
+    """Deletes live readings up to `boundary` (archived). Returns (partitions dropped, rows deleted)."""
+    from database import backends, partitions
+
+    mysql = backends.dialect(connection) == 'mysql'
+    cursor = connection.cursor()
+    try:
+        check_unchanged(cursor, boundary)
+        dropped = partitions.drop_before(cursor, date(boundary.year + 1, 1, 1)) if mysql else []
+        deleted = 0
+        while True:
+            if mysql:
+                cursor.execute("DELETE FROM activity_data WHERE date <= %s LIMIT %s", (boundary, DELETE_CHUNK))
+            else:
+                cursor.execute("DELETE FROM activity_data WHERE date <= %s", (boundary,))
+            deleted += cursor.rowcount
+            connection.commit()
+            if not mysql or cursor.rowcount < DELETE_CHUNK:
+                break
+        return dropped, deleted
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def archive_through(connection, through, directory=ARCHIVE_DIR, today=None):
+    """
+    Archives every not yet archived year up to `through` that has readings,
+    then removes them from the live table. Returns the manifests written.
+    """
+    today = today or date.today()
+    if through >= today.year:
+        raise ValueError(f"{through} is not closed yet; only years before {today.year} can be archived")
+    cursor = connection.cursor()
+    try:
+        done = {row[0] for row in archived_years(cursor)}
+        cursor.execute("SELECT MIN(date) FROM activity_data")
+        first = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    first_year = int(str(first)[:4]) if first else through + 1
+    manifests = []
+    for year in range(min(first_year, through + 1), through + 1):
+        if year in done:
+            continue
+        manifests.append(archive_year(connection, year, directory))
+    if manifests or done:
+        boundary = date(max(done | {m['year'] for m in manifests}), 12, 31)
+        remove_archived(connection, boundary)
+    invalidate()
+    return manifests
+
+
+def restore_year(connection, year, directory=ARCHIVE_DIR):
+    """
+    Loads an archived year back into activity_data (only the newest archived
+    year, so the boundary stays contiguous). The rollup already counts these
+    readings, so they are inserted as is. The files are kept. Returns the
+    rows restored.
+    """
+    cursor = connection.cursor()
+    try:
+        boundary = archived_through(cursor)
+        if boundary is None or boundary.year != year:
+            raise ValueError(f"Only the newest archived year ({boundary.year if boundary else 'none'}) can be restored")
+        data_path, _ = file_paths(year, directory)
+        cursor.execute("SELECT sha256 FROM archived_years WHERE year = %s", (year,))
+        if sha256_of(data_path) != cursor.fetchone()[0]:
+            raise RuntimeError(f"{data_path} does not match its recorded SHA-256")
+
+        from database import campuses, sources
+        campus_ids = campuses.load(cursor)
+        batch = []
+        restored = 0
+        source_ids = {}
+        for record in read_archive(data_path):
+            if record[1] not in source_ids:
+                source_ids.update(sources.resolve_source_ids(cursor, [record[1]]))
+            if record[6] not in campus_ids:
+                raise RuntimeError(f"{data_path} has readings of campus '{record[6]}', which is not registered")
+            batch.append((record[0], campus_ids[record[6]], record[1], source_ids[record[1]], record[4], record[5],
+                          record[2], record[3]))
+            if len(batch) >= FETCH_SIZE:
+                restored += _insert_batch(cursor, batch)
+                batch = []
+        if batch:
+            restored += _insert_batch(cursor, batch)
+        cursor.execute("DELETE FROM archived_years WHERE year = %s", (year,))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    invalidate()
+    return restored
+
+
+def _insert_batch(cursor, batch):
+    cursor.executemany(
+        "INSERT IGNORE INTO activity_data "
+        "(date, campus_id, source_type, source_id, meter_id, reading_time, raw_value, unit) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+        batch
+    )
+    return len(batch)
+
+
+def invalidate():
+    """Forces the next get_boundary call to re-read the table."""
+    global _checked_at
+    with _lock:
+        _checked_at = float('-inf')
+
+
+def main(argv=None):
+    import argparse
+
+    from database import backends
+    from database.init_db import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description='Archive closed years of activity_data to compressed files.')
+    parser.add_argument('--dir', default=ARCHIVE_DIR, help='archive directory (default %(default)s)')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('status')
+    archive_parser = sub.add_parser('archive')
+    archive_parser.add_argument('--through', type=int, required=True, help='last year to archive')
+    restore_parser = sub.add_parser('restore')
+    restore_parser.add_argument('year', type=int)
+    args = parser.parse_args(argv)
+
+    connection = backends.connect(DB_CONFIG)
+    try:
+        if args.command == 'status':
+            cursor = connection.cursor()
+            rows = archived_years(cursor)
+            cursor.close()
+            if not rows:
+                print("ℹ️ No archived years.")
+            for year, count, raw_total, tonnes, file_name, digest, archived_at in rows:
+                print(f"{year}  {count:>10,} readings  {float(tonnes):>12.2f} t CO2e  {file_name}  {archived_at}")
+        elif args.command == 'archive':
+            try:
+                manifests = archive_through(connection, args.through, args.dir)
+            except ValueError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+            for m in manifests:
+                print(f"✅ Archived {m['year']}: {m['row_count']:,} readings -> {os.path.join(args.dir, m['file'])}")
+            if not manifests:
+                print(f"ℹ️ Nothing to archive through {args.through}.")
+            if backends.dialect(connection) == 'sqlite':
+                print("ℹ️ Run VACUUM on the database file to return the freed space to the filesystem.")
+        else:
+            try:
+                rows = restore_year(connection, args.year, args.dir)
+            except ValueError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+            print(f"✅ Restored {rows:,} readings of {args.year} into activity_data.")
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
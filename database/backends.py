@@ -0,0 +1,211 @@
+"""
+Storage backends behind `get_db_connection`.
+
+DB_BACKEND selects the database:
+- `mysql` (default): mysql.connector with the DB_* settings.
+- `sqlite`: an embedded database file at SQLITE_PATH (default
+  `campus_carbon.db` in the project root), for single-node deployments,
+  tests and benchmarks. No server and no network round trips.
+
+The application's SQL is written for MySQL. SQLite connections translate
+the few dialect differences it uses (`%s` placeholders, INSERT IGNORE,
+ON DUPLICATE KEY UPDATE ... VALUES(col), SELECT ... FOR UPDATE) once per
+statement text, so every statement maps to the same SQLite text and is
+served from the connection's prepared statement cache on reuse. Upserts
+keep MySQL's semantics: a conflict on any unique key updates the row.
+"""
+import os
+import re
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",        # readers never block the writer
+    "PRAGMA synchronous = NORMAL",      # durable at checkpoints, safe with WAL
+    "PRAGMA busy_timeout = 5000",       # wait for the write lock instead of failing
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",       # 64 MiB page cache per connection
+    "PRAGMA mmap_size = 268435456",     # 256 MiB memory-mapped reads
+)
+
+# Compiled statements kept per connection (sqlite3 keys them by SQL text)
+SQLITE_STATEMENT_CACHE = 256
+
+
+def backend_name():
+    return os.environ.get('DB_BACKEND', 'mysql').strip().lower()
+
+
+def sqlite_path():
+    return os.environ.get('SQLITE_PATH') or os.path.join(PROJECT_ROOT, 'campus_carbon.db')
+
+
+def dialect(connection):
+    """'sqlite' or 'mysql' for a connection returned by `connect`."""
+    return getattr(connection, 'dialect', 'mysql')
+
+
+def database_errors():
+    """Exception types a database call can raise, for `except` clauses."""
+    errors = [sqlite3.Error]
+    try:
+        import mysql.connector
+        errors.append(mysql.connector.Error)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+def connect(mysql_config):
+    """A new connection for the configured backend. Caller closes it."""
+    if backend_name() == 'sqlite':
+        return connect_sqlite()
+    import mysql.connector
+    return mysql.connector.connect(**mysql_config)
+
+
+# ---- SQLite ----
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(' '))
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter('DATE', lambda b: date.fromisoformat(b.decode()))
+sqlite3.register_converter('TIMESTAMP', lambda b: datetime.fromisoformat(b.decode()))
+
+_VALUES_REF = re.compile(r'\bVALUES\((\w+)\)')
+_FOR_UPDATE = re.compile(r'\s+FOR\s+UPDATE\s*$', re.IGNORECASE)
+_SHARE_MODE = re.compile(r'\s+LOCK\s+IN\s+SHARE\s+MODE\s*$', re.IGNORECASE)
+_READ_ONLY = ('SELECT', 'PRAGMA', 'EXPLAIN', 'WITH')
+
+
+@lru_cache(maxsize=1024)
+def translate(sql):
+    """
+    MySQL statement text -> (SQLite text, needs write lock, is read-only).
+    `FOR UPDATE` has no SQLite equivalent; the statement instead takes the
+    database write lock up front (BEGIN IMMEDIATE) so the read-then-write
+    it guards cannot interleave with another writer. `LOCK IN SHARE MODE`
+    is dropped: SQLite writers are already serialized by that lock.
+    """
+    sql = _SHARE_MODE.sub('', sql.strip())
+    locking = bool(_FOR_UPDATE.search(sql))
+    if locking:
+        sql = _FOR_UPDATE.sub('', sql)
+    sql = sql.replace('%s', '?')
+    sql = sql.replace('INSERT IGNORE', 'INSERT OR IGNORE')
+    if 'ON DUPLICATE KEY UPDATE' in sql:
+        sql = sql.replace('ON DUPLICATE KEY UPDATE', 'ON CONFLICT DO UPDATE SET')
+        sql = _VALUES_REF.sub(r'excluded.\1', sql)
+    read_only = sql.lstrip('(').split(None, 1)[0].upper() in _READ_ONLY
+    return sql, locking, read_only
+
+
+class SQLiteCursor:
+    """mysql.connector-style cursor over sqlite3 (`dictionary=True` supported)."""
+
+    def __init__(self, connection, dictionary=False):
+        self._connection = connection
+        self._cursor = connection.raw.cursor()
+        self._dictionary = dictionary
+
+    def _begin(self, locking, read_only):
+        raw = self._connection.raw
+        if raw.in_transaction:
+            return
+        if locking:
+            raw.execute("BEGIN IMMEDIATE")
+        elif not read_only:
+            raw.execute("BEGIN")
+
+    def execute(self, operation, params=()):
+        sql, locking, read_only = translate(operation)
+        self._begin(locking, read_only)
+        self._cursor.execute(sql, tuple(params or ()))
+
+    def executemany(self, operation, seq_params):
+        sql, locking, read_only = translate(operation)
+        self._begin(locking, read_only)
+        self._cursor.executemany(sql, [tuple(p) for p in seq_params])
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield self._row(row)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """
+    mysql.connector-style connection. Transactions start implicitly on the
+    first write, as with InnoDB and autocommit off. The app keeps these in
+    its connection pool, so page and statement caches stay warm.
+    """
+    dialect = 'sqlite'
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def cursor(self, dictionary=False, **_):
+        return SQLiteCursor(self, dictionary=dictionary)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def is_connected(self):
+        return self.raw is not None
+
+    def ping(self):
+        self.raw.execute("SELECT 1").fetchone()
+
+    def close(self):
+        if self.raw is not None:
+            self.raw.close()
+            self.raw = None
+
+
+def connect_sqlite(path=None):
+    """A new connection to the SQLite file with the backend's pragmas applied."""
+    raw = sqlite3.connect(
+        path or sqlite_path(),
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        isolation_level=None,  # transactions are begun explicitly by SQLiteCursor
+        cached_statements=SQLITE_STATEMENT_CACHE,
+        check_same_thread=False,  # pooled connections move between request threads
+    )
+    for pragma in SQLITE_PRAGMAS:
+        raw.execute(pragma)
+    return SQLiteConnection(raw)
@@ -0,0 +1,124 @@
+"""
+Campuses (sites) of the group.
+
+`campuses` maps each campus code to a SMALLINT id. activity_data,
+human_count and daily_emissions_rollup carry it as `campus_id`, so every
+reading, head count and rollup row belongs to one campus. Campus 1
+(`main`) always exists and is used when a client sends no campus, so a
+single-site deployment never has to mention it.
+
+Campuses are only added here, never renamed or removed; the application
+re-reads the list at most every CAMPUS_CHECK_SECONDS.
+
+    python database/campuses.py list
+    python database/campuses.py add north "North campus"
+"""
+import os
+import re
+import sys
+import threading
+import time
+
+# Allow `python database/campuses.py` to import the database package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_CAMPUS_ID = 1
+DEFAULT_CAMPUS_CODE = 'main'
+CAMPUS_CHECK_SECONDS = float(os.environ.get('CAMPUS_CHECK_SECONDS', 60))
+
+_CODE = re.compile(r'^[a-z0-9][a-z0-9_-]{0,31}$')
+
+_lock = threading.Lock()
+_ids = None
+_checked_at = float('-inf')
+
+
+def load(cursor):
+    """{code: id} of every campus, in id order."""
+    cursor.execute("SELECT code, id FROM campuses ORDER BY id")
+    return {code: int(campus_id) for code, campus_id in cursor.fetchall()}
+
+
+def get_ids(cursor_factory):
+    """Cached `load`, re-read at most every CAMPUS_CHECK_SECONDS."""
+    global _ids, _checked_at
+    now = time.monotonic()
+    with _lock:
+        if _ids is not None and now - _checked_at < CAMPUS_CHECK_SECONDS:
+            return _ids
+    ids = load(cursor_factory())
+    with _lock:
+        _ids, _checked_at = ids, now
+    return ids
+
+
+def fetch(cursor):
+    """Campuses as dicts, in id order."""
+    cursor.execute("SELECT id, code, name FROM campuses ORDER BY id")
+    return [{'id': int(campus_id), 'code': code, 'name': name} for campus_id, code, name in cursor.fetchall()]
+
+
+def parse_codes(text, ids):
+    """Comma-separated campus codes -> [id]. Raises ValueError naming unknown codes."""
+    codes = [c.strip().lower() for c in text.split(',') if c.strip()]
+    unknown = [c for c in codes if c not in ids]
+    if unknown:
+        raise ValueError(f"Unknown campus: {', '.join(unknown)}")
+    return list(dict.fromkeys(ids[c] for c in codes))
+
+
+def add(cursor, code, name):
+    """Registers a campus and returns its id. Raises ValueError for a malformed or taken code."""
+    code = code.strip().lower()
+    if not _CODE.match(code):
+        raise ValueError('Campus code must be 1-32 lower-case letters, digits, _ or -')
+    cursor.execute("SELECT id FROM campuses WHERE code = %s", (code,))
+    if cursor.fetchone() is not None:
+        raise ValueError(f"Campus '{code}' already exists")
+    cursor.execute("INSERT INTO campuses (code, name) VALUES (%s, %s)", (code, name.strip() or code))
+    cursor.execute("SELECT id FROM campuses WHERE code = %s", (code,))
+    return int(cursor.fetchone()[0])
+
+
+def invalidate():
+    """Forces the next get_ids call to re-read the table."""
+    global _checked_at
+    with _lock:
+        _checked_at = float('-inf')
+
+
+def main(argv=None):
+    import argparse
+
+    from database import backends
+    from database.init_db import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description='Manage the campuses of the group.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list')
+    add_parser = sub.add_parser('add')
+    add_parser.add_argument('code', help='short identifier used by the API, e.g. north')
+    add_parser.add_argument('name', nargs='?', default='', help='display name')
+    args = parser.parse_args(argv)
+
+    connection = backends.connect(DB_CONFIG)
+    cursor = connection.cursor()
+    try:
+        if args.command == 'list':
+            for campus in fetch(cursor):
+                print(f"{campus['id']:>4}  {campus['code']:32}  {campus['name']}")
+            return
+        try:
+            campus_id = add(cursor, args.code, args.name)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        connection.commit()
+        print(f"✅ Added campus {args.code.strip().lower()} (id {campus_id}).")
+    finally:
+        cursor.close()
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+API keys and revoked JWTs.
+
+API keys are long-lived credentials for machine clients such as meter
+gateways. A key reads `cck_<key_id>_<secret>`; only the SHA-256 of the
+secret is stored, so the table cannot be used to recover keys.
+`revoked_tokens` holds the `jti` of JWTs revoked before their expiry
+until that expiry passes.
+
+The app keeps both tables in memory (see auth.py), so checking a
+known credential costs no database round trip.
+
+    python database/credentials.py create-key gateway-north [--user-id 1]
+    python database/credentials.py list-keys
+    python database/credentials.py revoke-key <key_id>
+"""
+import hashlib
+import os
+import secrets
+import sys
+from datetime import datetime
+
+# Allow `python database/credentials.py` to import the database package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+KEY_PREFIX = 'cck'
+
+
+def hash_secret(secret):
+    return hashlib.sha256(secret.encode('utf-8')).hexdigest()
+
+
+def parse_api_key(key):
+    """(key_id, secret) from a presented key, or None if it is malformed."""
+    parts = (key or '').strip().split('_', 2)
+    if len(parts) != 3 or parts[0] != KEY_PREFIX or not parts[1] or not parts[2]:
+        return None
+    return parts[1], parts[2]
+
+
+# ---- API keys ----
+def create_api_key(cursor, name, user_id=None):
+    """Stores a new key and returns it. The full key is only ever shown here."""
+    key_id = secrets.token_hex(8)
+    secret = secrets.token_urlsafe(32)
+    cursor.execute(
+        "INSERT INTO api_keys (key_id, name, secret_hash, user_id) VALUES (%s, %s, %s, %s)",
+        (key_id, name, hash_secret(secret), user_id)
+    )
+    return f"{KEY_PREFIX}_{key_id}_{secret}"
+
+
+def revoke_api_key(cursor, key_id):
+    """Returns True if an active key was revoked."""
+    cursor.execute(
+        "UPDATE api_keys SET revoked_at = CURRENT_TIMESTAMP WHERE key_id = %s AND revoked_at IS NULL",
+        (key_id,)
+    )
+    return cursor.rowcount > 0
+
+
+def load_api_keys(cursor):
+    """{key_id: (secret_hash, user_id, name)} for every active key."""
+    cursor.execute("SELECT key_id, secret_hash, user_id, name FROM api_keys WHERE revoked_at IS NULL")
+    return {key_id: (secret_hash, user_id, name) for key_id, secret_hash, user_id, name in cursor.fetchall()}
+
+
+def load_api_key(cursor, key_id):
+    """(secret_hash, user_id, name) of one active key, or None."""
+    cursor.execute(
+        "SELECT secret_hash, user_id, name FROM api_keys WHERE key_id = %s AND revoked_at IS NULL",
+        (key_id,)
+    )
+    row = cursor.fetchone()
+    return tuple(row) if row else None
+
+
+# ---- Revoked tokens ----
+def revoke_token(cursor, jti, expires_at):
+    """Refuses token `jti` until `expires_at` (a naive UTC datetime)."""
+    cursor.execute(
+        "INSERT INTO revoked_tokens (jti, expires_at) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE expires_at = VALUES(expires_at)",
+        (jti, expires_at)
+    )
+    # Expired tokens are refused anyway; keep the list small
+    cursor.execute("DELETE FROM revoked_tokens WHERE expires_at < %s", (datetime.utcnow(),))
+
+
+def load_revoked(cursor):
+    """Set of jti values revoked and not yet expired."""
+    cursor.execute("SELECT jti FROM revoked_tokens WHERE expires_at >= %s", (datetime.utcnow(),))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def main(argv=None):
+    import argparse
+
+    from database import backends
+    from database.init_db import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description='Manage API keys for machine clients.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    create_parser = sub.add_parser('create-key')
+    create_parser.add_argument('name', help='what the key is for, e.g. the gateway name')
+    create_parser.add_argument('--user-id', type=int, help='user the key acts for')
+    sub.add_parser('list-keys')
+    revoke_parser = sub.add_parser('revoke-key')
+    revoke_parser.add_argument('key_id')
+    args = parser.parse_args(argv)
+
+    connection = backends.connect(DB_CONFIG)
+    cursor = connection.cursor()
+    try:
+        if args.command == 'list-keys':
+            cursor.execute("SELECT key_id, name, user_id, created_at, revoked_at FROM api_keys ORDER BY created_at")
+            for key_id, name, user_id, created_at, revoked_at in cursor.fetchall():
+                state = f"revoked {revoked_at}" if revoked_at else 'active'
+                print(f"{key_id}  {name:24} user={user_id or '-'}  created {created_at}  {state}")
+            return
+        if args.command == 'create-key':
+            key = create_api_key(cursor, args.name, args.user_id)
+            connection.commit()
+            print(f"✅ API key for {args.name} (shown once, send as X-API-Key):\n{key}")
+        else:
+            if not revoke_api_key(cursor, args.key_id):
+                print(f"❌ No active key {args.key_id}")
+                sys.exit(1)
+            connection.commit()
+            print(f"✅ Revoked key {args.key_id}; running servers stop accepting it within AUTH_REFRESH_SECONDS.")
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
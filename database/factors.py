@@ -0,0 +1,221 @@
+"""
+Effective-dated emission factors.
+
+`emission_factors` keeps every version of a factor with the date range it
+applies to: [effective_from, effective_to), an open end meaning "until
+further notice". Changing a factor closes the current version and adds a
+new one, so readings keep the factor that was valid on their date.
+
+The table is tiny and rarely changes, so writers use an in-memory
+`FactorTable` instead of joining it. Every edit bumps the one-row
+`emission_factor_version` counter in the same transaction, and
+`get_table` compares it (a primary-key read) on every call, reloading
+the table when it changed, so every process sees an edit at once.
+
+    python database/factors.py list
+    python database/factors.py set electricity 0.65 kg_co2e_per_kwh --from 2026-01-01
+"""
+import os
+import sys
+import threading
+from bisect import bisect_right
+from datetime import date, datetime
+
+# Allow `python database/factors.py` to import the database package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import sources
+
+# effective_from of factors that predate versioning
+BEGINNING = date(1970, 1, 1)
+
+
+def _to_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+class FactorTable:
+    """
+    Factor versions per source for fast lookup by reading date. Built from
+    (source_type, effective_from, effective_to, factor) rows.
+    """
+
+    def __init__(self, rows):
+        versions = {}
+        for source_type, effective_from, effective_to, factor in rows:
+            effective_to = _to_date(effective_to)
+            versions.setdefault(source_type, []).append((
+                _to_date(effective_from).toordinal(),
+                effective_to.toordinal() if effective_to else None,
+                float(factor),
+            ))
+        self._starts = {}
+        self._versions = {}
+        for source_type, items in versions.items():
+            items.sort()
+            self._starts[source_type] = [start for start, _, _ in items]
+            self._versions[source_type] = items
+
+    def __contains__(self, source_type):
+        return source_type in self._versions
+
+    def factor_for(self, source_type, day):
+        """Factor valid for `source_type` on `day` (date or 'YYYY-MM-DD'), or None."""
+        starts = self._starts.get(source_type)
+        if not starts:
+            return None
+        ordinal = _to_date(day).toordinal()
+        i = bisect_right(starts, ordinal) - 1
+        if i < 0:
+            return None
+        _, end, factor = self._versions[source_type][i]
+        if end is not None and ordinal >= end:
+            return None
+        return factor
+
+
+# ---- Process-wide cache ----
+_lock = threading.Lock()
+_table = None
+_version = None
+
+
+def version(cursor, lock=False):
+    """The emission_factor_version counter; `lock` reads it with a shared lock (see get_table)."""
+    cursor.execute(
+        "SELECT version FROM emission_factor_version WHERE id = 1" + (" LOCK IN SHARE MODE" if lock else "")
+    )
+    row = cursor.fetchone()
+    return int(row[0]) if row else 0
+
+
+def load_table(cursor, lock=False):
+    cursor.execute(
+        "SELECT source_type, effective_from, effective_to, factor FROM emission_factors"
+        + (" LOCK IN SHARE MODE" if lock else "")
+    )
+    return FactorTable(cursor.fetchall())
+
+
+def get_table(cursor, lock=False):
+    """
+    The cached FactorTable, reloaded if the factor version changed. Writers
+    pass `lock` inside their transaction: the shared lock on the version
+    row makes a concurrent `set_factor` wait for them to commit, and makes
+    them wait for it, so no rollup row is computed with a superseded factor.
+    """
+    global _table, _version
+    current = version(cursor, lock)
+    with _lock:
+        if _table is not None and current == _version:
+            return _table
+    table = load_table(cursor, lock)
+    with _lock:
+        _table, _version = table, current
+    return table
+
+
+def invalidate():
+    """Forces the next get_table call to reload."""
+    global _table
+    with _lock:
+        _table = None
+
+
+# ---- Editing ----
+def set_factor(cursor, source_type, factor, factor_unit, effective_from):
+    """
+    Makes `factor` valid for `source_type` from `effective_from` until the
+    next version (or open-ended). The version it splits is closed at
+    `effective_from`; a version starting on the same day is corrected in
+    place. Returns the affected (start, end) date range, end None when
+    open. Caller re-derives the rollup for that range and commits.
+    """
+    effective_from = _to_date(effective_from)
+    # First, so writers that read the old version finish before the rollup is recomputed
+    cursor.execute("UPDATE emission_factor_version SET version = version + 1 WHERE id = 1")
+    cursor.execute(
+        "SELECT id, effective_from, effective_to FROM emission_factors "
+        "WHERE source_type = %s ORDER BY effective_from FOR UPDATE",
+        (source_type,)
+    )
+    versions = [(row[0], _to_date(row[1]), _to_date(row[2])) for row in cursor.fetchall()]
+
+    current = next(
+        (v for v in versions if v[1] <= effective_from and (v[2] is None or effective_from < v[2])),
+        None
+    )
+    if current is not None and current[1] == effective_from:
+        cursor.execute(
+            "UPDATE emission_factors SET factor = %s, factor_unit = %s, updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = %s",
+            (factor, factor_unit, current[0])
+        )
+        effective_to = current[2]
+    else:
+        if current is not None:
+            effective_to = current[2]
+            cursor.execute(
+                "UPDATE emission_factors SET effective_to = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+                (effective_from, current[0])
+            )
+        else:
+            later = [v[1] for v in versions if v[1] > effective_from]
+            effective_to = min(later) if later else None
+        source_id = sources.resolve_source_ids(cursor, [source_type])[source_type]
+        cursor.execute(
+            "INSERT INTO emission_factors "
+            "(source_type, source_id, factor, factor_unit, effective_from, effective_to) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            (source_type, source_id, factor, factor_unit, effective_from, effective_to)
+        )
+    invalidate()
+    return effective_from, effective_to
+
+
+def main(argv=None):
+    import argparse
+
+    from database import backends, rollup, summary
+    from database.init_db import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description='List or change emission factor versions.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list')
+    set_parser = sub.add_parser('set')
+    set_parser.add_argument('source_type')
+    set_parser.add_argument('factor', type=float)
+    set_parser.add_argument('factor_unit')
+    set_parser.add_argument('--from', dest='effective_from', default=date.today().isoformat(),
+                            help='first day the factor applies (YYYY-MM-DD, default today)')
+    args = parser.parse_args(argv)
+
+    connection = backends.connect(DB_CONFIG)
+    cursor = connection.cursor()
+    try:
+        if args.command == 'list':
+            cursor.execute(
+                "SELECT source_type, factor, factor_unit, effective_from, effective_to "
+                "FROM emission_factors ORDER BY source_type, effective_from"
+            )
+            for source_type, factor, unit, start, end in cursor.fetchall():
+                print(f"{source_type:20} {float(factor):>10.6f} {unit:22} {start} .. {end or 'open'}")
+            return
+
+        start, end = set_factor(cursor, args.source_type, args.factor, args.factor_unit, args.effective_from)
+        rows = rollup.rebuild_source(cursor, args.source_type, start, end)
+        summary.rebuild(cursor)
+        connection.commit()
+        print(f"✅ {args.source_type} = {args.factor} {args.factor_unit} from {start} "
+              f"until {end or 'further notice'} ({rows} rollup rows recomputed).")
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
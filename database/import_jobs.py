@@ -0,0 +1,224 @@
+"""
+Persistent state of background CSV imports (see jobs.py).
+
+One `import_jobs` row per upload holds its status and counters, and
+`import_job_errors` the rejected lines. The runner updates both in the
+same transaction as each imported chunk, so after a crash or restart the
+row says exactly which lines are committed and the import resumes after
+`last_line`. Times are naive UTC.
+
+Claiming a job gives it a fresh `claim_token`. The runner heartbeats and
+records progress only while the row still carries its token, so once a job
+is requeued (stale heartbeat or `retry`) the previous worker's writes
+fail with ClaimLost instead of counting the same lines twice.
+
+    python database/import_jobs.py list [--limit 20]
+    python database/import_jobs.py show <job_id>
+    python database/import_jobs.py retry <job_id>
+"""
+import os
+import secrets
+import sys
+from datetime import datetime, timedelta
+
+# Allow `python database/import_jobs.py` to import the database package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STATUSES = ('queued', 'running', 'succeeded', 'failed')
+
+JOB_COLUMNS = (
+    'job_id', 'status', 'filename', 'user_id', 'bytes_total', 'bytes_done', 'last_line',
+    'accepted', 'rejected', 'inserted', 'updated', 'unchanged', 'seconds', 'error',
+    'created_at', 'heartbeat_at', 'finished_at', 'claim_token',
+)
+
+# Rejected lines kept per job; the `rejected` counter is always exact
+MAX_STORED_ERRORS = 100
+
+
+class ClaimLost(Exception):
+    """The job was requeued and possibly claimed by another worker."""
+
+
+def _now():
+    return datetime.utcnow().replace(microsecond=0)
+
+
+def new_job_id():
+    return secrets.token_hex(8)
+
+
+def create_job(cursor, filename, bytes_total, user_id=None, job_id=None):
+    """Records a queued import and returns its id (a new one unless `job_id` is given)."""
+    job_id = job_id or new_job_id()
+    cursor.execute(
+        "INSERT INTO import_jobs (job_id, status, filename, user_id, bytes_total, created_at) "
+        "VALUES (%s, 'queued', %s, %s, %s, %s)",
+        (job_id, filename, user_id, bytes_total, _now())
+    )
+    return job_id
+
+
+def claim_next(cursor):
+    """Marks the oldest queued job running and returns its row, or None if there is none."""
+    cursor.execute("SELECT job_id FROM import_jobs WHERE status = 'queued' ORDER BY created_at LIMIT 5")
+    for (job_id,) in cursor.fetchall():
+        # Another process may claim the same job; only one UPDATE matches
+        cursor.execute(
+            "UPDATE import_jobs SET status = 'running', heartbeat_at = %s, claim_token = %s "
+            "WHERE job_id = %s AND status = 'queued'",
+            (_now(), secrets.token_hex(8), job_id)
+        )
+        if cursor.rowcount == 1:
+            return load_job(cursor, job_id)
+    return None
+
+
+def heartbeat(cursor, job_id, token):
+    """Marks a running job alive. Raises ClaimLost if it is no longer ours."""
+    cursor.execute(
+        "UPDATE import_jobs SET heartbeat_at = %s WHERE job_id = %s AND claim_token = %s",
+        (_now(), job_id, token)
+    )
+    if cursor.rowcount != 1:
+        raise ClaimLost(job_id)
+
+
+def record_chunk(cursor, job_id, token, counts, errors, last_line, bytes_done, seconds):
+    """
+    Adds one committed chunk's counts to the job (call in the chunk's
+    transaction). Raises ClaimLost if the job is no longer ours, which
+    rolls the chunk back.
+    """
+    cursor.execute(
+        "UPDATE import_jobs SET accepted = accepted + %s, rejected = rejected + %s, "
+        "inserted = inserted + %s, updated = updated + %s, unchanged = unchanged + %s, "
+        "last_line = %s, bytes_done = %s, seconds = %s, heartbeat_at = %s WHERE job_id = %s AND claim_token = %s",
+        (counts['inserted'] + counts['updated'] + counts['unchanged'], counts['rejected'],
+         counts['inserted'], counts['updated'], counts['unchanged'],
+         last_line, bytes_done, seconds, _now(), job_id, token)
+    )
+    if cursor.rowcount != 1:
+        raise ClaimLost(job_id)
+    if errors:
+        cursor.execute("SELECT COUNT(*) FROM import_job_errors WHERE job_id = %s", (job_id,))
+        room = MAX_STORED_ERRORS - cursor.fetchone()[0]
+        if room > 0:
+            cursor.executemany(
+                "INSERT IGNORE INTO import_job_errors (job_id, line, error) VALUES (%s, %s, %s)",
+                [(job_id, e['line'], e['error'][:255]) for e in errors[:room]]
+            )
+
+
+def finish_job(cursor, job_id, token, error=None, bytes_done=None):
+    """Marks a claimed job finished. Returns False (and changes nothing) if it is no longer ours."""
+    status = 'failed' if error else 'succeeded'
+    cursor.execute(
+        "UPDATE import_jobs SET status = %s, error = %s, bytes_done = COALESCE(%s, bytes_done), "
+        "finished_at = %s, heartbeat_at = %s, claim_token = NULL WHERE job_id = %s AND claim_token = %s",
+        (status, error, bytes_done, _now(), _now(), job_id, token)
+    )
+    return cursor.rowcount == 1
+
+
+def requeue(cursor, job_id):
+    """Puts a failed or interrupted job back in the queue; it resumes after its last committed line."""
+    cursor.execute(
+        "UPDATE import_jobs SET status = 'queued', error = NULL, finished_at = NULL, claim_token = NULL "
+        "WHERE job_id = %s AND status IN ('running', 'failed')",
+        (job_id,)
+    )
+    return cursor.rowcount > 0
+
+
+def requeue_stale(cursor, stale_after):
+    """Requeues running jobs with no heartbeat for `stale_after` seconds (their worker died)."""
+    cursor.execute(
+        "UPDATE import_jobs SET status = 'queued', claim_token = NULL WHERE status = 'running' AND heartbeat_at < %s",
+        (_now() - timedelta(seconds=stale_after),)
+    )
+    return cursor.rowcount
+
+
+def purge_finished(cursor, older_than_days):
+    """Deletes finished jobs (and their errors) older than `older_than_days`."""
+    cutoff = _now() - timedelta(days=older_than_days)
+    cursor.execute(
+        "DELETE FROM import_job_errors WHERE job_id IN "
+        "(SELECT job_id FROM import_jobs WHERE status IN ('succeeded', 'failed') AND finished_at < %s)",
+        (cutoff,)
+    )
+    cursor.execute(
+        "DELETE FROM import_jobs WHERE status IN ('succeeded', 'failed') AND finished_at < %s",
+        (cutoff,)
+    )
+    return cursor.rowcount
+
+
+def load_job(cursor, job_id):
+    """Job row as a dict, or None."""
+    cursor.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM import_jobs WHERE job_id = %s", (job_id,))
+    row = cursor.fetchone()
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+
+def load_errors(cursor, job_id):
+    cursor.execute(
+        "SELECT line, error FROM import_job_errors WHERE job_id = %s ORDER BY line LIMIT %s",
+        (job_id, MAX_STORED_ERRORS)
+    )
+    return [{'line': line, 'error': error} for line, error in cursor.fetchall()]
+
+
+def main(argv=None):
+    import argparse
+
+    from database import backends
+    from database.init_db import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description='Inspect background CSV imports.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    list_parser = sub.add_parser('list')
+    list_parser.add_argument('--limit', type=int, default=20)
+    show_parser = sub.add_parser('show')
+    show_parser.add_argument('job_id')
+    retry_parser = sub.add_parser('retry', help='requeue a failed job; it resumes after its last committed line')
+    retry_parser.add_argument('job_id')
+    args = parser.parse_args(argv)
+
+    connection = backends.connect(DB_CONFIG)
+    cursor = connection.cursor()
+    try:
+        if args.command == 'list':
+            cursor.execute(
+                "SELECT job_id, status, filename, accepted, rejected, created_at FROM import_jobs "
+                "ORDER BY created_at DESC LIMIT %s", (args.limit,)
+            )
+            for job_id, status, filename, accepted, rejected, created_at in cursor.fetchall():
+                print(f"{job_id}  {status:9}  {accepted:>9} ok {rejected:>7} rejected  {created_at}  {filename or '-'}")
+            return
+        job = load_job(cursor, args.job_id)
+        if job is None:
+            print(f"❌ No job {args.job_id}")
+            sys.exit(1)
+        if args.command == 'show':
+            for column in JOB_COLUMNS:
+                print(f"{column:13} {job[column]}")
+            for e in load_errors(cursor, args.job_id):
+                print(f"   line {e['line']}: {e['error']}")
+        else:
+            if not requeue(cursor, args.job_id):
+                print(f"❌ Job {args.job_id} is {job['status']}; only failed or running jobs can be retried")
+                sys.exit(1)
+            connection.commit()
+            print(f"✅ Requeued job {args.job_id}; a running server picks it up within JOBS_POLL_SECONDS.")
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,14 @@
 import mysql.connector
 from mysql.connector import errorcode
 import os
+import sys
 from dotenv import load_dotenv
 
+# Allow `python database/init_db.py` to import the database package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import backends, campuses, migrations, partitions
+from ingest import upsert_activity_records
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -19,26 +25,24 @@ DB_CONFIG = {
 def init_database():
     """Initializes database schema, admin account, and sample data."""
     try:
-        # Connect to MySQL
-        connection = mysql.connector.connect(**DB_CONFIG)
+        # Connect to MySQL (or the SQLite file when DB_BACKEND=sqlite)
+        connection = backends.connect(DB_CONFIG)
         cursor = connection.cursor()
-        print("📘 Connected to MySQL successfully!")
-
-        # Step 1: Read and execute schema file
-        print("📄 Reading schema file...")
-        with open('database/schema.sql', 'r', encoding='utf-8') as f:
-            sql_script = f.read()
+        if backends.dialect(connection) == 'sqlite':
+            print(f"📘 Opened SQLite database {backends.sqlite_path()}")
+        else:
+            print("📘 Connected to MySQL successfully!")
 
-        # Execute schema statements manually
-        statements = [s.strip() for s in sql_script.split(';') if s.strip()]
-        for stmt in statements:
-            try:
-                cursor.execute(stmt)
-            except Exception as e:
-                print(f"⚠️ Ignored error during schema creation: {e}")
+        # Step 1: Create or upgrade the schema
+        print("📄 Applying schema migrations...")
+        migrations.migrate(connection)
+        print("✅ Database schema is up to date!\n")
 
-        connection.commit()
-        print("✅ Database schema created successfully!\n")
+        # Keep date partitions ahead of incoming readings (MySQL only)
+        if backends.dialect(connection) == 'mysql':
+            added = partitions.ensure(cursor)
+            if added:
+                print(f"✅ Added activity_data partitions {', '.join(added)}.\n")
 
         # Step 2: Create default admin user if not exists
         cursor.execute("SELECT COUNT(*) FROM users WHERE username = 'admin'")
@@ -88,15 +92,16 @@ def init_database():
 
         cursor.execute("SELECT COUNT(*) FROM activity_data")
         if cursor.fetchone()[0] == 0:
-            cursor.executemany(
-                "INSERT INTO activity_data (date, source_type, raw_value, unit) VALUES (%s, %s, %s, %s)",
-                sample_data
-            )
+            upsert_activity_records(cursor, [(d, s, v, u, '', '00:00:00', campuses.DEFAULT_CAMPUS_ID)
+                                             for d, s, v, u in sample_data])
             connection.commit()
             print("✅ Sample data inserted successfully!\n")
         else:
             print("ℹ️ Sample data already exists.\n")
 
+        # Backfill the daily rollup and summary for databases created before they existed
+        migrations.rebuild_totals(connection)
+
         # Step 4: Insert sample human count data if not already present
         sample_human_data = [
             ('2025-01-15', 2500),
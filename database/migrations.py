@@ -0,0 +1,606 @@
+"""
+Versioned schema migrations.
+
+`schema.sql` describes the current schema and is applied once as the
+baseline. Each later step upgrades databases created before a change and
+is idempotent: it inspects information_schema before altering anything,
+so a step that finds its change already in place just records itself.
+Applied versions are stored in `schema_migrations` with their duration.
+SQLite databases (DB_BACKEND=sqlite) start from `schema_sqlite.sql`, which
+is already at SQLITE_BASELINE, so the MySQL upgrade steps up to that
+version (and the MYSQL_ONLY ones) are only recorded there; the steps in
+SQLITE_STEPS run their SQLite variant instead.
+
+    python database/migrations.py            # apply pending steps
+    python database/migrations.py status     # list applied / pending steps
+    python database/migrations.py explain    # check the hot queries use indexes
+"""
+import os
+import sys
+import time
+
+# Allow `python database/migrations.py` to import the database package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import backends, partitions, sources
+
+SCHEMA_FILES = {
+    'mysql': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql'),
+    'sqlite': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema_sqlite.sql'),
+}
+
+# Last version schema_sqlite.sql already includes
+SQLITE_BASELINE = 6
+
+# Steps with no SQLite equivalent, only recorded there
+MYSQL_ONLY = {10}
+
+MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name VARCHAR(200) NOT NULL,
+    duration_ms INT NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+# ---- Introspection helpers ----
+def column_type(cursor, table, column):
+    """Lower-case DATA_TYPE of `table.column`, or None if it does not exist."""
+    cursor.execute(
+        "SELECT DATA_TYPE FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column)
+    )
+    row = cursor.fetchone()
+    return row[0].lower() if row else None
+
+
+def index_exists(cursor, table, index):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s LIMIT 1",
+        (table, index)
+    )
+    return cursor.fetchone() is not None
+
+
+def index_columns(cursor, table, index):
+    """Column names of `index` in key order ([] if it does not exist)."""
+    cursor.execute(
+        "SELECT COLUMN_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s ORDER BY SEQ_IN_INDEX",
+        (table, index)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def sqlite_columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def split_statements(sql_script):
+    return [s.strip() for s in sql_script.split(';') if s.strip()]
+
+
+# ---- Steps ----
+def baseline(cursor, dialect='mysql'):
+    """Creates every table in the backend's schema file and seeds emission factors."""
+    with open(SCHEMA_FILES[dialect], 'r', encoding='utf-8') as f:
+        for stmt in split_statements(f.read()):
+            cursor.execute(stmt)
+
+
+def activity_natural_key(cursor):
+    """meter_id/reading_time columns and the unique natural key, after removing duplicates."""
+    if column_type(cursor, 'activity_data', 'meter_id') is None:
+        cursor.execute("ALTER TABLE activity_data ADD COLUMN meter_id VARCHAR(64) NOT NULL DEFAULT ''")
+    if column_type(cursor, 'activity_data', 'reading_time') is None:
+        cursor.execute("ALTER TABLE activity_data ADD COLUMN reading_time TIME NOT NULL DEFAULT '00:00:00'")
+    if not index_exists(cursor, 'activity_data', 'uq_activity_natural'):
+        # Keep the most recent copy of each reading. The totals are cleared rather than
+        # rebuilt here: rollup.rebuild needs the final schema, so `rebuild_totals`
+        # recomputes them once every step is applied
+        cursor.execute(
+            """
+            DELETE a FROM activity_data a
+            JOIN activity_data b
+              ON a.date = b.date AND a.source_type = b.source_type
+             AND a.meter_id = b.meter_id AND a.reading_time = b.reading_time
+             AND a.id < b.id
+            """
+        )
+        if cursor.rowcount:
+            print(f"   removed {cursor.rowcount} duplicate readings")
+            cursor.execute("DELETE FROM daily_emissions_rollup")
+            cursor.execute("DELETE FROM source_emissions_summary")
+        cursor.execute(
+            "ALTER TABLE activity_data "
+            "ADD UNIQUE KEY uq_activity_natural (date, source_type, meter_id, reading_time)"
+        )
+
+
+def source_ids(cursor):
+    """source_types lookup table and SMALLINT source_id on activity_data/emission_factors."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS source_types (
+            id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) UNIQUE NOT NULL
+        )
+        """
+    )
+    for table in ('activity_data', 'emission_factors'):
+        if column_type(cursor, table, 'source_id') is None:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN source_id SMALLINT UNSIGNED NULL AFTER source_type")
+    sources.backfill(cursor)
+
+
+def activity_date_source_index(cursor):
+    """Composite (date, source_id) index for date-range scans of activity_data."""
+    if not index_exists(cursor, 'activity_data', 'idx_activity_date_source'):
+        cursor.execute("ALTER TABLE activity_data ADD KEY idx_activity_date_source (date, source_id)")
+
+
+def numeric_types(cursor):
+    """DOUBLE readings (FLOAT lost precision) and exact DECIMAL factors."""
+    if column_type(cursor, 'activity_data', 'raw_value') != 'double':
+        cursor.execute("ALTER TABLE activity_data MODIFY raw_value DOUBLE NOT NULL")
+    if column_type(cursor, 'emission_factors', 'factor') != 'decimal':
+        cursor.execute("ALTER TABLE emission_factors MODIFY factor DECIMAL(12, 6) NOT NULL")
+
+
+def factor_versions(cursor):
+    """Effective-dated emission factors: one row per (source_type, effective_from)."""
+    if column_type(cursor, 'emission_factors', 'effective_from') is None:
+        cursor.execute(
+            "ALTER TABLE emission_factors "
+            "ADD COLUMN effective_from DATE NOT NULL DEFAULT '1970-01-01', "
+            "ADD COLUMN effective_to DATE NULL"
+        )
+    if column_type(cursor, 'emission_factors', 'updated_at') is None:
+        cursor.execute(
+            "ALTER TABLE emission_factors ADD COLUMN updated_at TIMESTAMP NOT NULL "
+            "DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"
+        )
+    if index_exists(cursor, 'emission_factors', 'source_type'):
+        cursor.execute("ALTER TABLE emission_factors DROP INDEX source_type")
+    if not index_exists(cursor, 'emission_factors', 'uq_factor_version'):
+        cursor.execute(
+            "ALTER TABLE emission_factors ADD UNIQUE KEY uq_factor_version (source_type, effective_from)"
+        )
+
+
+def auth_tables(cursor):
+    """api_keys for machine clients and revoked_tokens for JWT revocation (same DDL on both backends)."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS api_keys (
+            key_id VARCHAR(32) PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            secret_hash CHAR(64) NOT NULL,
+            user_id INT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            revoked_at TIMESTAMP NULL
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS revoked_tokens (
+            jti VARCHAR(64) PRIMARY KEY,
+            expires_at DATETIME NOT NULL
+        )
+        """
+    )
+
+
+def import_jobs(cursor):
+    """State and rejected lines of background CSV imports (same DDL on both backends)."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            job_id VARCHAR(32) PRIMARY KEY,
+            status VARCHAR(12) NOT NULL,
+            filename VARCHAR(255) NULL,
+            user_id INT NULL,
+            bytes_total BIGINT NOT NULL DEFAULT 0,
+            bytes_done BIGINT NOT NULL DEFAULT 0,
+            last_line INT NOT NULL DEFAULT 0,
+            accepted INT NOT NULL DEFAULT 0,
+            rejected INT NOT NULL DEFAULT 0,
+            inserted INT NOT NULL DEFAULT 0,
+            updated INT NOT NULL DEFAULT 0,
+            unchanged INT NOT NULL DEFAULT 0,
+            seconds DOUBLE NOT NULL DEFAULT 0,
+            error VARCHAR(255) NULL,
+            created_at DATETIME NOT NULL,
+            heartbeat_at DATETIME NULL,
+            finished_at DATETIME NULL
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS import_job_errors (
+            job_id VARCHAR(32) NOT NULL,
+            line INT NOT NULL,
+            error VARCHAR(255) NOT NULL,
+            PRIMARY KEY (job_id, line)
+        )
+        """
+    )
+
+
+def archived_years(cursor):
+    """Closed years moved to archive files by database/archive.py (same DDL on both backends)."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archived_years (
+            year INT PRIMARY KEY,
+            row_count BIGINT NOT NULL,
+            raw_total DOUBLE NOT NULL,
+            emissions_tonnes DOUBLE NOT NULL,
+            file_name VARCHAR(255) NOT NULL,
+            sha256 CHAR(64) NOT NULL,
+            archived_at DATETIME NOT NULL
+        )
+        """
+    )
+
+
+def activity_partitions(cursor):
+    """Range-partitions activity_data by date (see database/partitions.py)."""
+    if partitions.list_partitions(cursor):
+        return
+    count = partitions.partition_table(cursor)
+    print(f"   activity_data split into {count} partitions")
+
+
+CAMPUSES_TABLE = """
+CREATE TABLE IF NOT EXISTS campuses (
+    id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    code VARCHAR(32) UNIQUE NOT NULL,
+    name VARCHAR(100) NOT NULL
+)
+"""
+DEFAULT_CAMPUS = "INSERT IGNORE INTO campuses (id, code, name) VALUES (1, 'main', 'Main campus')"
+ACTIVITY_NATURAL_KEY = ['date', 'campus_id', 'source_type', 'meter_id', 'reading_time']
+
+
+def campus_dimension(cursor):
+    """
+    campuses lookup table and campus_id (default campus 1) on activity_data,
+    human_count and daily_emissions_rollup, with the campus in their keys.
+    Rebuilds activity_data, so it takes as long as copying it.
+    """
+    cursor.execute(CAMPUSES_TABLE)
+    cursor.execute(DEFAULT_CAMPUS)
+    if column_type(cursor, 'activity_data', 'campus_id') is None:
+        cursor.execute(
+            "ALTER TABLE activity_data ADD COLUMN campus_id SMALLINT UNSIGNED NOT NULL DEFAULT 1 AFTER date"
+        )
+    if index_columns(cursor, 'activity_data', 'uq_activity_natural') != ACTIVITY_NATURAL_KEY:
+        cursor.execute(
+            "ALTER TABLE activity_data DROP INDEX uq_activity_natural, "
+            "ADD UNIQUE KEY uq_activity_natural (" + ", ".join(ACTIVITY_NATURAL_KEY) + ")"
+        )
+    if column_type(cursor, 'human_count', 'campus_id') is None:
+        cursor.execute("ALTER TABLE human_count ADD COLUMN campus_id SMALLINT UNSIGNED NOT NULL DEFAULT 1 AFTER id")
+    if not index_exists(cursor, 'human_count', 'uq_human_count'):
+        drop = "DROP INDEX `date`, " if index_exists(cursor, 'human_count', 'date') else ""
+        cursor.execute(f"ALTER TABLE human_count {drop}ADD UNIQUE KEY uq_human_count (campus_id, date)")
+    if column_type(cursor, 'daily_emissions_rollup', 'campus_id') is None:
+        cursor.execute(
+            "ALTER TABLE daily_emissions_rollup "
+            "ADD COLUMN campus_id SMALLINT UNSIGNED NOT NULL DEFAULT 1 FIRST, "
+            "DROP PRIMARY KEY, ADD PRIMARY KEY (campus_id, date, source_type), ADD KEY idx_rollup_date (date)"
+        )
+
+
+def campus_dimension_sqlite(cursor):
+    """SQLite variant of campus_dimension; the rollup is copied into a new table for its new primary key."""
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS campuses "
+        "(id INTEGER PRIMARY KEY, code VARCHAR(32) UNIQUE NOT NULL, name VARCHAR(100) NOT NULL)"
+    )
+    cursor.execute(DEFAULT_CAMPUS)
+    if 'campus_id' not in sqlite_columns(cursor, 'activity_data'):
+        cursor.execute("ALTER TABLE activity_data ADD COLUMN campus_id INTEGER NOT NULL DEFAULT 1")
+        cursor.execute("DROP INDEX IF EXISTS uq_activity_natural")
+        cursor.execute(
+            "CREATE UNIQUE INDEX uq_activity_natural ON activity_data (" + ", ".join(ACTIVITY_NATURAL_KEY) + ")"
+        )
+    if 'campus_id' not in sqlite_columns(cursor, 'human_count'):
+        cursor.execute("ALTER TABLE human_count ADD COLUMN campus_id INTEGER NOT NULL DEFAULT 1")
+        cursor.execute("DROP INDEX IF EXISTS uq_human_count_date")
+        cursor.execute("CREATE UNIQUE INDEX uq_human_count ON human_count (campus_id, date)")
+    if 'campus_id' not in sqlite_columns(cursor, 'daily_emissions_rollup'):
+        cursor.execute(
+            """
+            CREATE TABLE daily_emissions_rollup_new (
+                campus_id INTEGER NOT NULL DEFAULT 1,
+                date DATE NOT NULL,
+                source_type VARCHAR(100) NOT NULL,
+                raw_total DOUBLE NOT NULL DEFAULT 0,
+                emissions_tonnes DOUBLE NOT NULL DEFAULT 0,
+                row_count INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (campus_id, date, source_type)
+            ) WITHOUT ROWID
+            """
+        )
+        cursor.execute(
+            "INSERT INTO daily_emissions_rollup_new (campus_id, date, source_type, raw_total, emissions_tonnes, row_count) "
+            "SELECT 1, date, source_type, raw_total, emissions_tonnes, row_count FROM daily_emissions_rollup"
+        )
+        cursor.execute("DROP TABLE daily_emissions_rollup")
+        cursor.execute("ALTER TABLE daily_emissions_rollup_new RENAME TO daily_emissions_rollup")
+        cursor.execute("CREATE INDEX idx_rollup_date ON daily_emissions_rollup (date)")
+
+
+def import_job_claims(cursor):
+    """claim_token on import_jobs, so a requeued job's previous worker cannot record progress."""
+    if column_type(cursor, 'import_jobs', 'claim_token') is None:
+        cursor.execute("ALTER TABLE import_jobs ADD COLUMN claim_token VARCHAR(16) NULL")
+
+
+def import_job_claims_sqlite(cursor):
+    if 'claim_token' not in sqlite_columns(cursor, 'import_jobs'):
+        cursor.execute("ALTER TABLE import_jobs ADD COLUMN claim_token VARCHAR(16) NULL")
+
+
+SUMMARY_WINDOW_COLUMNS = ('trailing_tonnes', 'prior_tonnes', 'trend', 'window_end')
+
+
+def summary_read_time_windows(cursor):
+    """Drops the window columns of source_emissions_summary; summary.fetch computes them at read time."""
+    present = [c for c in SUMMARY_WINDOW_COLUMNS if column_type(cursor, 'source_emissions_summary', c)]
+    if present:
+        cursor.execute("ALTER TABLE source_emissions_summary " + ", ".join(f"DROP COLUMN {c}" for c in present))
+
+
+def summary_read_time_windows_sqlite(cursor):
+    columns = sqlite_columns(cursor, 'source_emissions_summary')
+    for column in SUMMARY_WINDOW_COLUMNS:
+        if column in columns:
+            cursor.execute(f"ALTER TABLE source_emissions_summary DROP COLUMN {column}")
+
+
+def factor_version_counter(cursor):
+    """emission_factor_version, bumped by every factor edit (same DDL on both backends)."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS emission_factor_version (
+            id INT PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        )
+        """
+    )
+    cursor.execute("INSERT IGNORE INTO emission_factor_version (id, version) VALUES (1, 0)")
+
+
+MIGRATIONS = [
+    (1, 'baseline', baseline),
+    (2, 'activity_natural_key', activity_natural_key),
+    (3, 'source_ids', source_ids),
+    (4, 'activity_date_source_index', activity_date_source_index),
+    (5, 'numeric_types', numeric_types),
+    (6, 'factor_versions', factor_versions),
+    (7, 'auth_tables', auth_tables),
+    (8, 'import_jobs', import_jobs),
+    (9, 'archived_years', archived_years),
+    (10, 'activity_partitions', activity_partitions),
+    (11, 'campus_dimension', campus_dimension),
+    (12, 'import_job_claims', import_job_claims),
+    (13, 'summary_read_time_windows', summary_read_time_windows),
+    (14, 'factor_version_counter', factor_version_counter),
+]
+
+# Steps whose DDL differs on SQLite: version -> SQLite variant
+SQLITE_STEPS = {11: campus_dimension_sqlite, 12: import_job_claims_sqlite,
+                13: summary_read_time_windows_sqlite}
+
+
+# ---- Runner ----
+def applied_versions(cursor):
+    cursor.execute(MIGRATIONS_TABLE)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(connection, target=None):
+    """Applies pending steps up to `target` (all by default). Returns versions applied."""
+    dialect = backends.dialect(connection)
+    cursor = connection.cursor()
+    applied = []
+    try:
+        done = applied_versions(cursor)
+        for version, name, step in MIGRATIONS:
+            if version in done or (target is not None and version > target):
+                continue
+            print(f"⏳ Migration {version:03d} {name}...")
+            started = time.perf_counter()
+            try:
+                if step is baseline:
+                    baseline(cursor, dialect)
+                elif dialect == 'sqlite' and version <= SQLITE_BASELINE:
+                    print("   already part of the SQLite baseline")
+                elif dialect == 'sqlite' and version in MYSQL_ONLY:
+                    print("   MySQL only")
+                elif dialect == 'sqlite' and version in SQLITE_STEPS:
+                    SQLITE_STEPS[version](cursor)
+                else:
+                    step(cursor)
+                duration_ms = int((time.perf_counter() - started) * 1000)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name, duration_ms) VALUES (%s, %s, %s)",
+                    (version, name, duration_ms)
+                )
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                print(f"❌ Migration {version:03d} {name} failed")
+                raise
+            print(f"✅ Migration {version:03d} {name} applied in {duration_ms} ms")
+            applied.append(version)
+        if done.union(applied) >= {version for version, _, _ in MIGRATIONS}:
+            rebuild_totals(connection)
+    finally:
+        cursor.close()
+    if not applied:
+        print("ℹ️ Schema is up to date.")
+    return applied
+
+
+def rebuild_totals(connection):
+    """
+    Rebuilds daily_emissions_rollup and source_emissions_summary when they
+    are empty but activity_data is not, e.g. after a step removed readings.
+    Only called on a fully migrated schema, which the rebuilds are written for.
+    """
+    from database import rollup, summary
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT 1 FROM daily_emissions_rollup LIMIT 1")
+        if cursor.fetchone() is None:
+            cursor.execute("SELECT 1 FROM activity_data LIMIT 1")
+            if cursor.fetchone() is not None:
+                rows = rollup.rebuild(cursor)
+                connection.commit()
+                print(f"✅ Daily emissions rollup rebuilt ({rows} rows).")
+        cursor.execute("SELECT 1 FROM source_emissions_summary LIMIT 1")
+        if cursor.fetchone() is None:
+            cursor.execute("SELECT 1 FROM daily_emissions_rollup LIMIT 1")
+            if cursor.fetchone() is not None:
+                sources = summary.rebuild(cursor)
+                connection.commit()
+                print(f"✅ Source emissions summary rebuilt ({sources} sources).")
+    finally:
+        cursor.close()
+
+
+def status(connection):
+    cursor = connection.cursor()
+    try:
+        done = applied_versions(cursor)
+    finally:
+        cursor.close()
+    for version, name, _ in MIGRATIONS:
+        print(f"{'applied' if version in done else 'pending':8} {version:03d} {name}")
+
+
+# ---- Index checks ----
+# (description, query, table, index that must be usable)
+EXPLAIN_CHECKS = [
+    (
+        'dashboard window',
+        "SELECT date, source_type, raw_total, emissions_tonnes FROM daily_emissions_rollup "
+        "WHERE campus_id = 1 AND date BETWEEN '2025-01-01' AND '2025-06-30' ORDER BY date",
+        'daily_emissions_rollup', 'PRIMARY',
+    ),
+    (
+        'dashboard previous period',
+        "SELECT SUM(emissions_tonnes) FROM daily_emissions_rollup "
+        "WHERE campus_id = 1 AND date BETWEEN '2024-07-01' AND '2025-01-01'",
+        'daily_emissions_rollup', 'PRIMARY',
+    ),
+    (
+        'dashboard human count',
+        "SELECT date, humans FROM human_count "
+        "WHERE campus_id = 1 AND date BETWEEN '2025-01-01' AND '2025-06-30' ORDER BY date",
+        'human_count', 'uq_human_count',
+    ),
+    (
+        'summary windows',
+        "SELECT source_type, SUM(emissions_tonnes) FROM daily_emissions_rollup "
+        "WHERE date BETWEEN '2025-05-03' AND '2025-06-30' GROUP BY source_type",
+        'daily_emissions_rollup', 'idx_rollup_date',
+    ),
+    (
+        'activity date range',
+        "SELECT date, source_id, raw_value FROM activity_data WHERE date BETWEEN '2025-01-01' AND '2025-06-30'",
+        'activity_data', 'idx_activity_date_source',
+    ),
+    (
+        'upsert key lookup',
+        "SELECT raw_value FROM activity_data "
+        "WHERE (date = '2025-01-15' AND campus_id = 1 AND source_type = 'electricity' AND meter_id = '' "
+        "AND reading_time = '00:00:00') "
+        "OR (date = '2025-01-16' AND campus_id = 1 AND source_type = 'electricity' AND meter_id = '' "
+        "AND reading_time = '00:00:00')",
+        'activity_data', 'uq_activity_natural',
+    ),
+]
+
+
+def explain_checks(connection):
+    """
+    EXPLAINs the hot queries and checks that the expected index is among
+    the usable keys. On tiny tables MySQL may still prefer a full scan, so
+    the chosen key is only reported. Returns the list of failures.
+    """
+    if backends.dialect(connection) == 'sqlite':
+        return _explain_checks_sqlite(connection)
+    cursor = connection.cursor(dictionary=True)
+    failures = []
+    try:
+        for description, query, table, index in EXPLAIN_CHECKS:
+            cursor.execute("EXPLAIN " + query)
+            plan = [row for row in cursor.fetchall() if row.get('table') == table]
+            possible = {k for row in plan for k in (row.get('possible_keys') or '').split(',') if k}
+            chosen = {row.get('key') for row in plan}
+            ok = index in possible or index in chosen
+            scanned = ','.join(sorted({p for row in plan for p in (row.get('partitions') or '').split(',') if p}))
+            print(f"{'✅' if ok else '❌'} {description}: key={','.join(sorted(k for k in chosen if k)) or 'NONE'} "
+                  f"possible={','.join(sorted(possible)) or 'NONE'}" + (f" partitions={scanned}" if scanned else ''))
+            if not ok:
+                failures.append(description)
+    finally:
+        cursor.close()
+    return failures
+
+
+def _explain_checks_sqlite(connection):
+    """SQLite variant: every hot query must SEARCH its table through an index."""
+    cursor = connection.cursor()
+    failures = []
+    try:
+        for description, query, table, _ in EXPLAIN_CHECKS:
+            cursor.execute("EXPLAIN QUERY PLAN " + query)
+            details = [row[-1] for row in cursor.fetchall() if f' {table} ' in f' {row[-1]} ']
+            ok = bool(details) and all(d.startswith('SEARCH') for d in details)
+            print(f"{'✅' if ok else '❌'} {description}: {'; '.join(details) or 'NO PLAN'}")
+            if not ok:
+                failures.append(description)
+    finally:
+        cursor.close()
+    return failures
+
+
+def main(argv=None):
+    import argparse
+
+    from database.init_db import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description='Apply versioned schema migrations.')
+    parser.add_argument('command', nargs='?', default='migrate', choices=['migrate', 'status', 'explain'])
+    parser.add_argument('--target', type=int, help='stop after this version')
+    args = parser.parse_args(argv)
+
+    connection = backends.connect(DB_CONFIG)
+    try:
+        if args.command == 'status':
+            status(connection)
+        elif args.command == 'explain':
+            if explain_checks(connection):
+                sys.exit(1)
+        else:
+            migrate(connection, target=args.target)
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Range partitioning of `activity_data` by reading date (MySQL only).
+
+The table is partitioned with RANGE COLUMNS(date), one partition per year
+(`p2024`) or per month (`p202401`, ACTIVITY_PARTITION_INTERVAL=month),
+plus a catch-all `pmax`. Queries with a date range then only open the
+partitions that overlap it, and archiving a closed year
+(database/archive.py) drops whole partitions instead of deleting rows.
+
+MySQL requires every unique key to contain the partitioning column, so
+partitioning turns the primary key into (id, date); the natural key
+already starts with date. Migration 010 partitions the table once;
+`ensure` (run by init_db.py, and worth a monthly cron) splits `pmax` so
+that ACTIVITY_PARTITIONS_AHEAD future intervals always have their own
+partition. SQLite has no partitioning; the (date, source_id) index
+serves range queries there.
+
+    python database/partitions.py status
+    python database/partitions.py ensure [--ahead 2]
+"""
+import os
+import sys
+from datetime import date
+
+# Allow `python database/partitions.py` to import the database package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+INTERVALS = ('year', 'month')
+PARTITION_INTERVAL = os.environ.get('ACTIVITY_PARTITION_INTERVAL', 'year').lower()
+PARTITIONS_AHEAD = int(os.environ.get('ACTIVITY_PARTITIONS_AHEAD', 2))
+
+
+def interval_start(day, interval):
+    return date(day.year, 1, 1) if interval == 'year' else date(day.year, day.month, 1)
+
+
+def next_start(start, interval):
+    if interval == 'year':
+        return date(start.year + 1, 1, 1)
+    return date(start.year + (start.month == 12), start.month % 12 + 1, 1)
+
+
+def partition_name(start, interval):
+    return f"p{start.year}" if interval == 'year' else f"p{start.year}{start.month:02d}"
+
+
+def _definitions(first, last, interval):
+    """PARTITION clauses for intervals first..last (interval starts), without pmax."""
+    clauses = []
+    start = first
+    while start <= last:
+        end = next_start(start, interval)
+        clauses.append(f"PARTITION {partition_name(start, interval)} VALUES LESS THAN ('{end.isoformat()}')")
+        start = end
+    return clauses
+
+
+def list_partitions(cursor):
+    """[(name, upper bound date or None for MAXVALUE, approximate rows)] in order; [] if not partitioned."""
+    cursor.execute(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'activity_data' AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    )
+    partitions = []
+    for name, description, rows in cursor.fetchall():
+        bound = description.strip("'") if description and description != 'MAXVALUE' else None
+        partitions.append((name, date.fromisoformat(bound) if bound else None, int(rows or 0)))
+    return partitions
+
+
+def partition_table(cursor, interval=PARTITION_INTERVAL, ahead=PARTITIONS_AHEAD, today=None):
+    """
+    Partitions an unpartitioned activity_data from its first reading's
+    interval to `ahead` intervals past today. Rebuilds the table, so it
+    takes as long as copying it. Returns the number of partitions.
+    """
+    if interval not in INTERVALS:
+        raise ValueError(f"interval must be one of {', '.join(INTERVALS)}")
+    today = today or date.today()
+    cursor.execute("SELECT MIN(date) FROM activity_data")
+    first_day = cursor.fetchone()[0] or today
+    last = interval_start(today, interval)
+    for _ in range(ahead):
+        last = next_start(last, interval)
+    clauses = _definitions(interval_start(first_day, interval), last, interval)
+    clauses.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    cursor.execute(
+        "ALTER TABLE activity_data DROP PRIMARY KEY, ADD PRIMARY KEY (id, date) "
+        "PARTITION BY RANGE COLUMNS(date) (" + ", ".join(clauses) + ")"
+    )
+    return len(clauses)
+
+
+def ensure(cursor, interval=PARTITION_INTERVAL, ahead=PARTITIONS_AHEAD, today=None):
+    """
+    Splits new partitions off `pmax` until `ahead` intervals past today have
+    their own (a metadata change while pmax is empty). Returns the names
+    added; does nothing on an unpartitioned table.
+    """
+    partitions = list_partitions(cursor)
+    bounded = [p for p in partitions if p[1] is not None]
+    if not bounded or partitions[-1][0] != 'pmax':
+        return []
+    today = today or date.today()
+    last = interval_start(today, interval)
+    for _ in range(ahead):
+        last = next_start(last, interval)
+    first = bounded[-1][1]  # the next partition starts where the last bounded one ends
+    if first > last:
+        return []
+    clauses = _definitions(first, last, interval)
+    cursor.execute(
+        "ALTER TABLE activity_data REORGANIZE PARTITION pmax INTO ("
+        + ", ".join(clauses) + ", PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+    )
+    return [clause.split()[1] for clause in clauses]
+
+
+def drop_before(cursor, boundary):
+    """
+    Drops the partitions holding only readings before `boundary` (a date)
+    and returns their names. Rows there are discarded instantly, so call
+    this only once they are archived. The first partition also holds
+    anything older than its own interval, which is also before `boundary`.
+    """
+    partitions = list_partitions(cursor)
+    names = [name for name, bound, _ in partitions if bound is not None and bound <= boundary]
+    if names and len(names) < len(partitions):
+        cursor.execute("ALTER TABLE activity_data DROP PARTITION " + ", ".join(names))
+        return names
+    return []
+
+
+def main(argv=None):
+    import argparse
+
+    from database import backends
+    from database.init_db import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description='Manage the date partitions of activity_data (MySQL).')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('status')
+    ensure_parser = sub.add_parser('ensure', help='add partitions for upcoming intervals')
+    ensure_parser.add_argument('--ahead', type=int, default=PARTITIONS_AHEAD)
+    ensure_parser.add_argument('--interval', choices=INTERVALS, default=PARTITION_INTERVAL)
+    args = parser.parse_args(argv)
+
+    connection = backends.connect(DB_CONFIG)
+    if backends.dialect(connection) == 'sqlite':
+        print("ℹ️ SQLite has no table partitioning; nothing to do.")
+        connection.close()
+        return
+    cursor = connection.cursor()
+    try:
+        if args.command == 'status':
+            partitions = list_partitions(cursor)
+            if not partitions:
+                print("ℹ️ activity_data is not partitioned; run `python database/migrations.py`.")
+            for name, bound, rows in partitions:
+                print(f"{name:10} < {bound or 'MAXVALUE'}  ~{rows:,} rows")
+            return
+        added = ensure(cursor, args.interval, args.ahead)
+        print(f"✅ Added partitions {', '.join(added)}." if added else "ℹ️ Partitions are up to date.")
+    finally:
+        cursor.close()
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+"""
+Connection pool shared by the request handlers.
+
+- `size` connections at most; idle ones are reused most-recent-first.
+- Callers wait up to `timeout` seconds for a free connection. At most
+  `max_waiters` may wait at once; beyond that a checkout fails at once
+  instead of piling up threads behind a saturated database.
+- Connections older than `recycle` seconds are replaced, and ones idle for
+  more than `ping_after` seconds are pinged before being handed out.
+- A circuit breaker stops opening connections after `failure_threshold`
+  consecutive connect failures and lets one attempt through every
+  `reset_after` seconds until the database answers again.
+- `stats()` reports usage (in use, waiters, wait times, checkouts/sec) so
+  the size can be set from observed concurrency.
+
+Every failure to hand out a connection raises a `PoolError`; the app maps it
+to a 503 with Retry-After.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PoolError(Exception):
+    """No connection could be handed out. `retry_after` is a hint in seconds."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PoolExhausted(PoolError):
+    pass
+
+
+class CircuitOpen(PoolError):
+    pass
+
+
+class PooledConnection:
+    """Proxy for a pooled connection; `close()` gives it back to the pool."""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    def __getattr__(self, name):
+        entry = self.__dict__.get('_entry')
+        if entry is None:
+            raise AttributeError(f"connection already returned to the pool ({name})")
+        return getattr(entry.connection, name)
+
+    @property
+    def state(self):
+        """Dict that stays with the underlying connection across checkouts (e.g. prepared cursors)."""
+        return self._entry.state
+
+    def close(self):
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool.release(entry)
+
+    def invalidate(self):
+        """Closes the underlying connection instead of reusing it (e.g. after a protocol error)."""
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool.release(entry, discard=True)
+
+
+class _Entry:
+    __slots__ = ('connection', 'created_at', 'returned_at', 'state')
+
+    def __init__(self, connection, now):
+        self.connection = connection
+        self.created_at = now
+        self.returned_at = now
+        self.state = {}
+
+
+class ConnectionPool:
+
+    def __init__(self, connect, size=5, timeout=5.0, max_waiters=None, recycle=1800.0,
+                 ping_after=10.0, failure_threshold=5, reset_after=30.0, name='db'):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.max_waiters = size * 4 if max_waiters is None else max_waiters
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._idle = []
+        self._open = 0          # connections checked out, idle, or being opened
+        self._in_use = 0
+        self._waiters = 0
+
+        # Circuit breaker
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+
+        # Counters
+        self._checkouts = 0
+        self._timeouts = 0
+        self._rejected = 0
+        self._connects = 0
+        self._connect_failures = 0
+        self._recycled = 0
+        self._ping_failures = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._rate = [0] * 60   # checkouts per second over the last minute
+        self._rate_second = int(time.monotonic())
+
+    # ---- Checkout ----
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._cond:
+            if not self._idle and self._open >= self.size and self._waiters >= self.max_waiters:
+                self._rejected += 1
+                raise PoolExhausted(f"{self.name} pool: {self._waiters} requests already waiting")
+            self._waiters += 1
+            try:
+                while True:
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._open < self.size:
+                        self._check_breaker()
+                        self._open += 1
+                        entry = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolExhausted(
+                            f"{self.name} pool: no connection free after {timeout:.1f}s",
+                            retry_after=max(1, int(timeout)),
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters -= 1
+            self._in_use += 1
+
+        try:
+            entry = self._validate(entry)
+        except BaseException:
+            with self._cond:
+                self._in_use -= 1
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._count_rate()
+        return PooledConnection(self, entry)
+
+    def _validate(self, entry):
+        """Returns a usable entry for the reserved slot, opening one if needed."""
+        now = time.monotonic()
+        if entry is not None:
+            if now - entry.created_at > self.recycle:
+                with self._cond:
+                    self._recycled += 1
+                self._close_quietly(entry.connection)
+                entry = None
+            elif now - entry.returned_at > self.ping_after and not self._ping(entry.connection):
+                with self._cond:
+                    self._ping_failures += 1
+                self._close_quietly(entry.connection)
+                entry = None
+        if entry is None:
+            entry = _Entry(self._open_connection(), time.monotonic())
+        return entry
+
+    def _open_connection(self):
+        try:
+            connection = self._connect()
+        except Exception as e:
+            with self._cond:
+                self._connect_failures += 1
+                self._failures += 1
+                self._probing = False
+                if self._failures >= self.failure_threshold:
+                    if not self._open_until:
+                        logger.error(f"{self.name} pool: circuit opened after {self._failures} connect failures")
+                    self._open_until = time.monotonic() + self.reset_after
+            raise PoolError(f"{self.name} pool: could not connect ({e})") from e
+        with self._cond:
+            if self._open_until:
+                logger.info(f"{self.name} pool: circuit closed, database reachable again")
+            self._connects += 1
+            self._failures = 0
+            self._open_until = 0.0
+            self._probing = False
+        return connection
+
+    def _check_breaker(self):
+        """Raises CircuitOpen unless a new connection may be attempted. Holds _cond."""
+        if not self._open_until:
+            return
+        remaining = self._open_until - time.monotonic()
+        if remaining > 0 or self._probing:
+            raise CircuitOpen(
+                f"{self.name} pool: circuit open after repeated connect failures",
+                retry_after=max(1, int(remaining) + 1),
+            )
+        self._probing = True  # half-open: let exactly one attempt through
+
+    @staticmethod
+    def _ping(connection):
+        try:
+            connection.ping()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _count_rate(self):
+        second = int(time.monotonic())
+        if second != self._rate_second:
+            for s in range(self._rate_second + 1, min(second, self._rate_second + 60) + 1):
+                self._rate[s % 60] = 0
+            self._rate_second = second
+        self._rate[second % 60] += 1
+
+    # ---- Return ----
+    def release(self, entry, discard=False):
+        if not discard:
+            try:
+                entry.connection.rollback()  # never hand out someone else's open transaction
+            except Exception:
+                discard = True
+        if discard:
+            self._close_quietly(entry.connection)
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._open -= 1
+            else:
+                entry.returned_at = time.monotonic()
+                self._idle.append(entry)
+            self._cond.notify()
+
+    def close_all(self):
+        """Closes idle connections; checked-out ones close when returned."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for entry in idle:
+            self._close_quietly(entry.connection)
+
+    # ---- Observability ----
+    def stats(self):
+        with self._cond:
+            self._count_rate()
+            now_second = self._rate_second
+            last_minute = sum(self._rate[s % 60] for s in range(now_second - 59, now_second + 1))
+            return {
+                'name': self.name,
+                'size': self.size,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiters': self._waiters,
+                'max_waiters': self.max_waiters,
+                'checkouts': self._checkouts,
+                'checkouts_per_sec': round(last_minute / 60.0, 2),
+                'wait_ms_avg': round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                'wait_ms_max': round(self._wait_max * 1000, 3),
+                'timeouts': self._timeouts,
+                'rejected': self._rejected,
+                'connects': self._connects,
+                'connect_failures': self._connect_failures,
+                'recycled': self._recycled,
+                'ping_failures': self._ping_failures,
+                'circuit': 'open' if self._open_until and not self._probing else (
+                    'half-open' if self._probing else 'closed'),
+            }
@@ -0,0 +1,165 @@
+"""
+Maintenance of the `daily_emissions_rollup` table.
+
+The rollup holds one row per (campus, date, source_type) with the summed raw value,
+the emissions in tonnes CO2e and the number of readings that went into it.
+Writers call `apply_records` in the same transaction as their INSERT so the
+dashboard never has to re-join `activity_data` with `emission_factors`.
+Emissions are computed here with the factor version valid on each day
+(see database/factors.py), never by joining the factor table.
+
+`python database/factors.py set ...` recomputes the days a factor change
+affects. `python database/rollup.py rebuild` recomputes every row from the
+raw table (and the per-source summary with it), except the days of
+archived years (database/archive.py), whose readings are no longer there.
+"""
+import os
+import sys
+from datetime import timedelta
+
+# Allow `python database/rollup.py` to import the database package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import archive, factors
+
+ROLLUP_UPSERT = (
+    "INSERT INTO daily_emissions_rollup (date, campus_id, source_type, raw_total, emissions_tonnes, row_count) "
+    "VALUES (%s, %s, %s, %s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE "
+    "raw_total = raw_total + VALUES(raw_total), "
+    "emissions_tonnes = emissions_tonnes + VALUES(emissions_tonnes), "
+    "row_count = row_count + VALUES(row_count)"
+)
+
+
+def apply_records(cursor, records, table=None):
+    """
+    Adds `records` (iterable of (date, campus_id, source_type, raw_value)) to
+    the rollup, counting each as one new reading. See `apply_deltas`.
+    """
+    return apply_deltas(cursor, ((d, c, s, v, 1) for d, c, s, v in records), table)
+
+
+def apply_deltas(cursor, deltas, table=None):
+    """
+    Adds `deltas` (iterable of (date, campus_id, source_type, raw_delta,
+    count_delta)) to the rollup. An overwritten reading contributes
+    (new - old, 0). Deltas are grouped per day/campus/source first so a
+    large batch becomes one upsert per bucket. Days without a valid
+    emission factor version are skipped, which matches the JOIN the
+    raw-table queries used to do.
+    `table` defaults to the cached factors.FactorTable, checked against the
+    factor version inside this transaction.
+    Returns the applied deltas as (date, campus_id, source_type, raw, tonnes,
+    count) rows.
+    """
+    if table is None:
+        table = factors.get_table(cursor, lock=True)
+
+    grouped = {}
+    for rec_date, campus_id, source_type, raw_delta, count_delta in deltas:
+        if source_type not in table:
+            continue
+        key = (str(rec_date)[:10], campus_id, source_type)
+        raw_total, count = grouped.get(key, (0.0, 0))
+        grouped[key] = (raw_total + float(raw_delta), count + count_delta)
+
+    # Sorted, so concurrent writers lock the buckets they share in the same order
+    rows = _with_emissions(sorted(grouped.items()), table)
+    if rows:
+        cursor.executemany(ROLLUP_UPSERT, rows)
+    return rows
+
+
+def _with_emissions(grouped, table):
+    """((date, campus_id, source_type), (raw_total, count)) items -> rollup rows, skipping days without a factor."""
+    rows = []
+    for (rec_date, campus_id, source_type), (raw_total, count) in grouped:
+        factor = table.factor_for(source_type, rec_date)
+        if factor is not None:
+            rows.append((rec_date, campus_id, source_type, raw_total, raw_total * factor / 1000, count))
+    return rows
+
+
+def rebuild(cursor):
+    """
+    Recomputes the rollup from activity_data. Days up to the archive
+    boundary keep their rows: their readings now live in archive files
+    (database/archive.py). Caller commits.
+    """
+    boundary = archive.archived_through(cursor)
+    if boundary is None:
+        cursor.execute("DELETE FROM daily_emissions_rollup")
+        cursor.execute(
+            "SELECT date, campus_id, source_type, SUM(raw_value), COUNT(*) FROM activity_data "
+            "GROUP BY date, campus_id, source_type"
+        )
+    else:
+        cursor.execute("DELETE FROM daily_emissions_rollup WHERE date > %s", (boundary,))
+        cursor.execute(
+            "SELECT date, campus_id, source_type, SUM(raw_value), COUNT(*) FROM activity_data WHERE date > %s "
+            "GROUP BY date, campus_id, source_type",
+            (boundary,)
+        )
+    return _insert_grouped(cursor, cursor.fetchall())
+
+
+def rebuild_source(cursor, source_type, start, end=None):
+    """
+    Recomputes one source's rollup rows for days in [start, end), `end`
+    None meaning open-ended, e.g. after its emission factor changed.
+    Archived days are left as they were. Caller commits.
+    """
+    boundary = archive.archived_through(cursor)
+    if boundary is not None and str(start)[:10] <= boundary.isoformat():
+        start = boundary + timedelta(days=1)
+        if end is not None and str(end)[:10] <= start.isoformat():
+            return 0
+    bounds = "source_type = %s AND date >= %s" + (" AND date < %s" if end else "")
+    params = (source_type, start, end) if end else (source_type, start)
+    cursor.execute("DELETE FROM daily_emissions_rollup WHERE " + bounds, params)
+    cursor.execute(
+        "SELECT date, campus_id, source_type, SUM(raw_value), COUNT(*) FROM activity_data "
+        "WHERE " + bounds + " GROUP BY date, campus_id, source_type",
+        params
+    )
+    return _insert_grouped(cursor, cursor.fetchall())
+
+
+def _insert_grouped(cursor, grouped_rows):
+    grouped = {
+        (str(rec_date)[:10], int(campus_id), source_type): (float(raw_total), int(count))
+        for rec_date, campus_id, source_type, raw_total, count in grouped_rows
+    }
+    rows = _with_emissions(grouped.items(), factors.get_table(cursor, lock=True))
+    for start in range(0, len(rows), 1000):
+        cursor.executemany(ROLLUP_UPSERT, rows[start:start + 1000])
+    return len(rows)
+
+
+def main(argv=None):
+    import argparse
+
+    from database import backends, summary
+    from database.init_db import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description='Maintain the daily_emissions_rollup table.')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.parse_args(argv)
+
+    connection = backends.connect(DB_CONFIG)
+    cursor = connection.cursor()
+    try:
+        rows = rebuild(cursor)
+        source_count = summary.rebuild(cursor)
+        connection.commit()
+        print(f"✅ Rebuilt daily_emissions_rollup ({rows} rows) and source_emissions_summary ({source_count} sources).")
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+-- SQLite version of schema.sql (DB_BACKEND=sqlite). Keep both in sync.
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username VARCHAR(100) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS api_keys (
+    key_id VARCHAR(32) PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    secret_hash CHAR(64) NOT NULL,
+    user_id INT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    revoked_at TIMESTAMP NULL
+);
+
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti VARCHAR(64) PRIMARY KEY,
+    expires_at DATETIME NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS import_jobs (
+    job_id VARCHAR(32) PRIMARY KEY,
+    status VARCHAR(12) NOT NULL,
+    filename VARCHAR(255) NULL,
+    user_id INT NULL,
+    bytes_total BIGINT NOT NULL DEFAULT 0,
+    bytes_done BIGINT NOT NULL DEFAULT 0,
+    last_line INT NOT NULL DEFAULT 0,
+    accepted INT NOT NULL DEFAULT 0,
+    rejected INT NOT NULL DEFAULT 0,
+    inserted INT NOT NULL DEFAULT 0,
+    updated INT NOT NULL DEFAULT 0,
+    unchanged INT NOT NULL DEFAULT 0,
+    seconds DOUBLE NOT NULL DEFAULT 0,
+    error VARCHAR(255) NULL,
+    created_at DATETIME NOT NULL,
+    heartbeat_at DATETIME NULL,
+    finished_at DATETIME NULL,
+    claim_token VARCHAR(16) NULL
+);
+
+CREATE TABLE IF NOT EXISTS import_job_errors (
+    job_id VARCHAR(32) NOT NULL,
+    line INT NOT NULL,
+    error VARCHAR(255) NOT NULL,
+    PRIMARY KEY (job_id, line)
+);
+
+CREATE TABLE IF NOT EXISTS archived_years (
+    year INT PRIMARY KEY,
+    row_count BIGINT NOT NULL,
+    raw_total DOUBLE NOT NULL,
+    emissions_tonnes DOUBLE NOT NULL,
+    file_name VARCHAR(255) NOT NULL,
+    sha256 CHAR(64) NOT NULL,
+    archived_at DATETIME NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS source_types (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(100) UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS campuses (
+    id INTEGER PRIMARY KEY,
+    code VARCHAR(32) UNIQUE NOT NULL,
+    name VARCHAR(100) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS activity_data (
+    id INTEGER PRIMARY KEY,
+    date DATE NOT NULL,
+    campus_id INTEGER NOT NULL DEFAULT 1,
+    source_type VARCHAR(100) NOT NULL,
+    source_id INTEGER NULL,
+    raw_value DOUBLE NOT NULL,
+    unit VARCHAR(50) NOT NULL,
+    meter_id VARCHAR(64) NOT NULL DEFAULT '',
+    reading_time TIME NOT NULL DEFAULT '00:00:00'
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_activity_natural ON activity_data (date, campus_id, source_type, meter_id, reading_time);
+CREATE INDEX IF NOT EXISTS idx_activity_date_source ON activity_data (date, source_id);
+
+CREATE TABLE IF NOT EXISTS emission_factors (
+    id INTEGER PRIMARY KEY,
+    source_type VARCHAR(100) NOT NULL,
+    source_id INTEGER NULL,
+    factor DECIMAL(12, 6) NOT NULL,
+    factor_unit VARCHAR(50) NOT NULL,
+    effective_from DATE NOT NULL DEFAULT '1970-01-01',
+    effective_to DATE NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_factor_version ON emission_factors (source_type, effective_from);
+
+-- Bumped by every emission factor edit, checked by writers in their transaction
+CREATE TABLE IF NOT EXISTS emission_factor_version (
+    id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS human_count (
+    id INTEGER PRIMARY KEY,
+    campus_id INTEGER NOT NULL DEFAULT 1,
+    date DATE NOT NULL,
+    humans INT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_human_count ON human_count (campus_id, date);
+
+CREATE TABLE IF NOT EXISTS daily_emissions_rollup (
+    campus_id INTEGER NOT NULL DEFAULT 1,
+    date DATE NOT NULL,
+    source_type VARCHAR(100) NOT NULL,
+    raw_total DOUBLE NOT NULL DEFAULT 0,
+    emissions_tonnes DOUBLE NOT NULL DEFAULT 0,
+    row_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (campus_id, date, source_type)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rollup_date ON daily_emissions_rollup (date);
+
+CREATE TABLE IF NOT EXISTS source_emissions_summary (
+    source_type VARCHAR(100) PRIMARY KEY,
+    lifetime_raw DOUBLE NOT NULL DEFAULT 0,
+    lifetime_tonnes DOUBLE NOT NULL DEFAULT 0,
+    row_count INT NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO campuses (id, code, name) VALUES (1, 'main', 'Main campus');
+
+INSERT OR IGNORE INTO emission_factors (source_type, factor, factor_unit) VALUES
+('electricity', 0.708, 'kg_co2e_per_kwh'),
+('bus_diesel', 2.68, 'kg_co2e_per_liter'),
+('canteen_lpg', 2.93, 'kg_co2e_per_kg'),
+('waste_landfill', 1.25, 'kg_co2e_per_kg');
+
+INSERT OR IGNORE INTO emission_factor_version (id, version) VALUES (1, 0);
@@ -0,0 +1,71 @@
+"""
+Compact integer ids for source types.
+
+`source_types` maps each source_type name to a SMALLINT id. activity_data and
+emission_factors carry it as `source_id`, so joins and the
+(date, source_id) index compare 2-byte integers instead of VARCHAR(100).
+Ids never change once assigned, so committed ones are cached per process.
+"""
+import threading
+
+_ids = {}  # committed ids
+_registered = {}  # ids this process inserted, possibly not committed yet
+_lock = threading.Lock()
+
+
+def resolve_source_ids(cursor, names):
+    """
+    Returns {name: id} for `names`, registering unknown source types in the
+    caller's transaction. Only committed ids are cached: one registered here
+    could still be rolled back, so it is read again on the name's next use
+    and cached once that finds it. Resolve a new name at most once per
+    transaction, since a second call would find it before the commit.
+    """
+    names = set(names)
+    with _lock:
+        missing = [n for n in names if n not in _ids]
+    if missing:
+        found = _select_ids(cursor, missing)
+        new = [n for n in missing if n not in found]
+        inserted = {}
+        if new:
+            cursor.executemany("INSERT IGNORE INTO source_types (name) VALUES (%s)", [(n,) for n in new])
+            inserted = _select_ids(cursor, new)
+        with _lock:
+            # Rows other transactions have not committed are invisible, so `found` is committed
+            _ids.update(found)
+            for name in found:
+                _registered.pop(name, None)
+            _registered.update(inserted)
+            return {n: _ids.get(n) or _registered[n] for n in names}
+    with _lock:
+        return {n: _ids[n] for n in names}
+
+
+def _select_ids(cursor, names):
+    cursor.execute(
+        "SELECT name, id FROM source_types WHERE name IN (" + ", ".join(["%s"] * len(names)) + ")",
+        list(names)
+    )
+    return {name: int(source_id) for name, source_id in cursor.fetchall()}
+
+
+def backfill(cursor):
+    """
+    Registers every source name in emission_factors/activity_data and fills
+    in missing source_id values, e.g. for rows written before source ids
+    existed or added by hand.
+    """
+    cursor.execute("INSERT IGNORE INTO source_types (name) SELECT source_type FROM emission_factors")
+    cursor.execute("INSERT IGNORE INTO source_types (name) SELECT DISTINCT source_type FROM activity_data")
+    for table in ('emission_factors', 'activity_data'):
+        cursor.execute(
+            f"UPDATE {table} t JOIN source_types s ON s.name = t.source_type "
+            f"SET t.source_id = s.id WHERE t.source_id IS NULL"
+        )
+
+
+def clear_cache():
+    with _lock:
+        _ids.clear()
+        _registered.clear()
@@ -0,0 +1,123 @@
+"""
+Maintenance of the `source_emissions_summary` table.
+
+One row per source_type, summed over all campuses, holds its lifetime
+totals, updated incrementally from the rollup deltas of each write. A write
+only touches the rows of its own sources, in sorted order, so concurrent
+writers of different sources never wait on each other.
+
+`fetch` adds what the recommendations need at read time: the emissions of
+the trailing 30 days and the 30 days before that, and the resulting trend
+direction. The windows end at the latest reading in the rollup (capped at
+today), so historical imports still produce a meaningful trend. They read
+at most 60 days x campuses x sources rollup rows through idx_rollup_date,
+no matter how large activity_data is.
+"""
+from datetime import date, datetime, timedelta
+
+WINDOW_DAYS = 30
+TREND_THRESHOLD = 0.05  # relative change below this counts as flat
+
+SUMMARY_UPSERT = (
+    "INSERT INTO source_emissions_summary (source_type, lifetime_raw, lifetime_tonnes, row_count) "
+    "VALUES (%s, %s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE "
+    "lifetime_raw = lifetime_raw + VALUES(lifetime_raw), "
+    "lifetime_tonnes = lifetime_tonnes + VALUES(lifetime_tonnes), "
+    "row_count = row_count + VALUES(row_count)"
+)
+
+
+def trend_of(trailing, prior):
+    """'new', 'up', 'down' or 'flat' for the trailing window vs. the one before it."""
+    if prior <= 0:
+        return 'new' if trailing > 0 else 'flat'
+    change = (trailing - prior) / prior
+    if change > TREND_THRESHOLD:
+        return 'up'
+    if change < -TREND_THRESHOLD:
+        return 'down'
+    return 'flat'
+
+
+def apply_rollup_rows(cursor, rows):
+    """
+    Folds rollup deltas ((date, campus_id, source_type, raw, tonnes, count)
+    rows as returned by rollup.apply_records) into the lifetime totals of the
+    whole group. Caller commits.
+    """
+    per_source = {}
+    for _, _, source_type, raw_total, tonnes, count in rows:
+        raw_sum, tonnes_sum, count_sum = per_source.get(source_type, (0.0, 0.0, 0))
+        per_source[source_type] = (raw_sum + raw_total, tonnes_sum + tonnes, count_sum + count)
+    if not per_source:
+        return
+    # Sorted, so writers lock the rows they share in the same order
+    cursor.executemany(SUMMARY_UPSERT, [
+        (source_type, raw_sum, tonnes_sum, count_sum)
+        for source_type, (raw_sum, tonnes_sum, count_sum) in sorted(per_source.items())
+    ])
+
+
+def windows(cursor):
+    """
+    (window_end, {source_type: (trailing_tonnes, prior_tonnes)}) from the
+    rollup; (None, {}) while it is empty.
+    """
+    # Future-dated readings (typos, clock skew) must not drag the window away
+    cursor.execute("SELECT MAX(date) FROM daily_emissions_rollup WHERE date <= %s", (date.today(),))
+    row = cursor.fetchone()
+    if not row or row[0] is None:
+        return None, {}
+    window_end = datetime.strptime(str(row[0])[:10], '%Y-%m-%d').date()
+    trailing_start = window_end - timedelta(days=WINDOW_DAYS - 1)
+    prior_start = trailing_start - timedelta(days=WINDOW_DAYS)
+
+    cursor.execute(
+        """
+        SELECT
+            source_type,
+            SUM(CASE WHEN date >= %s THEN emissions_tonnes ELSE 0 END),
+            SUM(CASE WHEN date < %s THEN emissions_tonnes ELSE 0 END)
+        FROM daily_emissions_rollup
+        WHERE date BETWEEN %s AND %s
+        GROUP BY source_type
+        """,
+        (trailing_start, trailing_start, prior_start, window_end)
+    )
+    return window_end, {source_type: (float(t or 0), float(p or 0)) for source_type, t, p in cursor.fetchall()}
+
+
+def rebuild(cursor):
+    """Recomputes the summary from daily_emissions_rollup. Caller commits."""
+    cursor.execute("DELETE FROM source_emissions_summary")
+    cursor.execute(
+        """
+        INSERT INTO source_emissions_summary (source_type, lifetime_raw, lifetime_tonnes, row_count)
+        SELECT source_type, SUM(raw_total), SUM(emissions_tonnes), SUM(row_count)
+        FROM daily_emissions_rollup
+        GROUP BY source_type
+        """
+    )
+    return cursor.rowcount
+
+
+def fetch(cursor):
+    """Summary rows with their trailing windows as dicts, biggest lifetime emitter first."""
+    cursor.execute(
+        "SELECT source_type, lifetime_tonnes FROM source_emissions_summary ORDER BY lifetime_tonnes DESC"
+    )
+    lifetimes = cursor.fetchall()
+    window_end, totals = windows(cursor)
+    rows = []
+    for source_type, lifetime in lifetimes:
+        trailing, prior = totals.get(source_type, (0.0, 0.0))
+        rows.append({
+            'source_type': source_type,
+            'lifetime_tonnes': float(lifetime or 0),
+            'trailing_tonnes': trailing,
+            'prior_tonnes': prior,
+            'trend': trend_of(trailing, prior),
+            'window_end': window_end.isoformat() if window_end else None,
+        })
+    return rows
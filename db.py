@@ -0,0 +1,179 @@
+"""
+Request-scoped database access for the Flask routes.
+
+The first call in a request checks one connection out of the pool and binds
+it to `flask.g`; the teardown handler gives it back (rolling back anything
+left uncommitted), so routes never open or close connections themselves.
+
+The fixed hot queries live in QUERIES and run on server-side prepared
+cursors (`cursor(prepared=True)`). Those cursors stay attached to their
+pooled connection, so MySQL parses each statement once per connection
+rather than on every request. They return plain tuples and name their
+columns, never `SELECT *`.
+
+`fan_out` runs independent per-campus queries concurrently on a small
+thread pool, each on its own pooled connection, so a group-wide view
+takes about as long as its slowest campus instead of the sum of them.
+The request gives its own connection back first, so no thread ever waits
+for a connection while holding one, and at most `fan_out_workers`
+connections (fewer than the pool size) serve fan-out calls.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g
+
+from metrics import POOL_WAIT_SECONDS, QUERY_SECONDS, ROWS_FETCHED
+
+logger = logging.getLogger(__name__)
+
+QUERIES = {
+    'user_by_username': "SELECT id, username, password FROM users WHERE username = %s",
+    # Per campus: the rollup and head count keys start with campus_id
+    'dashboard_buckets': (
+        "SELECT date, source_type, raw_total, emissions_tonnes FROM daily_emissions_rollup "
+        "WHERE campus_id = %s AND date BETWEEN %s AND %s ORDER BY date"
+    ),
+    'period_emissions': (
+        "SELECT SUM(emissions_tonnes) FROM daily_emissions_rollup WHERE campus_id = %s AND date BETWEEN %s AND %s"
+    ),
+    'human_counts': (
+        "SELECT date, humans FROM human_count WHERE campus_id = %s AND date BETWEEN %s AND %s ORDER BY date"
+    ),
+}
+
+_pool = None
+_executor = None
+
+
+def init_app(app, pool, fan_out_workers=0):
+    """
+    Serves connections from `pool` and returns them when each request ends.
+    `fan_out_workers` threads (0: none) run `fan_out` calls.
+    """
+    global _pool, _executor
+    _pool = pool
+    if fan_out_workers >= pool.size:
+        # Leave request threads at least one connection
+        logger.warning("fan_out_workers=%d is not below the pool size %d; using %d",
+                       fan_out_workers, pool.size, pool.size - 1)
+        fan_out_workers = pool.size - 1
+    if fan_out_workers > 0:
+        _executor = ThreadPoolExecutor(max_workers=fan_out_workers, thread_name_prefix='db-fan-out')
+    app.teardown_appcontext(close_connection)
+
+
+def get_connection():
+    """The request's connection, checked out on first use. Raises PoolError."""
+    if 'db_connection' not in g:
+        started = time.perf_counter()
+        g.db_connection = _pool.acquire()
+        POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+        g.db_cursors = []
+    return g.db_connection
+
+
+def cursor():
+    """A tuple cursor on the request's connection, closed at teardown."""
+    cur = get_connection().cursor()
+    g.db_cursors.append(cur)
+    return cur
+
+
+def query(name, params=()):
+    """Runs hot query `name` on the request's connection. See `run_query`."""
+    return run_query(get_connection(), name, params)
+
+
+def run_query(connection, name, params=()):
+    """Runs hot query `name` on the connection's prepared cursor and returns all rows (timed per name)."""
+    prepared = connection.state.setdefault('prepared', {})
+    cur = prepared.get(name)
+    if cur is None:
+        cur = prepared[name] = connection.cursor(prepared=True)
+    started = time.perf_counter()
+    try:
+        cur.execute(QUERIES[name], params)
+        rows = cur.fetchall()
+    except Exception:
+        # Drop the cursor so a half-read result cannot leak into the next call
+        prepared.pop(name, None)
+        _close_quietly(cur)
+        raise
+    QUERY_SECONDS.observe(time.perf_counter() - started, query=name)
+    ROWS_FETCHED.inc(len(rows), query=name)
+    return rows
+
+
+def fan_out(fn, items):
+    """
+    Returns [fn(connection, item) for item in items], the calls running
+    concurrently on the fan-out threads, each with its own pooled
+    connection. A single item (or no fan-out threads) runs inline on the
+    request's connection. The first exception raised (e.g. PoolError) is
+    re-raised once every call has finished.
+    """
+    items = list(items)
+    if len(items) <= 1 or _executor is None:
+        connection = get_connection()
+        return [fn(connection, item) for item in items]
+    # Read-only fan-outs only: anything uncommitted on the request's connection is rolled back
+    release()
+    futures = [_executor.submit(_call_pooled, fn, item) for item in items]
+    # Wait for all of them so no call is still using a connection when we raise
+    errors = [f.exception() for f in futures]
+    for error in errors:
+        if error is not None:
+            raise error
+    return [f.result() for f in futures]
+
+
+def _call_pooled(fn, item):
+    started = time.perf_counter()
+    connection = _pool.acquire()
+    POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+    try:
+        return fn(connection, item)
+    finally:
+        connection.close()
+
+
+def commit():
+    get_connection().commit()
+
+
+def rollback():
+    """Rolls back the request's transaction, if a connection was used."""
+    connection = g.get('db_connection')
+    if connection is None:
+        return
+    try:
+        connection.rollback()
+    except Exception:
+        logger.warning('Rollback failed', exc_info=True)
+
+
+def release():
+    """
+    Gives the request's connection back to the pool before the request ends,
+    rolling back anything uncommitted. The next call checks out a new one.
+    """
+    rollback()
+    close_connection()
+
+
+def close_connection(exc=None):
+    connection = g.pop('db_connection', None)
+    if connection is None:
+        return
+    for cur in g.pop('db_cursors', []):
+        _close_quietly(cur)
+    connection.close()
+
+
+def _close_quietly(cur):
+    try:
+        cur.close()
+    except Exception:
+        pass
@@ -0,0 +1,161 @@
+"""
+Streaming export of activity_data (`GET /api/export`).
+
+Readings are read on an unbuffered (server-side) cursor in natural key
+order and written out EXPORT_FETCH_SIZE rows at a time as CSV or NDJSON,
+so memory stays constant however many rows the export has. Each reading's
+emissions are computed on the fly with the factor version valid on its
+date (database/factors.py).
+
+Every row starts with its natural key (date, campus, source_type,
+meter_id, reading_time). To resume a dropped download, pass those five
+fields of the last complete row as `after` (CSV text, e.g.
+`2024-03-01,main,electricity,m-17,13:15:00`): the export continues right
+after that reading, and a resumed CSV has no header row.
+"""
+import csv
+import io
+import os
+from datetime import date, time
+
+import codec
+from database import backends, campuses, factors
+from metrics import ROWS_FETCHED
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+KEY_COLUMNS = ('date', 'campus', 'source_type', 'meter_id', 'reading_time')
+COLUMNS = KEY_COLUMNS + ('raw_value', 'unit', 'factor', 'emissions_kg')
+
+# Rows per fetch and per written block
+FETCH_SIZE = int(os.environ.get('EXPORT_FETCH_SIZE', 2000))
+
+# MySQL drops an unbuffered result whose client stops reading for this long
+# (net_write_timeout); a slow download stalls the reads, so allow more
+NET_WRITE_TIMEOUT = int(os.environ.get('EXPORT_NET_WRITE_TIMEOUT', 600))
+
+
+def parse_after(text, campus_ids):
+    """
+    `after` parameter -> (date, campus_id, source_type, meter_id,
+    reading_time), with the campus code looked up in `campus_ids`.
+    Raises ValueError.
+    """
+    fields = next(csv.reader([text]), [])
+    if len(fields) < len(KEY_COLUMNS):
+        raise ValueError('after must be date,campus,source_type,meter_id,reading_time')
+    rec_date, campus, source_type, meter_id, reading_time = fields[:len(KEY_COLUMNS)]
+    if campus not in campus_ids:
+        raise ValueError(f"Unknown campus: {campus}")
+    reading_time = time.fromisoformat(reading_time).strftime('%H:%M:%S')
+    return date.fromisoformat(rec_date), campus_ids[campus], source_type, meter_id, reading_time
+
+
+def build_query(start=None, end=None, source_types=None, after=None, campus_ids=None):
+    """SELECT over the natural key index for the given filters -> (sql, params)."""
+    clauses = []
+    params = []
+    if start is not None:
+        clauses.append("date >= %s")
+        params.append(start)
+    if end is not None:
+        clauses.append("date <= %s")
+        params.append(end)
+    if source_types:
+        clauses.append("source_type IN (" + ", ".join(["%s"] * len(source_types)) + ")")
+        params.extend(source_types)
+    if campus_ids:
+        clauses.append("campus_id IN (" + ", ".join(["%s"] * len(campus_ids)) + ")")
+        params.extend(campus_ids)
+    if after is not None:
+        # The plain date bound gives the index range; the row value skips the rest of that day
+        clauses.append(
+            "date >= %s AND (date, campus_id, source_type, meter_id, reading_time) > (%s, %s, %s, %s, %s)"
+        )
+        params.append(after[0])
+        params.extend(after)
+    sql = "SELECT date, campus_id, source_type, meter_id, reading_time, raw_value, unit FROM activity_data"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    return sql + " ORDER BY date, campus_id, source_type, meter_id, reading_time", params
+
+
+def _time_text(value):
+    if hasattr(value, 'total_seconds'):
+        seconds = int(value.total_seconds())
+        return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return str(value)[:8]
+
+
+def iter_batches(cursor, table, codes, fetch_size=FETCH_SIZE):
+    """Yields lists of rows in COLUMNS order from an executed export query; `codes` maps campus ids to codes."""
+    day = None
+    day_factors = {}
+    while True:
+        batch = cursor.fetchmany(fetch_size)
+        if not batch:
+            return
+        ROWS_FETCHED.inc(len(batch), query='activity_export')
+        rows = []
+        for rec_date, campus_id, source_type, meter_id, reading_time, raw_value, unit in batch:
+            rec_day = str(rec_date)[:10]
+            if rec_day != day:
+                # Rows come in date order: look each factor up once per day
+                day, day_factors = rec_day, {}
+            factor = day_factors.get(source_type)
+            if factor is None and source_type not in day_factors:
+                factor = day_factors[source_type] = table.factor_for(source_type, rec_day)
+            raw_value = float(raw_value)
+            rows.append((rec_day, codes[campus_id], source_type, meter_id, _time_text(reading_time),
+                         raw_value, unit, factor, raw_value * factor if factor is not None else None))
+        yield rows
+
+
+def encode_csv(batches, header=True):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if header:
+        writer.writerow(COLUMNS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # header of an empty export
+        yield buffer.getvalue().encode('utf-8')
+
+
+def encode_ndjson(batches):
+    for rows in batches:
+        yield b''.join(codec.dumps(dict(zip(COLUMNS, row))) + b'\n' for row in rows)
+
+
+def stream(connection, fmt, start=None, end=None, source_types=None, after=None, campus_ids=None,
+           fetch_size=FETCH_SIZE):
+    """
+    Yields the export body in blocks of `fetch_size` rows. The caller owns
+    `connection`; if the generator is not run to the end, the connection
+    may still hold part of the result and should be discarded.
+    """
+    cursor = connection.cursor()
+    try:
+        table = factors.get_table(cursor)
+        codes = {campus_id: code for code, campus_id in campuses.load(cursor).items()}
+        mysql = backends.dialect(connection) == 'mysql'
+        if mysql:
+            cursor.execute("SET SESSION net_write_timeout = %s", (NET_WRITE_TIMEOUT,))
+    finally:
+        cursor.close()
+
+    sql, params = build_query(start, end, source_types, after, campus_ids)
+    cursor = connection.cursor(buffered=False)
+    cursor.execute(sql, params)
+    batches = iter_batches(cursor, table, codes, fetch_size)
+    if fmt == 'csv':
+        yield from encode_csv(batches, header=after is None)
+    else:
+        yield from encode_ndjson(batches)
+    cursor.close()
+    if mysql:
+        cursor = connection.cursor()
+        cursor.execute("SET SESSION net_write_timeout = DEFAULT")
+        cursor.close()
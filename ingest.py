@@ -0,0 +1,445 @@
+"""
+Write path for activity_data.
+
+Every endpoint that stores readings goes through here so the raw table, the
+daily rollup and the per-source summary are updated in the same transaction.
+"""
+import csv
+import io
+import logging
+import os
+import queue
+import threading
+import time as clock
+from datetime import date, datetime, time, timedelta
+
+import codec
+from database import archive, campuses, rollup, sources, summary
+from metrics import QUERY_SECONDS, ROWS_FETCHED, ROWS_WRITTEN
+
+UPSERT_ACTIVITY_PREFIX = (
+    "INSERT INTO activity_data (date, campus_id, source_type, source_id, meter_id, reading_time, raw_value, unit) "
+    "VALUES "
+)
+NATURAL_KEY_MATCH = "(date = %s AND campus_id = %s AND source_type = %s AND meter_id = %s AND reading_time = %s)"
+UPSERT_ACTIVITY_SUFFIX = " ON DUPLICATE KEY UPDATE raw_value = VALUES(raw_value), unit = VALUES(unit)"
+
+REQUIRED_FIELDS = ('date', 'source_type', 'raw_value', 'unit')
+OPTIONAL_FIELDS = ('meter_id', 'reading_time', 'campus')
+
+# Rows per multi-row upsert statement
+UPSERT_BATCH_SIZE = int(os.environ.get('UPSERT_BATCH_SIZE', 500))
+
+# Cap on per-row errors echoed back to the client; the counts are always exact
+MAX_REPORTED_ERRORS = 100
+
+logger = logging.getLogger(__name__)
+
+
+def _time_key(value):
+    """Normalize a TIME value (timedelta from MySQL, time or string) to 'HH:MM:SS'."""
+    if isinstance(value, timedelta):
+        seconds = int(value.total_seconds())
+        return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    if isinstance(value, time):
+        return value.strftime('%H:%M:%S')
+    return str(value)[:8]
+
+
+def _check_date(value):
+    """Raises ValueError unless `value` is a YYYY-MM-DD date (as strptime reads it)."""
+    # fromisoformat is much cheaper than strptime; keep strptime for the lenient forms
+    if len(value) == 10 and value.isascii() and value[4] == '-' and value[7] == '-':
+        date.fromisoformat(value)
+    else:
+        datetime.strptime(value, '%Y-%m-%d')
+
+
+def _normalize_time(value):
+    """'HH:MM[:SS]' -> 'HH:MM:SS'; raises ValueError on anything else."""
+    if len(value) in (5, 8) and value.isascii() and value[2] == ':' and (len(value) == 5 or value[5] == ':'):
+        time.fromisoformat(value)
+        return value if len(value) == 8 else value + ':00'
+    for fmt in ('%H:%M:%S', '%H:%M'):
+        try:
+            return datetime.strptime(value, fmt).strftime('%H:%M:%S')
+        except ValueError:
+            continue
+    raise ValueError(value)
+
+
+def _natural_key(rec_date, campus_id, source_type, meter_id, reading_time):
+    return (str(rec_date)[:10], int(campus_id), source_type, meter_id, _time_key(reading_time))
+
+
+def upsert_activity_records(cursor, records, batch_size=UPSERT_BATCH_SIZE):
+    """
+    Idempotently writes `records` (tuples as returned by `validate_record`:
+    (date, source_type, raw_value, unit, meter_id, reading_time, campus_id))
+    keyed on (date, campus_id, source_type, meter_id, reading_time). A
+    re-sent reading overwrites
+    the stored one instead of duplicating it. The rollup and summary get the
+    exact difference. Caller commits.
+
+    Returns one {'inserted', 'updated', 'unchanged', 'rejected'} dict per
+    batch; `rejected` is left for callers that validate as they go.
+    """
+    if not records:
+        return []
+    # Once per call (i.e. per transaction), as resolve_source_ids requires
+    source_ids = sources.resolve_source_ids(cursor, {rec[1] for rec in records})
+    batches = []
+    for start in range(0, len(records), batch_size):
+        batches.append(_upsert_batch(cursor, records[start:start + batch_size], source_ids))
+    return batches
+
+
+def _upsert_batch(cursor, records, source_ids):
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0}
+
+    # Within a batch the last reading for a key wins, as it would in sequence
+    latest = {}
+    for rec in records:
+        key = _natural_key(rec[0], rec[6], rec[1], rec[4], rec[5])
+        if key in latest:
+            counts['updated'] += 1
+        latest[key] = rec
+    if not latest:
+        return counts
+
+    # Lock and read the rows this batch will touch so the deltas are exact
+    keys = list(latest)
+    with QUERY_SECONDS.time(query='activity_lock_existing'):
+        cursor.execute(
+            # OR of equality groups, not a row-value IN list: SQLite only
+            # seeks the natural key index for the former
+            "SELECT date, campus_id, source_type, meter_id, reading_time, raw_value, unit FROM activity_data WHERE "
+            + " OR ".join([NATURAL_KEY_MATCH] * len(keys)) + " FOR UPDATE",
+            [part for key in keys for part in key]
+        )
+        rows = cursor.fetchall()
+    ROWS_FETCHED.inc(len(rows), query='activity_lock_existing')
+    existing = {
+        _natural_key(row[0], row[1], row[2], row[3], row[4]): (float(row[5]), row[6])
+        for row in rows
+    }
+
+    changed = []
+    deltas = []
+    for key, (rec_date, source_type, raw_value, unit, meter_id, reading_time, campus_id) in latest.items():
+        old = existing.get(key)
+        if old is None:
+            counts['inserted'] += 1
+            deltas.append((key[0], key[1], source_type, raw_value, 1))
+        elif old == (raw_value, unit):
+            counts['unchanged'] += 1
+            continue
+        else:
+            counts['updated'] += 1
+            deltas.append((key[0], key[1], source_type, raw_value - old[0], 0))
+        changed.append((key[0], key[1], source_type, source_ids[source_type], meter_id, key[4], raw_value, unit))
+
+    if changed:
+        with QUERY_SECONDS.time(query='activity_upsert'):
+            cursor.execute(
+                UPSERT_ACTIVITY_PREFIX
+                + ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(changed))
+                + UPSERT_ACTIVITY_SUFFIX,
+                [value for row in changed for value in row]
+            )
+        ROWS_WRITTEN.inc(len(changed), query='activity_upsert')
+        with QUERY_SECONDS.time(query='rollup_apply'):
+            summary.apply_rollup_rows(cursor, rollup.apply_deltas(cursor, deltas))
+    return counts
+
+
+def sum_batches(batches):
+    """Totals per-batch counts into one dict."""
+    totals = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0}
+    for batch in batches:
+        for k in totals:
+            totals[k] += batch.get(k, 0)
+    return totals
+
+
+def validate_record(rec, archived_through=None, campus_ids=None):
+    """
+    Checks one {date, source_type, raw_value, unit[, meter_id, reading_time,
+    campus]} mapping. Returns (record tuple, None) when valid, otherwise
+    (None, error message). The tuple is
+    (date, source_type, raw_value, unit, meter_id, reading_time, campus_id).
+    Dates up to `archived_through` (see database/archive.py) are refused.
+    `campus` must be a code in `campus_ids` ({code: id}, see
+    database/campuses.py); without one the reading goes to the default campus.
+    """
+    missing = [k for k in REQUIRED_FIELDS if rec.get(k) in (None, '')]
+    if missing:
+        return None, f"Missing field(s): {', '.join(missing)}"
+    rec_date = str(rec['date']).strip()
+    try:
+        _check_date(rec_date)
+    except ValueError:
+        return None, 'Invalid date format. Use YYYY-MM-DD'
+    if archived_through is not None and rec_date <= archived_through.isoformat():
+        return None, f"{rec_date[:4]} is archived and read-only"
+    try:
+        raw_value = float(rec['raw_value'])
+    except (TypeError, ValueError):
+        return None, 'raw_value must be a number'
+
+    meter_id = str(rec.get('meter_id') or '').strip()
+    if len(meter_id) > 64:
+        return None, 'meter_id must be at most 64 characters'
+    try:
+        reading_time = _normalize_time(str(rec.get('reading_time') or '').strip() or '00:00:00')
+    except ValueError:
+        return None, 'Invalid reading_time format. Use HH:MM[:SS]'
+    campus_id = campuses.DEFAULT_CAMPUS_ID
+    campus = str(rec.get('campus') or '').strip().lower()
+    if campus:
+        campus_id = (campus_ids or {}).get(campus)
+        if campus_id is None:
+            return None, f"Unknown campus '{campus[:32]}'"
+
+    return (
+        rec_date, str(rec['source_type']).strip(), raw_value, str(rec['unit']).strip(), meter_id, reading_time,
+        campus_id
+    ), None
+
+
+def iter_csv_records(text_stream):
+    """
+    Yields (line_number, row dict) from a CSV text stream, one row at a time.
+    The header row names the columns; `meter_id`, `reading_time` and
+    `campus` are optional and other extra columns are ignored.
+    Raises ValueError if the header lacks a required column.
+    """
+    reader = csv.reader(text_stream)
+    header = next(reader, None)
+    if header is None:
+        raise ValueError('CSV file is empty')
+    columns = [h.strip().lower() for h in header]
+    missing = [k for k in REQUIRED_FIELDS if k not in columns]
+    if missing:
+        raise ValueError(f"CSV header is missing column(s): {', '.join(missing)}")
+    positions = {k: columns.index(k) for k in REQUIRED_FIELDS + OPTIONAL_FIELDS if k in columns}
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        yield reader.line_num, {
+            k: (row[i].strip() if i < len(row) else None) for k, i in positions.items()
+        }
+
+
+def iter_ndjson_records(binary_stream, max_line_bytes=64 * 1024, read_bytes=io.DEFAULT_BUFFER_SIZE):
+    """
+    Yields ({'line', 'offset'}, record) from newline-delimited JSON, one
+    line at a time as it arrives. `offset` is the byte offset where the
+    line starts. `record` is the parsed object, or an error message for a
+    line that is not valid JSON (or longer than `max_line_bytes`, whose
+    remainder is skipped). Blank lines are ignored.
+
+    An unbuffered stream (the request body) is read in `read_bytes`
+    blocks; WSGI servers wait for a full block, so a slow sender's lines
+    surface once a block (or the body) is complete.
+    """
+    if not hasattr(binary_stream, 'read1'):
+        # readline on a raw stream reads byte by byte
+        binary_stream = io.BufferedReader(binary_stream, read_bytes)
+    offset = 0
+    line_no = 0
+    while True:
+        raw = binary_stream.readline(max_line_bytes + 1)
+        if not raw:
+            return
+        line_no += 1
+        position = {'line': line_no, 'offset': offset}
+        offset += len(raw)
+        if len(raw) > max_line_bytes and not raw.endswith(b'\n'):
+            while True:
+                rest = binary_stream.readline(max_line_bytes + 1)
+                offset += len(rest)
+                if not rest or rest.endswith(b'\n'):
+                    break
+            yield position, f"Line longer than {max_line_bytes} bytes"
+            continue
+        if not raw.strip():
+            continue
+        try:
+            yield position, codec.loads(raw)
+        except ValueError:
+            yield position, 'Invalid JSON'
+
+
+def text_stream(binary_stream, encoding='utf-8'):
+    """Wraps a binary request/file stream for incremental text decoding."""
+    if not hasattr(binary_stream, 'read1'):
+        binary_stream = io.BufferedReader(binary_stream)
+    return io.TextIOWrapper(binary_stream, encoding=encoding, newline='', errors='replace')
+
+
+def ingest_csv_stream(connection, stream, chunk_size=1000, on_chunk=None, skip_lines=0):
+    """
+    Parses CSV rows from `stream` and upserts valid ones in chunks of
+    `chunk_size` (see `ingest_records`). Memory stays bounded by the chunk
+    size whatever the file size, and re-sending a file is harmless.
+    Raises ValueError if the header is unusable.
+    """
+    items = (({'line': line_no}, rec) for line_no, rec in iter_csv_records(stream))
+    return ingest_records(connection, items, chunk_size, on_chunk=on_chunk, skip_lines=skip_lines)
+
+
+class _ReadAhead:
+    """
+    Iterates `items` on a reader thread, so the consumer can wait for the
+    next one with a timeout while the reader blocks on a quiet stream.
+    At most `maxsize` items are read ahead.
+    """
+
+    END = object()
+    TICK = object()
+
+    def __init__(self, items, maxsize):
+        self._queue = queue.Queue(maxsize)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(items,), name='ingest-reader', daemon=True)
+        self._thread.start()
+
+    def _run(self, items):
+        try:
+            for item in items:
+                if not self._put((item, None)):
+                    return
+            self._put((self.END, None))
+        except Exception as e:
+            # e.g. the client disconnected; re-raised in the consumer
+            self._put((self.END, e))
+
+    def _put(self, entry):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, timeout=None):
+        """The next item, TICK if none arrived within `timeout` seconds, or END."""
+        try:
+            item, error = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return self.TICK
+        if error is not None:
+            raise error
+        return item
+
+    def close(self):
+        self._stop.set()
+
+
+def ingest_records(connection, items, chunk_size=1000, on_chunk=None, skip_lines=0, flush_seconds=None):
+    """
+    Validates ({'line', ...}, record) items and upserts the valid ones in
+    chunks of `chunk_size`, committing after each chunk. A chunk is also
+    committed once its first record is `flush_seconds` old, so readings
+    trickling in over a long-lived request do not wait for a full chunk;
+    `items` are then read on a separate thread, so this deadline holds
+    while the stream is quiet too.
+    Invalid records are skipped and reported with their position; a
+    record that is an error message (a parse failure) is reported as is.
+    Each entry of `batches` counts the rows inserted/updated/unchanged/
+    rejected in one chunk. A database failure stops the import; chunks
+    committed before it are kept and `error` is set on the result.
+
+    `on_chunk(cursor, counts, errors, last_line)` runs inside each chunk's
+    transaction just before the commit, so progress recorded there commits
+    with the rows (see jobs.py). Lines up to `skip_lines` are parsed but
+    not imported again, to resume after the last committed chunk.
+    """
+    result = {'accepted': 0, 'rejected': 0, 'chunks': 0, 'batches': [], 'errors': []}
+    reader = _ReadAhead(items, chunk_size) if flush_seconds is not None else None
+    items = iter(items)
+    cursor = connection.cursor()
+    try:
+        boundary = archive.archived_through(cursor)
+        campus_ids = campuses.load(cursor)
+        chunk = []
+        pending = {'rejected': 0, 'errors': [], 'line': skip_lines}
+        chunk_started = None
+        while True:
+            if reader is None:
+                item = next(items, _ReadAhead.END)
+            else:
+                # Wake up when the open chunk is due, even if no line arrives
+                timeout = None if chunk_started is None else max(
+                    chunk_started + flush_seconds - clock.monotonic(), 0)
+                item = reader.get(timeout)
+            if item is _ReadAhead.END:
+                break
+            if item is _ReadAhead.TICK:
+                if chunk:
+                    if not _commit_chunk(connection, cursor, chunk, pending, result, on_chunk):
+                        return result
+                    chunk = []
+                    pending = {'rejected': 0, 'errors': [], 'line': pending['line']}
+                chunk_started = None
+                continue
+            position, rec = item
+            line_no = position['line']
+            if line_no <= skip_lines:
+                continue
+            pending['line'] = line_no
+            if isinstance(rec, str):
+                values, error = None, rec
+            elif not isinstance(rec, dict):
+                values, error = None, 'Record must be an object'
+            else:
+                values, error = validate_record(rec, boundary, campus_ids)
+            if error:
+                result['rejected'] += 1
+                pending['rejected'] += 1
+                if len(result['errors']) < MAX_REPORTED_ERRORS:
+                    result['errors'].append({**position, 'error': error})
+                    pending['errors'].append({**position, 'error': error})
+                continue
+            chunk.append(values)
+            if chunk_started is None:
+                chunk_started = clock.monotonic()
+            if len(chunk) >= chunk_size or (
+                    flush_seconds is not None and clock.monotonic() - chunk_started >= flush_seconds):
+                if not _commit_chunk(connection, cursor, chunk, pending, result, on_chunk):
+                    return result
+                chunk = []
+                chunk_started = None
+                pending = {'rejected': 0, 'errors': [], 'line': line_no}
+        if chunk or pending['rejected']:
+            _commit_chunk(connection, cursor, chunk, pending, result, on_chunk)
+    finally:
+        cursor.close()
+        if reader is not None:
+            reader.close()
+    return result
+
+
+def _commit_chunk(connection, cursor, chunk, pending, result, on_chunk=None):
+    try:
+        counts = sum_batches(upsert_activity_records(cursor, chunk))
+        counts['rejected'] = pending['rejected']
+        if on_chunk is not None:
+            on_chunk(cursor, counts, pending['errors'], pending['line'])
+        connection.commit()
+    except Exception:
+        logger.exception('Error upserting ingest chunk')
+        try:
+            connection.rollback()
+        except Exception:
+            pass
+        result['error'] = f"Failed to insert data after {result['accepted']} rows."
+        return False
+    result['batches'].append(counts)
+    result['accepted'] += len(chunk)
+    if chunk:
+        result['chunks'] += 1
+    return True
@@ -0,0 +1,269 @@
+"""
+Background CSV imports.
+
+`POST /api/upload_csv/jobs` only spools the upload to JOBS_SPOOL_DIR, with
+no connection held, then records a queued job (database/import_jobs.py)
+in one short transaction, so the request returns at once. A dispatcher
+thread per process claims queued jobs and runs them on a pool of
+JOBS_WORKERS threads, each with its own pooled connection, through
+`ingest.ingest_csv_stream` in CSV_CHUNK_SIZE chunks. Each chunk commits
+together with the job's counters and rejected lines, so
+`GET /api/jobs/<id>` reads exact progress from the database and any
+process can answer it.
+
+Jobs survive restarts: the spooled file stays until the job finishes, a
+job whose worker stopped heartbeating for JOBS_STALE_SECONDS is requeued,
+and a requeued job resumes after its last committed line. The dispatcher
+heartbeats this process's running jobs every JOBS_POLL_SECONDS, however
+long a chunk takes, and a worker whose job was requeued anyway loses its
+claim and stops at its next chunk.
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database import import_jobs
+from ingest import ingest_csv_stream, text_stream
+
+logger = logging.getLogger(__name__)
+
+COPY_BUFFER = 1024 * 1024
+
+
+class JobRunner:
+
+    def __init__(self, pool, spool_dir, workers=1, chunk_size=1000, poll_interval=5.0,
+                 stale_after=300.0, retention_days=7, on_change=None):
+        self.pool = pool
+        self.spool_dir = spool_dir
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.retention_days = retention_days
+        self.on_change = on_change  # called after a job committed rows (e.g. cache bump)
+        self._executor = None
+        self._slots = threading.Semaphore(workers)
+        self._running = {}  # job_id -> claim_token of jobs this process is running
+        self._running_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    # ---- Submitting ----
+    def spool_path(self, job_id):
+        return os.path.join(self.spool_dir, f"{job_id}.csv")
+
+    def submit(self, get_connection, stream, filename=None, user_id=None):
+        """Spools `stream` (binary) to disk, records a queued job and returns its id.
+        `get_connection` is only called once the upload is on disk, so no
+        connection is held while a slow client sends it."""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        job_id = import_jobs.new_job_id()
+        path = self.spool_path(job_id)
+        try:
+            with open(path, 'wb') as f:
+                shutil.copyfileobj(stream, f, COPY_BUFFER)
+                size = f.tell()
+            connection = get_connection()
+            cursor = connection.cursor()
+            try:
+                import_jobs.create_job(cursor, filename, size, user_id, job_id=job_id)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        except BaseException:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        self._wake.set()
+        return job_id
+
+    # ---- Dispatching ----
+    def start(self):
+        if self.workers <= 0 or self._thread is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='import-job')
+        self._thread = threading.Thread(target=self._dispatch_loop, name='import-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _dispatch_loop(self):
+        self._housekeeping(purge=True)
+        while not self._stopping.is_set():
+            self._wake.clear()
+            self._housekeeping()
+            try:
+                while self._slots.acquire(blocking=False):
+                    job = self._claim()
+                    if job is None:
+                        self._slots.release()
+                        break
+                    self._executor.submit(self._run_slot, job)
+            except Exception:
+                logger.exception('Import job dispatch failed')
+            self._wake.wait(self.poll_interval)
+
+    def _housekeeping(self, purge=False):
+        """
+        Heartbeats this process's running jobs, requeues jobs of dead workers
+        and, on startup, drops old finished jobs.
+        """
+        connection = None
+        try:
+            connection = self.pool.acquire()
+            cursor = connection.cursor()
+            with self._running_lock:
+                running = list(self._running.items())
+            for job_id, token in running:
+                try:
+                    import_jobs.heartbeat(cursor, job_id, token)
+                except import_jobs.ClaimLost:
+                    logger.warning("Import job %s was requeued while running here", job_id)
+            requeued = import_jobs.requeue_stale(cursor, self.stale_after)
+            purged = import_jobs.purge_finished(cursor, self.retention_days) if purge else 0
+            connection.commit()
+            if purge:
+                self._remove_orphans(cursor)
+            cursor.close()
+            if requeued:
+                logger.info("Requeued %d interrupted import job(s)", requeued)
+            if purged:
+                logger.info("Purged %d finished import job(s)", purged)
+        except Exception:
+            logger.exception('Import job housekeeping failed')
+        finally:
+            if connection is not None:
+                connection.close()
+
+    def _remove_orphans(self, cursor):
+        """Deletes spooled files whose job was purged (skipping any still being uploaded)."""
+        if not os.path.isdir(self.spool_dir):
+            return
+        cutoff = time.time() - 86400
+        for name in os.listdir(self.spool_dir):
+            job_id, ext = os.path.splitext(name)
+            path = os.path.join(self.spool_dir, name)
+            if ext == '.csv' and os.path.getmtime(path) < cutoff and import_jobs.load_job(cursor, job_id) is None:
+                os.remove(path)
+
+    def _claim(self):
+        connection = self.pool.acquire()
+        try:
+            cursor = connection.cursor()
+            try:
+                job = import_jobs.claim_next(cursor)
+                connection.commit()
+                return job
+            finally:
+                cursor.close()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def _run_slot(self, job):
+        with self._running_lock:
+            self._running[job['job_id']] = job['claim_token']
+        try:
+            self.run(job)
+        except Exception:
+            logger.exception("Import job %s crashed", job['job_id'])
+        finally:
+            with self._running_lock:
+                self._running.pop(job['job_id'], None)
+            self._slots.release()
+            self._wake.set()
+
+    # ---- Running ----
+    def run(self, job):
+        """Imports a claimed job's file, resuming after its last committed line."""
+        job_id = job['job_id']
+        token = job['claim_token']
+        path = self.spool_path(job_id)
+        started = time.perf_counter()
+        base_seconds = job['seconds'] or 0.0
+        connection = self.pool.acquire()
+        try:
+            if not os.path.exists(path):
+                self._finish(connection, job_id, token, 'Uploaded file is no longer available.')
+                return
+            logger.info("Import job %s started at line %d", job_id, job['last_line'])
+            with open(path, 'rb') as f:
+
+                def on_chunk(cursor, counts, errors, last_line):
+                    import_jobs.record_chunk(cursor, job_id, token, counts, errors, last_line, f.tell(),
+                                             base_seconds + time.perf_counter() - started)
+
+                try:
+                    result = ingest_csv_stream(connection, text_stream(f), self.chunk_size,
+                                               on_chunk=on_chunk, skip_lines=job['last_line'])
+                except ValueError as e:
+                    result = {'batches': [], 'error': f"Invalid CSV format. {e}"}
+            size = os.path.getsize(path)
+            changed = any(b['inserted'] or b['updated'] for b in result['batches'])
+            if changed and self.on_change is not None:
+                self.on_change()
+            if not self._finish(connection, job_id, token, result.get('error'), size):
+                # Requeued meanwhile: the chunk that found out was rolled back, the new owner resumes
+                logger.warning("Import job %s lost its claim; leaving it to its new worker", job_id)
+                return
+            if 'error' not in result:
+                os.remove(path)
+            logger.info("Import job %s finished", job_id,
+                        extra={'job_id': job_id, 'chunks': len(result['batches']), 'error': result.get('error')})
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _finish(connection, job_id, token, error=None, bytes_done=None):
+        cursor = connection.cursor()
+        try:
+            finished = import_jobs.finish_job(cursor, job_id, token, error, bytes_done)
+            connection.commit()
+            return finished
+        finally:
+            cursor.close()
+
+
+def describe(job, errors):
+    """JSON view of a job row for GET /api/jobs/<id>."""
+    processed = job['accepted'] + job['rejected']
+    return {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'filename': job['filename'],
+        'progress': round(job['bytes_done'] / job['bytes_total'], 4) if job['bytes_total'] else
+                    (1.0 if job['status'] == 'succeeded' else 0.0),
+        'bytes_total': job['bytes_total'],
+        'bytes_done': job['bytes_done'],
+        'accepted': job['accepted'],
+        'rejected': job['rejected'],
+        'inserted': job['inserted'],
+        'updated': job['updated'],
+        'unchanged': job['unchanged'],
+        'seconds': round(job['seconds'], 3),
+        'rows_per_second': round(processed / job['seconds'], 1) if job['seconds'] else None,
+        'errors': errors,
+        'error': job['error'],
+        'created_at': _timestamp(job['created_at']),
+        'finished_at': _timestamp(job['finished_at']),
+    }
+
+
+def _timestamp(value):
+    return str(value) if value is not None else None
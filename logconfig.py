@@ -0,0 +1,133 @@
+"""
+Logging setup for the web app.
+
+Request threads only put records on a queue (`QueueHandler`); a
+`QueueListener` thread formats and writes them, so a slow stderr never
+holds up a response. Records are JSON lines (LOG_FORMAT=json, the
+default) or the old `[LEVEL] message` text (LOG_FORMAT=text), and carry
+the correlation id of the request that logged them (`request_id`, taken
+from X-Request-ID or generated, and echoed back in the response).
+
+DEBUG records are high-volume diagnostics: below LOG_LEVEL they are
+dropped by the logger's level check before any formatting, and when
+enabled only LOG_DEBUG_SAMPLE of them (0..1) are kept. Guard per-row
+diagnostics with `logger.isEnabledFor(logging.DEBUG)` so building their
+arguments costs nothing when disabled.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+request_id = contextvars.ContextVar('request_id', default=None)
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_STANDARD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_listener = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps each record with the current request's correlation id."""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """Keeps a `rate` fraction of DEBUG records; other levels always pass."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1.0 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+
+    def __init__(self):
+        super().__init__('[%(levelname)s] %(message)s')
+
+    def format(self, record):
+        text = super().format(record)
+        rid = getattr(record, 'request_id', None)
+        return f"{text} (request {rid})" if rid else text
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread."""
+
+    def prepare(self, record):
+        # Resolve args and exception text now (they may not survive the
+        # thread hop); the JSON/text formatting itself happens later.
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure(level='INFO', fmt='json', debug_sample=1.0, stream=None):
+    """Routes the root logger through a background writer. Safe to call again."""
+    global _listener
+    stop()
+
+    target = logging.StreamHandler(stream or sys.stderr)
+    target.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    records = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(DebugSampler(debug_sample))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, target, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop():
+    """Flushes queued records and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop)
@@ -0,0 +1,180 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Counters and histograms keep one small array per label combination, so
+recording a value is a dict lookup, a bisect over the bucket bounds and a
+few additions under a lock. `render()` produces the exposition text for
+`GET /metrics`. Gauges read their value from a callback when scraped.
+
+Each worker process keeps its own numbers; with several workers, scrape
+each one or sum them in Prometheus.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; spans sub-millisecond cached lookups to multi-second imports
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.extend(f'{n}="{v}"' for n, v in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, _label_text(self.labels, key), value
+
+
+class Histogram:
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [count per bucket..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                yield self.name + '_bucket', _label_text(self.labels, key, [('le', _number(bound))]), cumulative
+            yield self.name + '_sum', _label_text(self.labels, key), series[-1]
+            yield self.name + '_count', _label_text(self.labels, key), cumulative
+
+
+class Gauge:
+    """Value read at scrape time: `read()` returns a number or {label value: number}."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, read, label=None):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.label = label
+
+    def samples(self):
+        value = self.read()
+        if self.label is None:
+            yield self.name, '', value
+            return
+        for label_value, v in sorted(value.items()):
+            yield self.name, _label_text((self.label,), (label_value,)), v
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# ---- Application metrics ----
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    'campus_http_request_duration_seconds', 'Time spent handling a request.',
+    labels=('endpoint', 'method', 'status'),
+)
+QUERY_SECONDS = registry.histogram(
+    'campus_db_query_duration_seconds', 'Time spent running a named query, fetch included.',
+    labels=('query',),
+)
+ROWS_FETCHED = registry.counter(
+    'campus_db_rows_fetched_total', 'Rows read by named queries.', labels=('query',),
+)
+ROWS_WRITTEN = registry.counter(
+    'campus_db_rows_written_total', 'Rows sent by named write statements.', labels=('query',),
+)
+POOL_WAIT_SECONDS = registry.histogram(
+    'campus_db_pool_wait_duration_seconds', 'Time a request waited for a pooled connection.',
+)
+DASHBOARD_STAGE_SECONDS = registry.histogram(
+    'campus_dashboard_stage_duration_seconds', 'Time spent in each step of building /api/dashboard.',
+    labels=('stage',),
+)
+WRITE_BUFFER_BATCH_ROWS = registry.histogram(
+    'campus_write_buffer_batch_rows', 'Readings written per write-buffer commit.',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+)
+WRITE_BUFFER_REJECTED = registry.counter(
+    'campus_write_buffer_rejected_total', 'Readings refused because the write buffer was full.',
+)
@@ -0,0 +1,106 @@
+"""
+Rule-based emission reduction recommendations.
+
+Rules run over the materialized `source_emissions_summary` rows (see
+database/summary.py), so building the list costs the same no matter how
+many readings are stored.
+"""
+# Trend changes smaller than this (in percent) are not worth a recommendation
+ALERT_PERCENT = 15.0
+
+SOURCE_LABELS = {
+    'electricity': 'Electricity',
+    'bus_diesel': 'Transport',
+    'canteen_lpg': 'Canteen fuel',
+    'waste_landfill': 'Waste',
+}
+
+TOP_SOURCE_ADVICE = {
+    'electricity': {
+        'title': 'Focus on Energy Efficiency',
+        'description': 'Electricity is your biggest emission source. Consider switching to LED lighting and installing solar panels.',
+        'priority': 'High'
+    },
+    'bus_diesel': {
+        'title': 'Promote Green Transportation',
+        'description': 'Transport emissions are high. Encourage carpooling, cycling, and consider electric buses.',
+        'priority': 'High'
+    },
+    'canteen_lpg': {
+        'title': 'Optimize Canteen Operations',
+        'description': 'Canteen fuel usage is significant. Consider induction cooking or solar cookers.',
+        'priority': 'Medium'
+    },
+    'waste_landfill': {
+        'title': 'Improve Waste Management',
+        'description': 'Waste emissions are high. Implement composting and recycling programs.',
+        'priority': 'High'
+    },
+}
+
+GENERAL_ADVICE = [
+    {
+        'title': 'Regular Monitoring',
+        'description': 'Continue tracking emissions data monthly to identify trends and measure improvement.',
+        'priority': 'Medium'
+    },
+    {
+        'title': 'Campus Awareness Campaign',
+        'description': 'Educate students and staff about sustainable practices and carbon footprint reduction.',
+        'priority': 'Low'
+    },
+]
+
+
+def _label(source_type):
+    return SOURCE_LABELS.get(source_type, source_type.replace('_', ' ').capitalize())
+
+
+def _percent_change(row):
+    if row['prior_tonnes'] <= 0:
+        return 0.0
+    return (row['trailing_tonnes'] - row['prior_tonnes']) / row['prior_tonnes'] * 100.0
+
+
+def build_recommendations(summary_rows):
+    """
+    `summary_rows` are summary.fetch() dicts ordered by lifetime emissions.
+    Returns a list of {title, description, priority}.
+    """
+    if not summary_rows:
+        return []
+
+    recommendations = []
+    top = summary_rows[0]
+    if top['source_type'] in TOP_SOURCE_ADVICE:
+        recommendations.append(dict(TOP_SOURCE_ADVICE[top['source_type']]))
+
+    for row in summary_rows:
+        label = _label(row['source_type'])
+        if row['trailing_tonnes'] <= 0 and row['prior_tonnes'] > 0:
+            recommendations.append({
+                'title': f'Missing Recent {label} Data',
+                'description': f"No {label.lower()} readings were recorded in the last 30 days. Check the data feed.",
+                'priority': 'Medium'
+            })
+        elif row['trend'] == 'up' and _percent_change(row) >= ALERT_PERCENT:
+            recommendations.append({
+                'title': f'Rising {label} Emissions',
+                'description': (
+                    f"{label} emissions rose {_percent_change(row):.0f}% over the last 30 days "
+                    f"compared with the 30 days before. Investigate what changed."
+                ),
+                'priority': 'High' if row is top else 'Medium'
+            })
+        elif row['trend'] == 'down' and _percent_change(row) <= -ALERT_PERCENT:
+            recommendations.append({
+                'title': f'{label} Emissions Improving',
+                'description': (
+                    f"{label} emissions fell {abs(_percent_change(row)):.0f}% over the last 30 days. "
+                    f"Document what worked and apply it to other sources."
+                ),
+                'priority': 'Low'
+            })
+
+    recommendations.extend(dict(advice) for advice in GENERAL_ADVICE)
+    return recommendations
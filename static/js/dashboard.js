@@ -12,31 +12,134 @@ function getDateRange(days) {
     };
 }
 
-function updateDashboard() {
-    const days = parseInt(document.getElementById('dateRange').value);
-    const dateRange = getDateRange(days);
-    
-    fetch(`/api/dashboard?start_date=${dateRange.start}&end_date=${dateRange.end}`)
-        .then(response => response.json())
+// Each chart asks /api/dashboard for just the section it draws, once it
+// scrolls into view. Sections are fetched (and cached) separately per range.
+const CHART_SECTIONS = {
+    trendChart: ['monthly_trend', data => updateTrendChart(data.monthly_trend || [])],
+    monthlyBarChart: ['monthly_trend', data => updateMonthlyBarChart(data.monthly_trend || [])],
+    yearlyBarChart: ['yearly_comparison', data => updateYearlyBarChart(data.yearly_comparison || [])],
+    weeklyBarChart: ['weekly_comparison', data => updateWeeklyBarChart(data.weekly_comparison || [])],
+    donutChart: ['source_breakdown', data => updateDonutChart(data.source_breakdown || [])],
+    humanCountChart: ['daily_human_count', data => updateHumanCountChart(
+        data.daily_human_count || [], (data.series_resolution || {}).daily_human_count)],
+    perPersonEmissionChart: ['daily_per_person_emission', data => updatePerPersonEmissionChart(
+        data.daily_per_person_emission || [], (data.series_resolution || {}).daily_per_person_emission)],
+    emissionsComparisonChart: ['emissions_comparison', data => updateEmissionsComparisonChart(data.emissions_comparison || {})]
+};
+
+let currentRange = null;
+let sectionRequests = {};      // section -> Promise of its JSON for currentRange
+let drawnRange = {};           // canvas id -> range key it was last drawn for
+const visibleCharts = new Set();
+let chartObserver = null;
+
+function rangeKey(range) {
+    return `${range.start}_${range.end}`;
+}
+
+// format=compact sends each series as parallel arrays; `date` and `month`
+// columns are offsets from `date_base` / `month_base`. Rebuild the rows.
+function expandColumns(columns) {
+    const keys = Object.keys(columns).filter(k => Array.isArray(columns[k]));
+    if (keys.length === 0) return [];
+    const decode = {};
+    if (columns.date_base !== undefined) {
+        const base = Date.parse(`${columns.date_base}T00:00:00Z`);
+        decode.date = offset => new Date(base + offset * 86400000).toISOString().slice(0, 10);
+    }
+    if (columns.month_base !== undefined) {
+        const [year, month] = columns.month_base.split('-').map(Number);
+        decode.month = offset => {
+            const index = year * 12 + (month - 1) + offset;
+            return `${Math.floor(index / 12)}-${String(index % 12 + 1).padStart(2, '0')}`;
+        };
+    }
+    return columns[keys[0]].map((_, i) => {
+        const row = {};
+        keys.forEach(k => {
+            row[k] = decode[k] ? decode[k](columns[k][i]) : columns[k][i];
+        });
+        return row;
+    });
+}
+
+function expandCompact(data) {
+    if (data.format !== 'compact') return data;
+    const rows = { ...data };
+    (data.columnar || []).forEach(name => {
+        rows[name] = expandColumns(data[name]);
+    });
+    return rows;
+}
+
+function fetchSection(section) {
+    if (!sectionRequests[section]) {
+        const range = currentRange;
+        sectionRequests[section] = fetch(
+            `/api/dashboard?start_date=${range.start}&end_date=${range.end}&fields=${section}&format=compact`
+        ).then(response => response.json()).then(expandCompact);
+    }
+    return sectionRequests[section];
+}
+
+function loadChart(canvasId) {
+    if (!currentRange) return;
+    const key = rangeKey(currentRange);
+    if (drawnRange[canvasId] === key) return;
+    drawnRange[canvasId] = key;
+    const [section, draw] = CHART_SECTIONS[canvasId];
+    fetchSection(section)
         .then(data => {
-            console.log('Dashboard data received:', data);
-            updateKPIs(data.kpis);
-            updateTrendChart(data.monthly_trend || []);
-            updateMonthlyBarChart(data.monthly_trend || []);
-            updateYearlyBarChart(data.yearly_comparison || []);
-            updateWeeklyBarChart(data.weekly_comparison || []);
-            updateDonutChart(data.source_breakdown || []);
-            console.log('Human count data:', data.daily_human_count);
-            console.log('Per-person emission data:', data.daily_per_person_emission);
-            updateHumanCountChart(data.daily_human_count || []);
-            updatePerPersonEmissionChart(data.daily_per_person_emission || []);
-            updateEmissionsComparisonChart(data.emissions_comparison || {});
+            // A newer range may have been selected while this was in flight
+            if (rangeKey(currentRange) === key) draw(data);
         })
         .catch(error => {
-            console.error('Error fetching dashboard data:', error);
+            drawnRange[canvasId] = null;
+            console.error(`Error fetching dashboard section ${section}:`, error);
         });
 }
 
+function observeCharts() {
+    if (!('IntersectionObserver' in window)) {
+        return; // updateDashboard then loads every chart directly
+    }
+    chartObserver = new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            const id = entry.target.id;
+            if (entry.isIntersecting) {
+                visibleCharts.add(id);
+                loadChart(id);
+            } else {
+                visibleCharts.delete(id);
+            }
+        });
+    }, { rootMargin: '200px 0px' });
+    Object.keys(CHART_SECTIONS).forEach(id => {
+        const canvas = document.getElementById(id);
+        if (canvas) chartObserver.observe(canvas);
+    });
+}
+
+function updateDashboard() {
+    const days = parseInt(document.getElementById('dateRange').value);
+    currentRange = getDateRange(days);
+    sectionRequests = {};
+
+    // KPIs first: they are above the fold and the smallest section
+    fetchSection('kpis')
+        .then(data => updateKPIs(data.kpis))
+        .catch(error => {
+            console.error('Error fetching dashboard KPIs:', error);
+        });
+
+    // Charts on screen reload now; the rest when they scroll into view
+    if (chartObserver) {
+        visibleCharts.forEach(loadChart);
+    } else {
+        Object.keys(CHART_SECTIONS).forEach(loadChart);
+    }
+}
+
 function updateKPIs(kpis) {
     if (!kpis) return;
 
@@ -369,7 +472,20 @@ function updateWeeklyBarChart(weeklyData) {
     });
 }
 
-function updateHumanCountChart(humanData) {
+// Axis label for a series point; week/month buckets are keyed by their first day
+function formatSeriesDate(value, resolution) {
+    const date = new Date(value);
+    if (isNaN(date.getTime())) {
+        return value; // Return raw date string if parsing fails
+    }
+    if (resolution === 'month') {
+        return date.toLocaleDateString('en-US', { month: 'short', year: 'numeric', timeZone: 'UTC' });
+    }
+    const label = date.toLocaleDateString('en-US', { month: 'short', day: 'numeric', timeZone: 'UTC' });
+    return resolution === 'week' ? `Wk of ${label}` : label;
+}
+
+function updateHumanCountChart(humanData, resolution) {
     const canvas = document.getElementById('humanCountChart');
     if (!canvas) return;
     const ctx = canvas.getContext('2d');
@@ -383,17 +499,7 @@ function updateHumanCountChart(humanData) {
         return;
     }
 
-    const labels = humanData.map(d => {
-        try {
-            const date = new Date(d.date);
-            if (isNaN(date.getTime())) {
-                return d.date; // Return raw date string if parsing fails
-            }
-            return date.toLocaleDateString('en-US', { month: 'short', day: 'numeric' });
-        } catch (e) {
-            return d.date;
-        }
-    });
+    const labels = humanData.map(d => formatSeriesDate(d.date, resolution));
     const values = humanData.map(d => d.humans || 0);
 
     humanCountChart = new Chart(ctx, {
@@ -443,7 +549,7 @@ function updateHumanCountChart(humanData) {
     });
 }
 
-function updatePerPersonEmissionChart(perPersonData) {
+function updatePerPersonEmissionChart(perPersonData, resolution) {
     const canvas = document.getElementById('perPersonEmissionChart');
     if (!canvas) return;
     const ctx = canvas.getContext('2d');
@@ -465,17 +571,7 @@ function updatePerPersonEmissionChart(perPersonData) {
         return;
     }
     
-    const labels = validData.map(d => {
-        try {
-            const date = new Date(d.date);
-            if (isNaN(date.getTime())) {
-                return d.date;
-            }
-            return date.toLocaleDateString('en-US', { month: 'short', day: 'numeric' });
-        } catch (e) {
-            return d.date;
-        }
-    });
+    const labels = validData.map(d => formatSeriesDate(d.date, resolution));
     const values = validData.map(d => d.per_person_emission);
 
     perPersonEmissionChart = new Chart(ctx, {
@@ -489,7 +585,8 @@ function updatePerPersonEmissionChart(perPersonData) {
                 backgroundColor: 'rgba(233, 213, 255, 0.1)',
                 tension: 0.4,
                 fill: true,
-                pointRadius: 4,
+                // Markers only while they can be told apart
+                pointRadius: values.length > 90 ? 0 : 4,
                 pointBackgroundColor: '#e9d5ff'
             }]
         },
@@ -606,6 +703,7 @@ function loadRecommendations() {
 }
 
 document.addEventListener('DOMContentLoaded', function() {
+    observeCharts();
     updateDashboard();
     loadRecommendations();
 });
@@ -134,6 +134,68 @@ if (humanCountForm) {
 }
 
 // CSV Upload handling
+// The file is queued as a background import job; the server parses and
+// inserts it in chunks while the page polls the job for progress, so large
+// meter exports neither load into the browser nor hold a request open.
+const JOB_POLL_MS = 1000;
+
+function renderJobProgress(container, job) {
+  const percent = Math.round((job.progress || 0) * 100);
+  const rate = job.rows_per_second ? ` · ${job.rows_per_second} rows/s` : "";
+  container.innerHTML = `
+    <div class="job-progress">
+      <progress max="100" value="${percent}"></progress>
+      <span>${job.status === "queued" ? "Queued" : `${percent}%`} · ${
+        job.accepted
+      } accepted, ${job.rejected} rejected${rate}</span>
+    </div>`;
+}
+
+function renderJobResult(container, job) {
+  let details = "";
+  if (job.rejected > 0 && job.errors) {
+    const shown = job.errors
+      .slice(0, 5)
+      .map((err) => `Line ${err.line}: ${err.error}`)
+      .join("<br>");
+    details = `<br>${shown}`;
+  }
+  const summary =
+    `${job.accepted} records accepted (${job.inserted} inserted, ${job.updated} updated, ` +
+    `${job.unchanged} unchanged), ${job.rejected} rejected.`;
+  if (job.status === "succeeded" && job.accepted > 0) {
+    container.innerHTML = `<div class="success-message">${summary}${details}</div>`;
+  } else {
+    container.innerHTML = `<div class="error-message">${
+      job.error || "No valid rows in CSV."
+    }<br>${summary}${details}</div>`;
+  }
+}
+
+function pollImportJob(statusUrl, container) {
+  fetch(statusUrl)
+    .then((res) => res.json())
+    .then((job) => {
+      if (!job.status) {
+        container.innerHTML = `<div class="error-message">${
+          job.error || "Import job not found."
+        }</div>`;
+        return;
+      }
+      if (job.status === "queued" || job.status === "running") {
+        renderJobProgress(container, job);
+        setTimeout(() => pollImportJob(statusUrl, container), JOB_POLL_MS);
+        return;
+      }
+      renderJobResult(container, job);
+    })
+    .catch((err) => {
+      console.error(err);
+      // Transient network error: keep polling, the job runs server-side
+      setTimeout(() => pollImportJob(statusUrl, container), JOB_POLL_MS * 5);
+    });
+}
+
 const csvInput = document.getElementById("csvFileInput");
 if (csvInput) {
   csvInput.addEventListener("change", function (e) {
@@ -143,74 +205,33 @@ if (csvInput) {
 
     if (!file) return;
 
-    const reader = new FileReader();
-    reader.onload = function (evt) {
-      const text = evt.target.result;
-      // Basic CSV parse: split lines and commas
-      const lines = text.split(/\r?\n/).filter((l) => l.trim() !== "");
-      if (lines.length < 2) {
-        messageContainer.innerHTML = `<div class="error-message">Invalid CSV format.</div>`;
-        return;
-      }
-
-      const header = lines[0].trim();
-      const expectedHeader = "date,source_type,raw_value,unit";
-      if (header.toLowerCase() !== expectedHeader) {
-        messageContainer.innerHTML = `<div class="error-message">Invalid CSV format.</div>`;
-        return;
-      }
+    const body = new FormData();
+    body.append("file", file);
 
-      const records = [];
-      for (let i = 1; i < lines.length; i++) {
-        const cols = lines[i].split(",").map((c) => c.trim());
-        if (cols.length !== 4) {
-          messageContainer.innerHTML = `<div class="error-message">Invalid CSV format.</div>`;
-          return;
-        }
-        const [date, source_type, raw_value, unit] = cols;
-        // Basic validation
-        if (!date || !source_type || !raw_value || !unit) {
-          messageContainer.innerHTML = `<div class="error-message">Invalid CSV format.</div>`;
-          return;
-        }
-        const parsedValue = parseFloat(raw_value.replace(/"/g, ""));
-        if (isNaN(parsedValue)) {
-          messageContainer.innerHTML = `<div class="error-message">Invalid CSV format.</div>`;
-          return;
-        }
-
-        records.push({ date, source_type, raw_value: parsedValue, unit });
-      }
-
-      // Send to server
-      fetch("/api/upload_csv", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ records }),
-      })
-        .then((res) => res.json())
-        .then((resp) => {
-          if (resp.success) {
-            messageContainer.innerHTML = `<div class="success-message">${
-              resp.message || "CSV uploaded successfully."
-            }</div>`;
-            csvInput.value = "";
-          } else {
-            messageContainer.innerHTML = `<div class="error-message">${
-              resp.error || "Invalid CSV format."
-            }</div>`;
-          }
+    messageContainer.innerHTML = `<div class="success-message">Uploading ${file.name}...</div>`;
 
+    fetch("/api/upload_csv/jobs", {
+      method: "POST",
+      body,
+    })
+      .then((res) => res.json())
+      .then((resp) => {
+        if (resp.success) {
+          csvInput.value = "";
+          renderJobProgress(messageContainer, { status: "queued", accepted: 0, rejected: 0 });
+          pollImportJob(resp.status_url, messageContainer);
+        } else {
+          messageContainer.innerHTML = `<div class="error-message">${
+            resp.error || resp.message || "Invalid CSV format."
+          }</div>`;
           setTimeout(() => {
             messageContainer.innerHTML = "";
           }, 5000);
-        })
-        .catch((err) => {
-          console.error(err);
-          messageContainer.innerHTML = `<div class="error-message">An error occurred while uploading CSV.</div>`;
-        });
-    };
-
-    reader.readAsText(file);
+        }
+      })
+      .catch((err) => {
+        console.error(err);
+        messageContainer.innerHTML = `<div class="error-message">An error occurred while uploading CSV.</div>`;
+      });
   });
 }
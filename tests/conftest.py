@@ -0,0 +1,23 @@
+import contextlib
+import io
+
+import pytest
+
+from database import archive, backends, campuses, factors, migrations, sources
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    """A migrated SQLite database in a temporary file (DB_BACKEND=sqlite); yields an open connection."""
+    monkeypatch.setenv('DB_BACKEND', 'sqlite')
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / 'campus_carbon.db'))
+    # Process-wide caches must not carry ids over from another test's database
+    sources.clear_cache()
+    factors.invalidate()
+    campuses.invalidate()
+    archive.invalidate()
+    connection = backends.connect({})
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrations.migrate(connection)
+    yield connection
+    connection.close()
@@ -0,0 +1,28 @@
+import pytest
+
+from auth import CredentialStore, CredentialsUnavailable
+from database import credentials
+
+
+def test_key_created_after_the_last_reload_is_accepted(sqlite_db):
+    store = CredentialStore(refresh=3600, lookup_interval=0)
+    assert store.api_key('cck_0000_nope', sqlite_db.cursor) is None  # loaded, no such key
+
+    key = credentials.create_api_key(sqlite_db.cursor(), 'gateway-north', user_id=1)
+    sqlite_db.commit()
+
+    key_id = credentials.parse_api_key(key)[0]
+    assert store.api_key(key, sqlite_db.cursor) == (key_id, 1)
+
+
+def test_unloaded_store_is_unavailable_not_unauthorized(sqlite_db):
+    def unreachable():
+        raise ConnectionError('database down')
+
+    store = CredentialStore(refresh=3600, retry=0)
+    with pytest.raises(CredentialsUnavailable):
+        store.api_key('cck_0000_secret', unreachable)
+    with pytest.raises(CredentialsUnavailable):
+        store.is_revoked('some-jti', unreachable)
+    # Retried on the next request once the database is back
+    assert store.api_key('cck_0000_secret', sqlite_db.cursor) is None
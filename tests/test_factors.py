@@ -0,0 +1,21 @@
+from database import backends, factors, rollup
+
+
+def test_factor_edit_is_seen_by_other_connections_at_once(sqlite_db):
+    cursor = sqlite_db.cursor()
+    assert factors.get_table(cursor).factor_for('electricity', '2026-02-01') == 0.708
+
+    editor = backends.connect({})
+    try:
+        edit = editor.cursor()
+        # Two edits within the same second both count
+        factors.set_factor(edit, 'electricity', 0.65, 'kg_co2e_per_kwh', '2026-01-01')
+        editor.commit()
+        factors.set_factor(edit, 'electricity', 0.6, 'kg_co2e_per_kwh', '2026-01-01')
+        editor.commit()
+    finally:
+        editor.close()
+
+    rows = rollup.apply_records(cursor, [('2026-02-01', 1, 'electricity', 1000.0)])
+    sqlite_db.commit()
+    assert rows == [('2026-02-01', 1, 'electricity', 1000.0, 0.6, 1)]
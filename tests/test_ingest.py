@@ -0,0 +1,47 @@
+import os
+import threading
+import time
+
+from database import backends
+from ingest import ingest_records, iter_ndjson_records
+
+
+def _stored_readings():
+    connection = backends.connect({})
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM activity_data WHERE meter_id LIKE 'gw-%'")
+        return cursor.fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_partial_chunk_is_committed_while_the_stream_is_quiet(sqlite_db):
+    read_fd, write_fd = os.pipe()
+    lines = b''.join(
+        b'{"date": "2025-03-0%d", "source_type": "electricity", "raw_value": 10, "unit": "kWh", "meter_id": "gw-%d"}\n'
+        % (i, i) for i in range(1, 4)
+    )
+    os.write(write_fd, lines)
+    result = {}
+
+    def ingest():
+        with os.fdopen(read_fd, 'rb', buffering=0) as stream:
+            result.update(ingest_records(sqlite_db, iter_ndjson_records(stream, read_bytes=1024),
+                                         chunk_size=1000, flush_seconds=0.2))
+
+    thread = threading.Thread(target=ingest)
+    thread.start()
+    try:
+        # The sender stays connected but sends nothing more
+        deadline = time.monotonic() + 5
+        while _stored_readings() < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert _stored_readings() == 3
+        assert thread.is_alive()
+    finally:
+        os.close(write_fd)
+        thread.join(5)
+    assert result['accepted'] == 3
+    assert result['chunks'] == 1
+    assert 'error' not in result
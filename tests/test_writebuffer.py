@@ -0,0 +1,36 @@
+import importlib
+import time
+
+import pytest
+
+
+@pytest.fixture
+def client(sqlite_db, monkeypatch):
+    monkeypatch.setenv('WRITE_BUFFER', '1')
+    monkeypatch.setenv('JOBS_WORKERS', '0')
+    app = importlib.import_module('app')
+    assert app.write_buffer is not None
+    bump = app.write_buffer.on_change
+
+    def slow_bump():
+        # Widens the window between a committed batch and its cache bump
+        time.sleep(0.3)
+        bump()
+
+    monkeypatch.setattr(app.write_buffer, 'on_change', slow_bump)
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    return client
+
+
+def test_dashboard_includes_reading_right_after_buffered_201(client):
+    url = '/api/dashboard?start_date=2025-03-01&end_date=2025-03-31&fields=kpis'
+    assert client.get(url).get_json()['kpis']['total_emissions'] == 0  # now cached
+
+    response = client.post('/api/data', json={
+        'date': '2025-03-05', 'source_type': 'electricity', 'raw_value': 100, 'unit': 'kWh',
+    })
+    assert response.status_code == 201
+
+    assert client.get(url).get_json()['kpis']['total_emissions'] > 0
@@ -0,0 +1,194 @@
+"""
+Write-behind buffer for single readings (`POST /api/data`).
+
+Opt-in with WRITE_BUFFER=1. Validated readings go onto a bounded queue
+and one flusher thread writes them through `ingest.upsert_activity_records`,
+one transaction and one commit per batch. A batch is written once it has
+WRITE_BUFFER_BATCH readings or WRITE_BUFFER_DELAY seconds after its first
+reading, whichever comes first. Many meters posting at once then cost one
+commit (and fsync) per batch instead of one per request, and the requests
+hold no pooled connection.
+
+Durability (WRITE_BUFFER_DURABILITY):
+- 'commit' (default): the request waits for its batch to commit (group
+  commit), so a 201 still means the reading is stored.
+- 'queue': the request returns 202 as soon as the reading is queued.
+  Readings still queued when the process is killed are lost; `close()`,
+  registered with atexit, flushes them on a normal shutdown.
+
+When the queue is full, `put` waits up to WRITE_BUFFER_BLOCK_SECONDS for
+room, then raises BufferFull (503 with Retry-After).
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from database.pool import PoolError
+from ingest import sum_batches, upsert_activity_records
+from metrics import WRITE_BUFFER_BATCH_ROWS, WRITE_BUFFER_REJECTED
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ('commit', 'queue')
+
+_STOP = object()
+
+
+class BufferFull(Exception):
+    """The queue stayed full (or the buffer is closing). `retry_after` is a hint in seconds."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class WriteBuffer:
+
+    def __init__(self, pool, batch_size=500, max_delay=0.5, max_queue=10000, block_seconds=0.0,
+                 durability='commit', on_change=None):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {', '.join(DURABILITY_MODES)}")
+        self.pool = pool
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.block_seconds = block_seconds
+        self.durability = durability
+        self.on_change = on_change  # called after a batch changed stored rows (e.g. cache bump)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='write-buffer', daemon=True)
+        self._thread.start()
+
+    def put(self, record):
+        """
+        Queues one record (a `validate_record` tuple). Returns a Future that
+        resolves to the committed batch size in 'commit' mode, None in
+        'queue' mode. Raises BufferFull.
+        """
+        if self._closed:
+            raise BufferFull('Write buffer is shutting down')
+        future = Future() if self.durability == 'commit' else None
+        try:
+            self._queue.put((record, future), block=self.block_seconds > 0, timeout=self.block_seconds or None)
+        except queue.Full:
+            WRITE_BUFFER_REJECTED.inc()
+            raise BufferFull('Write buffer is full, please retry')
+        return future
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def close(self, timeout=10.0):
+        """Stops accepting readings and flushes the queued ones (the shutdown hook)."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error("Write buffer did not drain within %s s; %d reading(s) not written",
+                         timeout, self._queue.qsize())
+
+    # ---- Flusher ----
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+        # Readings that raced with close() land after the stop marker
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        for start in range(0, len(leftover), self.batch_size):
+            self._flush(leftover[start:start + self.batch_size])
+
+    def _flush(self, batch):
+        records = [record for record, _ in batch]
+        while True:
+            try:
+                counts = self._write(records)
+                break
+            except PoolError as e:
+                # Database busy or down: keep the batch; the full queue pushes back on clients
+                logger.warning("Write buffer waiting for the database: %s", e)
+                time.sleep(e.retry_after)
+            except Exception:
+                logger.exception("Buffered batch of %d readings failed; writing them one by one", len(batch))
+                self._flush_individually(batch)
+                return
+        WRITE_BUFFER_BATCH_ROWS.observe(len(batch))
+        # Invalidate before acknowledging: a client that reads right after its 201 sees its reading
+        if counts['inserted'] or counts['updated']:
+            self._changed()
+        for _, future in batch:
+            if future is not None:
+                future.set_result(len(batch))
+
+    def _flush_individually(self, batch):
+        changed = False
+        written = []
+        for record, future in batch:
+            try:
+                counts = self._write([record])
+            except Exception as e:
+                logger.error("Dropped buffered reading %r: %s", record, e)
+                if future is not None:
+                    future.set_exception(e)
+                continue
+            changed = changed or counts['inserted'] or counts['updated']
+            if future is not None:
+                written.append(future)
+        if changed:
+            self._changed()
+        for future in written:
+            future.set_result(1)
+
+    def _changed(self):
+        if self.on_change is None:
+            return
+        try:
+            self.on_change()
+        except Exception:
+            logger.exception("Write buffer change callback failed")
+
+    def _write(self, records):
+        connection = self.pool.acquire()
+        try:
+            cursor = connection.cursor()
+            try:
+                counts = sum_batches(upsert_activity_records(cursor, records))
+                connection.commit()
+                return counts
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        finally:
+            connection.close()